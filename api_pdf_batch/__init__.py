@@ -0,0 +1,44 @@
+import logging
+import json
+from typing import List
+import azure.functions as func
+
+from api_pdf_validator import BLOB_CONTAINER
+from api_pdf_validator.lotes import crear_lote, estado_lote
+
+def main(req: func.HttpRequest, cola: func.Out[List[str]]) -> func.HttpResponse:
+    """
+    POST validatepdf/lotes            -> crea un lote y encola un mensaje por PDF (202)
+         {"pdfs": [{"filename", "file"} | {"blob", "filename"?}], "opciones": {...}}
+    GET  validatepdf/lotes/{lote_id}  -> progreso y resumen del lote
+    """
+    lote_id = req.route_params.get("lote_id")
+
+    if req.method == "GET":
+        if not lote_id:
+            return func.HttpResponse("Falta el id del lote en la ruta", status_code=400)
+        estado = estado_lote(lote_id, BLOB_CONTAINER)
+        if estado is None:
+            return func.HttpResponse(f"Lote no encontrado: {lote_id}", status_code=404)
+        return func.HttpResponse(json.dumps(estado, ensure_ascii=False), mimetype="application/json", status_code=200)
+
+    try:
+        body = req.get_json()
+    except ValueError:
+        return func.HttpResponse("El body debe ser JSON válido", status_code=400)
+
+    pdfs = body.get("pdfs") if isinstance(body, dict) else None
+    if not pdfs:
+        return func.HttpResponse("Falta 'pdfs' (lista de PDFs inline o rutas de blob)", status_code=400)
+
+    try:
+        nuevo_id, mensajes = crear_lote(pdfs, body.get("opciones") or {}, BLOB_CONTAINER)
+    except ValueError as e:
+        return func.HttpResponse(str(e), status_code=400)
+    except Exception as e:
+        logging.exception("Error creando el lote")
+        return func.HttpResponse(f"Error interno: {str(e)}", status_code=500)
+
+    cola.set(mensajes)
+    respuesta = {"lote_id": nuevo_id, "total": len(mensajes), "estado": f"/api/validatepdf/lotes/{nuevo_id}"}
+    return func.HttpResponse(json.dumps(respuesta, ensure_ascii=False), mimetype="application/json", status_code=202)
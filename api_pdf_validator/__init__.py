@@ -1,27 +1,39 @@
 import logging
 import azure.functions as func
 import json
-import base64
 import os
-import tempfile
-import uuid
 import re
 import time
 import io
-import fitz  # PyMuPDF
-import cv2
-import numpy as np
-from langdetect import detect_langs
 
 # --- IMPORTS DE INFRAESTRUCTURA COMPARTIDA ---
 # (Estos vienen de tu carpeta shared/)
-from shared.azure_blob import subir_bytes, subir_json
-from shared.azure_vision import leer_texto_imagen
+from shared.perezoso import perezoso
+from shared.azure_blob import subir_muchos, encolar_tarea, get_blob_service
+from shared.azure_vision import leer_textos_imagenes, get_vision_client
+from shared.instrumentacion import medir, etapa, perfilar
+from shared.trabajos import es_asincrona, aceptar
 # ---------------------------------------------
+from .plantillas import obtener_plantilla, niveles, escalas_regla, ESCALAS_POR_DEFECTO
+from .busqueda import buscar, MODO_EXHAUSTIVO
+from .paralelo import validar_paginas_paralelo, iniciar_pool
+from . import teselas
+from .indice_texto import IndiceTexto
+from .ocr import recortes_para_ocr, patron_en_texto_nativo
+from .idiomas import detectar_idiomas, precargar_perfiles
+from . import cache_resultados, planificador, registro_reglas, evidencias
+from .registro_reglas import ConjuntoDesconocido
+from .entrada import leer_entrada, EntradaInvalida
+
+# Dependencias pesadas: se importan en el primer uso (o en el warmup)
+fitz = perezoso("fitz")  # PyMuPDF
+cv2 = perezoso("cv2")
+np = perezoso("numpy")
 
 # Configuración
 BLOB_CONTAINER = "blob-publico"
-BASE_TMP_DIR = tempfile.gettempdir()
+# Por debajo, el reparto entre procesos cuesta más que validar en serie
+MIN_PAGINAS_PARALELO = int(os.getenv("VALIDADOR_PARALELO_MIN_PAGINAS", "2"))
 
 # ==========================================
 # 1. HELPERS DE RUTAS Y REGLAS
@@ -29,282 +41,680 @@ BASE_TMP_DIR = tempfile.gettempdir()
 def resolver_ruta_assets(rel_path):
     """
     Encuentra archivos en la carpeta assets/ subiendo 2 niveles.
-    Ej: rel_path='templates/logo.png' -> '.../packaging-backend/assets/templates/logo.png'
+    Ej: rel_path='punto_verde.png' -> '.../packaging-backend/assets/punto_verde.png'
     """
     # __file__ = .../api_pdf_validator/__init__.py
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     full_path = os.path.join(base_dir, "assets", rel_path)
     return full_path
 
-def leer_reglas():
-    path = resolver_ruta_assets("Reglas.json")
-    if not os.path.exists(path):
-        logging.error(f"FATAL: No se encuentra Reglas.json en: {path}")
-        return {}
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def leer_reglas(conjunto: str = None):
+    """Reglas (grupos texto/visual/idiomas) de un conjunto del registro; por defecto, Reglas.json."""
+    return registro_reglas.obtener(conjunto).reglas
+
+def _patron(r):
+    """Regex de la regla: la precompilada por el registro o, en reglas sueltas, compilada aquí."""
+    return r.get("patron_re") or re.compile(r["patron"], re.IGNORECASE)
 
 # ==========================================
 # 2. PROCESAMIENTO PDF (Texto e Imágenes)
 # ==========================================
-def extraer_texto_pdf(pdf_bytes: bytes):
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    items = []
-    for page in doc:
-        blocks = page.get_text("dict")["blocks"]
-        for b in blocks:
-            for line in b.get("lines", []):
-                for span in line.get("spans", []):
-                    text = span["text"].strip()
-                    if not text: continue
-                    font = span.get("font", "").lower()
-                    # Detección básica de negrita por nombre de fuente
-                    bold = "bold" in font or "black" in font or "negrita" in font
-                    items.append({"text": text, "bold": bold})
-    doc.close()
-    return items
-
-def renderizar_pdf_a_imagenes(pdf_bytes: bytes, dpi: int = 300):
-    """Renderiza PDF a archivos temporales PNG para análisis visual."""
-    session_id = uuid.uuid4().hex
-    output_dir = os.path.join(BASE_TMP_DIR, f"render_{session_id}")
-    os.makedirs(output_dir, exist_ok=True)
-    
+def iterar_spans_pdf(pdf_bytes: bytes):
+    """
+    Generador página a página: (num_pagina, [span]) con text, bold, font, bbox
+    y bloque. Sólo una página de texto está materializada a la vez.
+    """
+    # Sólo texto: sin TEXT_PRESERVE_IMAGES, PyMuPDF no copia los bytes de las imágenes
+    flags_solo_texto = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for num_pag, page in enumerate(doc, start=1):
+            spans = []
+            blocks = page.get_text("dict", flags=flags_solo_texto)["blocks"]
+            for num_bloque, b in enumerate(blocks):
+                for line in b.get("lines", []):
+                    for span in line.get("spans", []):
+                        text = span["text"].strip()
+                        if not text: continue
+                        font = span.get("font", "").lower()
+                        # Detección básica de negrita por nombre de fuente
+                        bold = "bold" in font or "black" in font or "negrita" in font
+                        spans.append({"text": text, "bold": bold, "font": font,
+                                      "bbox": tuple(span["bbox"]), "bloque": num_bloque})
+            del blocks
+            yield num_pag, spans
+
+def extraer_texto_pdf(pdf_bytes: bytes, detener=None):
+    """
+    Consume el stream de spans y construye un IndiceTexto (normalizado e
+    indexado una sola vez). detener(indice) -> bool se evalúa tras cada página
+    para cortar la extracción en cuanto nadie necesita más texto;
+    indice.completo indica si se leyó el documento entero.
+    """
+    indice = IndiceTexto()
+    for num_pag, spans in iterar_spans_pdf(pdf_bytes):
+        indice.num_paginas = num_pag
+        for sp in spans:
+            indice.agregar(sp["text"], bold=sp["bold"], font=sp["font"], bbox=sp["bbox"],
+                           pagina=num_pag, bloque=sp["bloque"])
+        if detener is not None and detener(indice):
+            logging.info(f"Extracción de texto detenida en la página {num_pag}: reglas resueltas")
+            indice.completo = False
+            break
+    return indice
+
+class PaginaRenderizada:
+    """
+    Página renderizada en memoria. `array` es una vista numpy sobre el buffer del
+    pixmap (sin copia), por eso se conserva la referencia al pixmap.
+    Sólo se codifica a PNG/JPEG cuando algún consumidor necesita bytes.
+    `coincidencias` recoge dónde se localizaron las plantillas (recortes de evidencia).
+    """
+    def __init__(self, num, pix, dpi: int = 300):
+        self.num = num
+        self.pix = pix
+        self.dpi = dpi
+        self.coincidencias = []
+        self.ancho, self.alto = pix.width, pix.height
+        if pix.stride == pix.width * pix.n:
+            buf = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+        else:
+            buf = np.frombuffer(pix.samples, dtype=np.uint8)
+        self.array = buf.reshape(pix.height, pix.width, pix.n)
+        self._gris = None
+        self._codificadas = {}
+
+    @property
+    def gris(self):
+        """Array 2D en escala de grises para OpenCV."""
+        if self._gris is None:
+            if self.pix.n == 1:
+                self._gris = self.array[:, :, 0]
+            else:
+                self._gris = cv2.cvtColor(self.array, cv2.COLOR_RGB2GRAY)
+        return self._gris
+
+    def a_bytes(self, formato: str = "png"):
+        """Codifica la página (una sola vez por formato)."""
+        if formato not in self._codificadas:
+            self._codificadas[formato] = self.pix.tobytes(formato)
+        return self._codificadas[formato]
+
+def renderizar_pagina(page, num: int, dpi: int = 300, gris: bool = False):
+    """Renderiza una página de fitz a PaginaRenderizada."""
+    colorspace = fitz.csGRAY if gris else fitz.csRGB
+    return PaginaRenderizada(num, page.get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False), dpi)
+
+def renderizar_pdf_a_imagenes(pdf_bytes: bytes, dpi: int = 300, gris: bool = False):
+    """
+    Renderiza el PDF en memoria (sin PNG temporales en disco).
+    Con gris=True el pixmap sale directamente en escala de grises, suficiente
+    cuando la página sólo se usa para template matching.
+    """
     doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    imagenes = []
-    for num, page in enumerate(doc, start=1):
-        pix = page.get_pixmap(dpi=dpi)
-        out_path = os.path.join(output_dir, f"pagina_{num}.png")
-        pix.save(out_path)
-        imagenes.append(out_path)
+    paginas = [renderizar_pagina(page, num, dpi, gris) for num, page in enumerate(doc, start=1)]
     doc.close()
-    return imagenes, output_dir
+    return paginas
 
 # ==========================================
 # 3. MOTORES DE VALIDACIÓN (Lógica Específica)
 # ==========================================
 
-def detectar_template_opencv(img_path: str, template_rel_path: str, umbral: float = 0.3, prohibido: bool = False):
-    """Busca un logo/template dentro de la imagen de la página."""
-    template_full_path = resolver_ruta_assets(template_rel_path)
-    
-    if not os.path.exists(template_full_path):
+def opciones_busqueda(regla):
+    """Modo de búsqueda y parámetros opcionales definidos en la regla (Reglas.json)."""
+    opciones = {}
+    if "factor_grueso" in regla: opciones["factor"] = regla["factor_grueso"]
+    if "holgura" in regla: opciones["holgura"] = regla["holgura"]
+    return regla.get("busqueda", MODO_EXHAUSTIVO), opciones
+
+def detectar_template_opencv(img_main, template_rel_path: str, umbral: float = 0.3, prohibido: bool = False,
+                             modo: str = MODO_EXHAUSTIVO, opciones: dict = None, cajas: list = None,
+                             escalas=ESCALAS_POR_DEFECTO):
+    """
+    Busca un logo/template dentro de la página (array en escala de grises).
+    La plantilla sale del almacén en memoria y se prueba en las `escalas` de
+    su pirámide que caben en la página (por defecto sólo 1.0).
+    modo: 'exhaustiva' (página completa) o 'grueso_fino' (página reducida + refinado por ROI).
+    cajas: si se pasa, se le añade la caja (x0, y0, x1, y1) en píxeles donde
+    aparece la plantilla (similitud >= umbral), para los recortes de evidencia.
+    """
+    plantilla = obtener_plantilla(template_rel_path)
+    if plantilla is None:
         return False, f"Template no encontrado en assets: {template_rel_path}"
 
     try:
-        img_main = cv2.imread(img_path, 0)
-        img_tmpl = cv2.imread(template_full_path, 0)
-
-        if img_main is None or img_tmpl is None:
+        if img_main is None:
             return False, "Error leyendo imágenes (OpenCV)"
 
-        res = cv2.matchTemplate(img_main, img_tmpl, cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
-        
-        encontrado = max_val >= umbral
-        
-        if prohibido:
-            ok = not encontrado
-            evidencia = f"Similitud: {max_val:.2f} (Prohibido si > {umbral})"
-        else:
-            ok = encontrado
-            evidencia = f"Similitud: {max_val:.2f} (Requerido > {umbral})"
-        
-        return ok, evidencia
+        h, w = img_main.shape[:2]
+        max_val, mejor_caja = None, None
+        for escala, img_tmpl in niveles(plantilla, escalas, h, w):
+            th, tw = img_tmpl.shape[:2]
+            val, (x, y) = buscar(img_main, img_tmpl, umbral, modo, **(opciones or {}))
+            if max_val is None or val > max_val:
+                max_val, mejor_caja = val, (x, y, x + tw, y + th)
+
+        if max_val is None:
+            return False, "Error OpenCV: la plantilla es mayor que la página"
+        if cajas is not None and max_val >= umbral:
+            cajas.append(mejor_caja)
+
+        return evidencia_similitud(max_val, umbral, prohibido)
     except Exception as e:
         return False, f"Error OpenCV: {str(e)}"
 
-def validar_texto(texto_items, reglas):
+def evidencia_similitud(max_val: float, umbral: float, prohibido: bool = False):
+    """(cumple, evidencia) a partir de la similitud máxima de una plantilla."""
+    encontrado = max_val >= umbral
+    if prohibido:
+        return not encontrado, f"Similitud: {max_val:.2f} (Prohibido si > {umbral})"
+    return encontrado, f"Similitud: {max_val:.2f} (Requerido > {umbral})"
+
+def _evaluar_regla_texto(indice, r):
+    """(cumple, evidencia) de una regla de texto sobre el índice."""
+    texto_completo = indice.texto_completo
+    tipo = r["tipo"]
+    ok, evidencia = False, ""
+    
+    if tipo == "ingredientes_titulo":
+        found = indice.primer_span_que_empieza("ingredientes")
+        if found:
+            ok = found["bold"] and not found["text"].isupper()
+            evidencia = f"Encontrado: '{found['text']}', Bold: {found['bold']}"
+        else: evidencia = "No encontrado"
+
+    elif tipo == "alergenos":
+        if "lista" in r:
+            buenos = []
+            malos = []
+            hallados = indice.buscar_lista(r["lista"])
+            for al in r["lista"]:
+                matches = hallados[al]
+                # Válido si está en mayúsculas y NO negrita
+                es_valido = any((m["text"].isupper() and not m["bold"]) for m in matches)
+                if es_valido: 
+                    buenos.append(al)
+                elif matches:
+                    malos.append(al)
+            
+            # Regla: OK si detectamos al menos uno bien y ninguno mal (ajustable según negocio)
+            ok = len(buenos) > 0 
+            evidencia = f"Correctos: {buenos} | Incorrectos: {malos}"
+        else: evidencia = "Lista vacía"
+
+    elif tipo == "regex_valido":
+        ok = _patron(r).search(texto_completo) is not None
+        evidencia = "Patrón hallado" if ok else "Falta patrón"
+
+    elif tipo == "regex_invalido":
+        errs = _patron(r).findall(texto_completo)
+        ok = len(errs) == 0
+        evidencia = f"Errores encontrados: {errs}" if errs else "Ninguno"
+
+    elif tipo == "texto":
+        ok = _patron(r).search(texto_completo) is not None
+        evidencia = "Texto presente" if ok else "Texto ausente"
+    
+    elif tipo == "texto_condicional":
+        ok, evidencia = True, "N/A"
+        for c in r["condiciones"]:
+            if c["marca"] in indice.texto_upper:
+                ok = _patron(c).search(texto_completo) is not None
+                evidencia = f"Marca {c['marca']} -> Email {'OK' if ok else 'MAL'}"
+                break
+    return ok, evidencia
+
+def validar_texto(indice, reglas):
     resultados = []
-    texto_completo = " ".join([i["text"] for i in texto_items])
-    texto_upper = texto_completo.upper()
-
     for r in reglas:
-        tipo = r["tipo"]
-        ok, evidencia = False, ""
-        
-        if tipo == "ingredientes_titulo":
-            found = next((i for i in texto_items if i["text"].lower().startswith("ingredientes")), None)
-            if found:
-                ok = found["bold"] and not found["text"].isupper()
-                evidencia = f"Encontrado: '{found['text']}', Bold: {found['bold']}"
-            else: evidencia = "No encontrado"
-
-        elif tipo == "alergenos":
-            if "lista" in r:
-                buenos = []
-                malos = []
-                for al in r["lista"]:
-                    matches = [i for i in texto_items if al.upper() in i["text"].upper()]
-                    # Válido si está en mayúsculas y NO negrita
-                    es_valido = any((m["text"].isupper() and not m["bold"]) for m in matches)
-                    if es_valido: 
-                        buenos.append(al)
-                    elif matches:
-                        malos.append(al)
-                
-                # Regla: OK si detectamos al menos uno bien y ninguno mal (ajustable según negocio)
-                ok = len(buenos) > 0 
-                evidencia = f"Correctos: {buenos} | Incorrectos: {malos}"
-            else: evidencia = "Lista vacía"
-
-        elif tipo == "regex_valido":
-            ok = re.search(r["patron"], texto_completo, re.IGNORECASE) is not None
-            evidencia = "Patrón hallado" if ok else "Falta patrón"
-
-        elif tipo == "regex_invalido":
-            errs = re.findall(r["patron"], texto_completo, re.IGNORECASE)
-            ok = len(errs) == 0
-            evidencia = f"Errores encontrados: {errs}" if errs else "Ninguno"
-
-        elif tipo == "texto":
-            ok = re.search(r["patron"], texto_completo, re.IGNORECASE) is not None
-            evidencia = "Texto presente" if ok else "Texto ausente"
-        
-        elif tipo == "texto_condicional":
-            ok, evidencia = True, "N/A"
-            for c in r["condiciones"]:
-                if c["marca"] in texto_upper:
-                    ok = re.search(c["patron"], texto_completo, re.IGNORECASE) is not None
-                    evidencia = f"Marca {c['marca']} -> Email {'OK' if ok else 'MAL'}"
-                    break
-
+        with etapa(f"regla:{r['nombre']}"):
+            ok, evidencia = _evaluar_regla_texto(indice, r)
         resultados.append({"categoria": "Texto", "regla": r["nombre"], "cumple": ok, "evidencia": evidencia})
     return resultados
 
-def validar_visual(imagenes_paths, reglas):
-    resultados = []
-    if not reglas: return resultados
-
+def _leer_ocr_por_pagina(nums, pdf_bytes, indice):
+    """
+    [(texto, error)] OCR de las páginas `nums` (en ese orden). Sólo se envían
+    a Vision las páginas sin capa de texto o sus regiones de imagen,
+    renderizadas desde el PDF: no hacen falta las páginas del matching.
+    """
+    recortes = recortes_para_ocr(pdf_bytes, indice)
+    lecturas = leer_textos_imagenes([png for _, png in recortes])
+    por_pagina = {}
+    for (num, _), (txt, err) in zip(recortes, lecturas):
+        textos, errores = por_pagina.setdefault(num, ([], []))
+        if err: errores.append(err)
+        else: textos.append(txt)
+    resultado = []
+    for num in nums:
+        textos, errores = por_pagina.get(num, ([], []))
+        resultado.append(("\n".join(textos), errores[0] if errores and not textos else None))
+    return resultado
+
+def reglas_texto_resueltas(indice, reglas) -> bool:
+    """
+    True si el resultado de todas las reglas de texto ya no puede cambiar con
+    más páginas. Sólo las reglas de presencia se resuelven antes del final;
+    las de lista, errores o marca necesitan el documento completo.
+    """
     for r in reglas:
-        nombre = r["nombre"]
         tipo = r["tipo"]
-        ok, evidencia = False, "No evaluado"
-
-        for img in imagenes_paths:
-            # 1. Template Matching (Logos) - LOCAL con OpenCV
-            if tipo == "template_match":
-                tmpls = r.get("templates", [r.get("template")])
-                for t in tmpls:
-                    if t:
-                        match, ev = detectar_template_opencv(img, t, r.get("umbral", 0.3))
-                        if match:
-                            ok, evidencia = True, f"Logo {t}: {ev}"
-                            break
-                if ok: break
-            
-            elif tipo == "template_prohibido":
-                match, ev = detectar_template_opencv(img, r["template"], prohibido=True)
-                ok, evidencia = match, ev
-                if not ok: break
-
-            # 2. OCR (Texto en Imagen) - NUBE con Azure Vision (Shared)
-            elif tipo == "ocr_text":
-                logging.info(f"Ejecutando OCR Azure para: {nombre}")
-                # Abrimos la imagen y llamamos a la función compartida
-                with open(img, "rb") as f:
-                    txt, err = leer_texto_imagen(f)
-                
-                if err:
-                    evidencia, ok = f"Error OCR: {err}", False
-                else:
-                    norm = re.sub(r'\s+', ' ', txt.upper()).strip()
-                    ok = any(p.upper() in norm for p in r["patrones"])
-                    evidencia = "Texto en imagen OK" if ok else f"Leído: {norm[:50]}..."
-                
-                if ok: break
-        
-        resultados.append({"categoria": "Visual", "regla": nombre, "cumple": ok, "evidencia": evidencia})
-    return resultados
+        if tipo == "ingredientes_titulo":
+            if indice.primer_span_que_empieza("ingredientes") is None: return False
+        elif tipo in ("regex_valido", "texto"):
+            if _patron(r).search(indice.texto_completo) is None: return False
+        else:
+            return False
+    return True
+
+def _evaluar_regla_visual(paginas, r, lectura_ocr):
+    """
+    (cumple, evidencia) de una regla visual sobre las páginas renderizadas.
+    lectura_ocr: callable que devuelve el OCR por página (se ejecuta una sola
+    vez por petición y lo comparten todas las reglas ocr_text).
+    """
+    tipo = r["tipo"]
+    if tipo == "ocr_text":
+        return _evaluar_ocr_texto(r, lectura_ocr())
+    ok, evidencia = False, "No evaluado"
+    for img in paginas:
+        ok, evidencia = evaluar_plantillas_pagina(img, r)
+        # template_match se decide en la primera página con el logo; template_prohibido, en la primera que lo tiene
+        if ok == (tipo == "template_match"): break
+    return ok, evidencia
+
+def evaluar_plantillas_pagina(img, r):
+    """
+    (cumple, evidencia) de una regla template_match / template_prohibido en
+    una página (la usan el camino serie y el pool de paralelo.py). Anota en
+    img.coincidencias dónde se localizaron las plantillas.
+    """
+    modo, opciones = opciones_busqueda(r)
+    if r["tipo"] == "template_match":
+        # Template Matching (Logos) - LOCAL con OpenCV
+        for t in r.get("templates", [r.get("template")]):
+            if t:
+                cajas = []
+                match, ev = detectar_template_opencv(img.gris, t, r.get("umbral", 0.3), modo=modo,
+                                                     opciones=opciones, cajas=cajas, escalas=escalas_regla(r))
+                img.coincidencias.extend(evidencias.coincidencia(r["nombre"], t, c, img.dpi) for c in cajas)
+                if match:
+                    return True, f"Logo {t}: {ev}"
+        return False, "No evaluado"
+    if r["tipo"] == "template_prohibido":
+        cajas = []
+        ok, ev = detectar_template_opencv(img.gris, r["template"], prohibido=True, modo=modo,
+                                          opciones=opciones, cajas=cajas, escalas=escalas_regla(r))
+        img.coincidencias.extend(evidencias.coincidencia(r["nombre"], r["template"], c, img.dpi) for c in cajas)
+        return ok, ev
+    return False, "No evaluado"
+
+def _evaluar_ocr_texto(r, lecturas):
+    """
+    (cumple, evidencia) de una regla ocr_text sobre el OCR por página
+    [(texto, error)], con Azure Vision (Shared).
+    """
+    ok, evidencia = False, "No evaluado"
+    for txt, err in lecturas:
+        if err:
+            evidencia, ok = f"Error OCR: {err}", False
+        else:
+            norm = re.sub(r'\s+', ' ', txt.upper()).strip()
+            ok = any(p.upper() in norm for p in r["patrones"])
+            evidencia = "Texto en imagen OK" if ok else f"Leído: {norm[:50]}..."
+        if ok: break
+    return ok, evidencia
 
-def validar_idiomas(texto, reglas):
+class EvaluadorVisual:
+    """
+    Evalúa las reglas visuales de una en una. Las páginas se piden a
+    `obtener_paginas` -> (paginas, precalculados) la primera vez que una regla
+    las necesita: si ninguna llega a necesitarlas no se renderiza nada.
+    precalculados: {idx_regla: (ok, evidencia)} ya resueltos por el pipeline
+    paralelo; esas reglas no se vuelven a evaluar.
+    pdf_bytes/indice: habilitan el OCR escalonado (texto nativo primero).
+    """
+    def __init__(self, reglas, obtener_paginas, pdf_bytes=None, indice=None):
+        self.reglas = reglas
+        self._obtener_paginas = obtener_paginas
+        self._pdf_bytes = pdf_bytes
+        self._indice = indice
+        self._cargadas = None
+        self._ocr_paginas = []
+
+    @property
+    def renderizadas(self) -> bool:
+        return self._cargadas is not None
+
+    def _cargar(self):
+        if self._cargadas is None:
+            paginas, precalculados = self._obtener_paginas()
+            self._cargadas = (paginas, precalculados or {})
+        return self._cargadas
+
+    @property
+    def paginas(self):
+        return self._cargar()[0]
+
+    @property
+    def coincidencias(self):
+        """{num_pagina: [coincidencia]} de las plantillas localizadas hasta ahora."""
+        if self._cargadas is None:
+            return {}
+        return {p.num: p.coincidencias for p in self._cargadas[0] if p.coincidencias}
+
+    def _numeros_pagina(self):
+        """Números de página del PDF sin renderizarlas (índice de texto o documento)."""
+        if self._cargadas is not None:
+            return [p.num for p in self._cargadas[0]]
+        if self._indice.completo:
+            return list(range(1, self._indice.num_paginas + 1))
+        with fitz.open(stream=self._pdf_bytes, filetype="pdf") as doc:
+            return list(range(1, doc.page_count + 1))
+
+    @property
+    def _ocr_escalonado(self) -> bool:
+        return self._pdf_bytes is not None and self._indice is not None
+
+    def _lectura_ocr(self):
+        if not self._ocr_paginas:
+            # Todas las páginas en paralelo y una sola vez por petición:
+            # el resto de reglas ocr_text reutilizan la misma lectura
+            with etapa("ocr"):
+                if self._ocr_escalonado:
+                    lecturas = _leer_ocr_por_pagina(self._numeros_pagina(), self._pdf_bytes, self._indice)
+                else:
+                    lecturas = leer_textos_imagenes([p.a_bytes("png") for p in self.paginas])
+                self._ocr_paginas.append(lecturas)
+        return self._ocr_paginas[0]
+
+    def evaluar(self, idx):
+        """(cumple, evidencia) de la regla visual `idx`."""
+        r = self.reglas[idx]
+        if r["tipo"] == "ocr_text" and self._indice is not None:
+            # Texto nativo primero: si ya está en la capa de texto no hace falta OCR (ni render)
+            pag_nativa = patron_en_texto_nativo(self._indice, r["patrones"])
+            if pag_nativa is not None:
+                return True, f"Texto nativo OK (pág {pag_nativa})"
+            if self._ocr_escalonado:
+                # El OCR escalonado renderiza sus recortes desde el PDF
+                with etapa(f"regla:{r['nombre']}"):
+                    return _evaluar_ocr_texto(r, self._lectura_ocr())
+
+        paginas, precalculados = self._cargar()
+        if idx in precalculados:
+            return precalculados[idx]
+        with etapa(f"regla:{r['nombre']}"):
+            return _evaluar_regla_visual(paginas, r, self._lectura_ocr)
+
+def validar_visual(paginas, reglas, precalculados=None, pdf_bytes=None, indice=None):
+    """Evalúa todas las reglas visuales sobre las páginas ya renderizadas (ver EvaluadorVisual)."""
+    evaluador = EvaluadorVisual(reglas, lambda: (paginas, precalculados), pdf_bytes, indice)
+    return [{"categoria": "Visual", "regla": r["nombre"], "cumple": ok, "evidencia": evidencia}
+            for r, (ok, evidencia) in ((r, evaluador.evaluar(idx)) for idx, r in enumerate(reglas))]
+
+def detectar_idiomas_indice(indice):
+    """
+    Detecta idiomas bloque a bloque sobre el índice de texto (o un str, que
+    se trata como un único bloque). Devuelve (idiomas, detalle) donde el
+    detalle indica en qué bloques (p<página>b<bloque>) aparece cada idioma.
+    """
+    bloques = [("doc", indice)] if isinstance(indice, str) else indice.bloques()
+    try:
+        por_idioma = detectar_idiomas(bloques)
+    except Exception as e:
+        logging.warning(f"Error detectando idiomas: {e}")
+        por_idioma = {}
+    detalle = " | ".join(
+        f"{lang}: {', '.join(ids[:5])}{'...' if len(ids) > 5 else ''}" for lang, ids in por_idioma.items())
+    return list(por_idioma), detalle
+
+def _evaluar_regla_idiomas(deteccion, r):
+    detectados, detalle = deteccion
+    ok = len(detectados) >= r.get("min_idiomas", 1)
+    evidencia = f"{detectados} ({detalle})" if detalle else str(detectados)
+    return ok, evidencia
+
+def validar_idiomas(indice, reglas):
     res = []
     if not reglas: return res
-    try:
-        detectados = set(str(l).split(':')[0] for l in detect_langs(texto)) if len(texto) > 10 else []
-    except: detectados = []
-    
+    deteccion = detectar_idiomas_indice(indice)
     for r in reglas:
-        ok = len(detectados) >= r.get("min_idiomas", 1)
-        res.append({"categoria": "Idiomas", "regla": r["nombre"], "cumple": ok, "evidencia": str(list(detectados))})
+        ok, evidencia = _evaluar_regla_idiomas(deteccion, r)
+        res.append({"categoria": "Idiomas", "regla": r["nombre"], "cumple": ok, "evidencia": evidencia})
     return res
 
 # ==========================================
-# 4. FUNCIÓN PRINCIPAL (ENTRY POINT)
+# 4. PIPELINE COMPLETO (HTTP, lotes y trabajos)
 # ==========================================
-def main(req: func.HttpRequest) -> func.HttpResponse:
-    logging.info('Procesando solicitud de validación de PDF.')
-
+def nombre_seguro(filename: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", os.path.splitext(filename)[0])
+
+def ruta_informe(filename: str) -> str:
+    """Blob del informe JSON de un PDF (en BLOB_CONTAINER)."""
+    return f"validaciones/informes/{nombre_seguro(filename)}_informe.json"
+
+def _subir(subidas) -> list:
+    """Sube (data, container, ruta, content_type), anota las evidencias confirmadas y devuelve las rutas fallidas."""
+    fallidas = []
+    for s, ok in zip(subidas, subir_muchos(subidas)):
+        evidencias.confirmar_subida(s[2], ok)
+        if not ok:
+            fallidas.append(s[2])
+    return fallidas
+
+def _subida_informe(informe: dict, destino: str):
+    return (json.dumps(informe, ensure_ascii=False, indent=2).encode("utf-8"),
+            BLOB_CONTAINER, destino, "application/json")
+
+def _publicar(informe: dict, destino: str, subidas, clave_cache: str = None):
+    """
+    Sube las evidencias y, cuando han terminado, el informe: su manifiesto
+    marca las imágenes que no llegaron a blob. Sólo se cachea el informe con
+    todas sus evidencias subidas (y sin clave_cache, nunca).
+    """
     try:
-        # --- 1. Parsear Body ---
-        try:
-            body = req.get_json()
-        except ValueError:
-            return func.HttpResponse("El body debe ser JSON válido", status_code=400)
-
-        pdf_base64 = body.get("file")
-        filename = body.get("filename", "documento.pdf")
-
-        if not pdf_base64:
-            return func.HttpResponse("Falta 'file' (base64)", status_code=400)
-
-        # --- 2. Cargar Reglas ---
-        reglas = leer_reglas()
-        if not reglas:
-            logging.warning("Reglas vacías o no encontradas en assets.")
-
-        # --- 3. Decodificar y Procesar PDF ---
-        pdf_bytes = base64.b64decode(pdf_base64)
-        
-        # Extraer texto nativo
-        texto_items = extraer_texto_pdf(pdf_bytes)
-        texto_full = " ".join([t["text"] for t in texto_items])
-        
-        # Renderizar imágenes (para visual)
-        imagenes_paths, tmp_dir = renderizar_pdf_a_imagenes(pdf_bytes)
-
-        # --- 4. Ejecutar Validaciones ---
-        res_txt = validar_texto(texto_items, reglas.get("texto", []))
-        res_vis = validar_visual(imagenes_paths, reglas.get("visual", []))
-        res_lan = validar_idiomas(texto_full, reglas.get("idiomas", []))
-
-        all_results = res_txt + res_vis + res_lan
-        
-        # --- 5. Generar Informe Final ---
-        informe = {
-            "archivo": filename,
-            "estado_general": "Aprobado" if all(r["cumple"] for r in all_results) else "Rechazado",
-            "resultados": all_results
-        }
-
-        # --- 6. Subir Evidencias a Blob (Usando Shared) ---
+        fallidas = _subir(subidas)
+        if fallidas:
+            logging.warning(f"Evidencias sin subir: {len(fallidas)}")
+            informe = {**informe, "evidencias": evidencias.marcar_fallidas(informe["evidencias"], fallidas)}
+        _subir([_subida_informe(informe, destino)])
+    except Exception as e:
+        logging.warning(f"No se pudo subir al blob: {e}")
+        return
+    if clave_cache and not fallidas:
+        cache_resultados.guardar(clave_cache, informe, BLOB_CONTAINER)
+
+def validar_pdf(pdf_bytes, filename: str, opciones: dict = None, destino_informe: str = None) -> dict:
+    """
+    Ejecuta la validación completa de un PDF y sube sus evidencias.
+    Devuelve el informe con la marca "cache" (True si vino de la caché).
+    destino_informe: blob del informe (por defecto ruta_informe(filename)).
+    """
+    opciones = opciones or {}
+    subir_imagenes = opciones.get("subir_imagenes", True)
+    paralelo = opciones.get("paralelo", os.getenv("VALIDADOR_PARALELO", "0") == "1")
+    usar_cache = opciones.get("usar_cache", True)
+    subidas_fondo = opciones.get("subidas_en_segundo_plano", os.getenv("BLOB_SUBIDAS_FONDO", "0") == "1")
+    fail_fast = opciones.get("fail_fast", False)
+    teselado = opciones.get("teselado")  # None = automático según el presupuesto de memoria
+    presupuesto = teselas.presupuesto_bytes(opciones.get("memoria_render_mb"))
+    # Opciones que cambian el informe (parte de la clave de caché); las de
+    # codificación no válidas dan 400 antes de procesar
+    opciones_salida = {
+        "evidencias": evidencias.Configuracion(opciones).opciones_salida() if subir_imagenes else None,
+        "teselado": teselado,
+        "presupuesto": presupuesto,
+    }
+
+    # --- 1. Cargar Reglas (conjunto por nombre, marca o retailer) ---
+    conjunto = registro_reglas.obtener(opciones.get("conjunto"), opciones.get("marca"), opciones.get("retailer"))
+    reglas = conjunto.reglas
+
+    # --- 2. Caché: mismo PDF + mismas reglas y opciones -> mismo informe ---
+    clave_cache = cache_resultados.clave_resultado(pdf_bytes, conjunto.version, opciones_salida)
+    if usar_cache:
+        with etapa("cache"):
+            cacheado = cache_resultados.obtener(clave_cache, BLOB_CONTAINER)
+        if cacheado is not None:
+            logging.info(f"Informe servido desde caché: {clave_cache}")
+            # Un informe cacheado nunca tiene reglas omitidas: vale para los dos modos
+            informe = {**cacheado, "archivo": filename, "modo": "fail_fast" if fail_fast else "completo",
+                       "reglas": conjunto.descripcion()}
+            # El informe se escribe también con el nombre de esta petición
+            # (las evidencias del manifiesto ya están en blob)
+            if subidas_fondo:
+                encolar_tarea(_publicar, informe, destino_informe or ruta_informe(filename), [])
+            else:
+                _publicar(informe, destino_informe or ruta_informe(filename), [])
+            return {**informe, "cache": True}
+
+    # --- 3. Procesar PDF ---
+    # Extraer texto nativo (en streaming). Si sólo lo usan reglas de texto,
+    # se deja de leer en cuanto todas están resueltas.
+    reglas_texto = reglas.get("texto", [])
+    necesita_todo_el_texto = bool(reglas.get("idiomas")) or any(
+        r["tipo"] == "ocr_text" for r in reglas.get("visual", []))
+    detener = None if necesita_todo_el_texto else (lambda ind: reglas_texto_resueltas(ind, reglas_texto))
+    with etapa("texto"):
+        indice_texto = extraer_texto_pdf(pdf_bytes, detener=detener)
+    
+    # Renderizar imágenes en memoria (para visual), sólo cuando la primera
+    # regla visual las necesita. Basta con renderizar en gris: el OCR y las
+    # evidencias renderizan lo suyo desde el PDF.
+    reglas_visual = reglas.get("visual", [])
+
+    def obtener_paginas():
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            num_paginas = doc.page_count
+            teselar = teselado if teselado is not None else teselas.necesita_teselas(doc, presupuesto)
+        if teselar:
+            # Páginas que no caben en memoria (troqueles): render + matching por
+            # teselas, una a la vez (el pool multiplicaría la memoria por proceso)
+            with etapa("render_y_visual_teselado"):
+                precalculados, paginas = teselas.validar_paginas_teseladas(pdf_bytes, reglas_visual, presupuesto)
+            return paginas, precalculados
+        if paralelo and num_paginas >= MIN_PAGINAS_PARALELO:
+            # Render + OpenCV por página en el pool de procesos del worker
+            with etapa("render_y_visual_paralelo"):
+                precalculados, paginas = validar_paginas_paralelo(pdf_bytes, num_paginas, reglas_visual)
+            return paginas, precalculados
+        with etapa("render"):
+            return renderizar_pdf_a_imagenes(pdf_bytes, gris=True), None
+
+    evaluador_visual = EvaluadorVisual(reglas_visual, obtener_paginas, pdf_bytes=pdf_bytes, indice=indice_texto)
+    deteccion_idiomas = []
+
+    def evaluar(grupo, idx, r):
+        if grupo == "texto":
+            with etapa(f"regla:{r['nombre']}"):
+                return _evaluar_regla_texto(indice_texto, r)
+        if grupo == "visual":
+            return evaluador_visual.evaluar(idx)
+        if not deteccion_idiomas:
+            with etapa("idiomas"):
+                deteccion_idiomas.append(detectar_idiomas_indice(indice_texto))
+        return _evaluar_regla_idiomas(deteccion_idiomas[0], r)
+
+    # --- 4. Ejecutar Validaciones (de la regla más barata a la más cara) ---
+    all_results, aprobado, detenida = planificador.ejecutar(reglas, evaluar, fail_fast=fail_fast)
+
+    # --- 5. Generar Informe Final ---
+    informe = {
+        "archivo": filename,
+        "estado_general": "Aprobado" if aprobado else "Rechazado",
+        "modo": "fail_fast" if fail_fast else "completo",
+        "reglas": conjunto.descripcion(),
+        "resultados": all_results
+    }
+    if detenida:
+        informe["detenida_en"] = detenida
+
+    # --- 6. Subir Evidencias a Blob (Usando Shared) ---
+    # Imágenes de evidencia (opcional): páginas, miniaturas y recortes de
+    # los pictogramas localizados. En fail_fast sólo si ya se renderizó.
+    subidas = []
+    if subir_imagenes and (evaluador_visual.renderizadas or not detenida):
         try:
-            safe_name = re.sub(r"[^A-Za-z0-9_-]+", "_", os.path.splitext(filename)[0])
-            
-            # Subir JSON
-            ruta_informe = f"validaciones/informes/{safe_name}_informe.json"
-            subir_json(informe, BLOB_CONTAINER, ruta_informe)
-            
-            # Subir Imágenes procesadas (Opcional)
-            for idx, p in enumerate(imagenes_paths, 1):
-                ruta_img = f"validaciones/imagenes/{safe_name}/pag_{idx}.png"
-                with open(p, "rb") as f:
-                    subir_bytes(f.read(), BLOB_CONTAINER, ruta_img, "image/png")
-                    
+            with etapa("evidencias"):
+                manifiesto, subidas = evidencias.generar_evidencias(
+                    pdf_bytes, BLOB_CONTAINER, evaluador_visual.coincidencias, opciones, nombre_seguro(filename))
+            informe["evidencias"] = manifiesto
         except Exception as e:
-            logging.warning(f"No se pudo subir al blob: {e}")
+            logging.warning(f"No se pudieron generar las evidencias: {e}")
+            clave_cache = None  # sin evidencias el informe no se cachea
+
+    # El informe (blob y caché) se escribe después de sus evidencias
+    destino_informe = destino_informe or ruta_informe(filename)
+    if subidas_fondo:
+        # La respuesta no espera a las subidas; sus rutas aún pueden no existir
+        encolar_tarea(_publicar, informe, destino_informe, subidas, clave_cache)
+        if "evidencias" in informe:
+            return {**informe, "evidencias": {**informe["evidencias"], "subidas_pendientes": True}, "cache": False}
+    else:
+        _publicar(informe, destino_informe, subidas, clave_cache)
+    return {**informe, "cache": False}
+
+def precalentar():
+    """
+    Deja el worker listo antes de la primera petición (warmup): importa
+    PyMuPDF/OpenCV, carga los conjuntos de reglas y decodifica sus
+    plantillas con su pirámide, carga los perfiles de langdetect y crea los clientes de Azure.
+    Con VALIDADOR_PARALELO=1 arranca también el pool de páginas.
+    """
+    with etapa("validador:imports"):
+        fitz.cargar(); cv2.cargar(); np.cargar()
+    with etapa("validador:reglas_y_plantillas"):
+        registro_reglas.revisar(forzar=True)
+    with etapa("validador:perfiles_idioma"):
+        precargar_perfiles()
+    with etapa("validador:clientes_azure"):
+        if os.getenv("BLOB_LOCAL_DIR") or os.getenv("AzureWebJobsStorage"):
+            get_blob_service()
+        get_vision_client()
+    if os.getenv("VALIDADOR_PARALELO", "0") == "1":
+        with etapa("validador:pool_paralelo"):
+            iniciar_pool(registro_reglas.plantillas_en_uso())
 
-        # --- 7. Limpieza ---
-        for p in imagenes_paths:
-            if os.path.exists(p): os.remove(p)
-        try: os.rmdir(tmp_dir)
-        except: pass
+# ==========================================
+# 5. FUNCIÓN PRINCIPAL (ENTRY POINT)
+# ==========================================
+def main(req: func.HttpRequest, cola: func.Out[str]) -> func.HttpResponse:
+    # ?async=1 o Prefer: respond-async -> 202 con el id del trabajo (shared/trabajos.py)
+    if es_asincrona(req):
+        return aceptar(req, "api_pdf_validator", cola)
+    return atender(req)
+
+def atender(req: func.HttpRequest) -> func.HttpResponse:
+    """Validación síncrona (también la usa el worker de trabajos asíncronos)."""
+    logging.info('Procesando solicitud de validación de PDF.')
 
-        return func.HttpResponse(
-            json.dumps(informe, ensure_ascii=False),
-            mimetype="application/json",
-            status_code=200
-        )
+    try:
+        with medir("api_pdf_validator") as medidor:
+            # Leer entrada (JSON base64, PDF crudo, multipart o referencia a blob)
+            try:
+                with etapa("decode"):
+                    pdf_bytes, filename, opciones = leer_entrada(req, BLOB_CONTAINER)
+            except EntradaInvalida as e:
+                return func.HttpResponse(str(e), status_code=400)
+
+            # ?perfil=1 (con PERFIL_HABILITADO=1) adjunta el perfil de esta petición
+            with perfilar(opciones.get("perfil")) as perfil:
+                try:
+                    informe = validar_pdf(pdf_bytes, filename, opciones)
+                except (ConjuntoDesconocido, evidencias.ConfiguracionInvalida) as e:
+                    return func.HttpResponse(str(e), status_code=400)
+
+            if opciones.get("timings"):
+                informe["timings"] = medidor.resumen()
+            if perfil:
+                informe["perfil"] = perfil
+
+            return func.HttpResponse(
+                json.dumps(informe, ensure_ascii=False),
+                mimetype="application/json",
+                headers={"Server-Timing": medidor.server_timing()},
+                status_code=200
+            )
 
     except Exception as e:
         logging.exception("Error crítico en validación")
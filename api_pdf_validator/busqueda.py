@@ -0,0 +1,78 @@
+from shared.perezoso import perezoso
+
+cv2 = perezoso("cv2")
+
+# ==========================================
+# ESTRATEGIAS DE TEMPLATE MATCHING
+# ==========================================
+# Todas devuelven (max_val, (x, y)) con TM_CCOEFF_NORMED sobre la página a
+# resolución completa, para que la evidencia 'Similitud' sea comparable.
+
+MODO_EXHAUSTIVO = "exhaustiva"
+MODO_GRUESO_FINO = "grueso_fino"
+
+FACTOR_GRUESO = 0.25      # Escala de la pasada gruesa
+HOLGURA = 0.8             # Umbral relajado = umbral * HOLGURA
+MAX_CANDIDATOS = 5        # Regiones refinadas a resolución completa
+LADO_MINIMO_GRUESO = 12   # Por debajo, la plantilla reducida no discrimina
+
+def buscar_exhaustivo(img, tmpl):
+    """matchTemplate sobre toda la página."""
+    res = cv2.matchTemplate(img, tmpl, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(res)
+    return max_val, max_loc
+
+def _candidatos(res, umbral_relajado, supr_w, supr_h, max_candidatos):
+    """Máximos locales por encima del umbral relajado (con supresión de vecinos)."""
+    res = res.copy()
+    encontrados = []
+    while len(encontrados) < max_candidatos:
+        _, val, _, (x, y) = cv2.minMaxLoc(res)
+        if val < umbral_relajado:
+            break
+        encontrados.append((val, (x, y)))
+        res[max(0, y - supr_h):y + supr_h + 1, max(0, x - supr_w):x + supr_w + 1] = -1.0
+    return encontrados
+
+def buscar_grueso_fino(img, tmpl, umbral, factor=FACTOR_GRUESO, holgura=HOLGURA, max_candidatos=MAX_CANDIDATOS):
+    """
+    Busca primero en la página reducida y sólo refina a resolución completa
+    dentro de las regiones candidatas que superan umbral * holgura.
+    Si no hay candidatas se refina la mejor región gruesa: la similitud
+    devuelta es siempre de resolución completa.
+    """
+    th, tw = tmpl.shape[:2]
+    if min(th, tw) * factor < LADO_MINIMO_GRUESO:
+        return buscar_exhaustivo(img, tmpl)
+
+    h, w = img.shape[:2]
+    img_g = cv2.resize(img, (max(1, int(w * factor)), max(1, int(h * factor))), interpolation=cv2.INTER_AREA)
+    tmpl_g = cv2.resize(tmpl, (max(1, int(tw * factor)), max(1, int(th * factor))), interpolation=cv2.INTER_AREA)
+    if tmpl_g.shape[0] > img_g.shape[0] or tmpl_g.shape[1] > img_g.shape[1]:
+        return buscar_exhaustivo(img, tmpl)
+
+    res_g = cv2.matchTemplate(img_g, tmpl_g, cv2.TM_CCOEFF_NORMED)
+    candidatos = _candidatos(res_g, umbral * holgura, tmpl_g.shape[1] // 2, tmpl_g.shape[0] // 2, max_candidatos)
+    if not candidatos:
+        _, max_val, _, max_loc = cv2.minMaxLoc(res_g)
+        candidatos = [(max_val, max_loc)]
+
+    # Margen para absorber el error de posición de la pasada gruesa. La
+    # región se desplaza dentro de la página para que siempre quepa la plantilla.
+    margen = int(round(2 / factor))
+    mejor = None
+    for _, (x, y) in candidatos:
+        x0 = max(0, min(int(x / factor) - margen, w - tw))
+        y0 = max(0, min(int(y / factor) - margen, h - th))
+        x1 = min(w, max(int(x / factor) + tw + margen, x0 + tw))
+        y1 = min(h, max(int(y / factor) + th + margen, y0 + th))
+        val, (rx, ry) = buscar_exhaustivo(img[y0:y1, x0:x1], tmpl)
+        if mejor is None or val > mejor[0]:
+            mejor = (val, (x0 + rx, y0 + ry))
+    return mejor
+
+def buscar(img, tmpl, umbral, modo=MODO_EXHAUSTIVO, **opciones):
+    """Despacha a la estrategia configurada en la regla."""
+    if modo == MODO_GRUESO_FINO:
+        return buscar_grueso_fino(img, tmpl, umbral, **opciones)
+    return buscar_exhaustivo(img, tmpl)
@@ -0,0 +1,72 @@
+import os
+import json
+import hashlib
+import logging
+
+from shared.azure_blob import subir_json, descargar_bytes
+from shared.cache import CacheLRU
+
+# ==========================================
+# CACHÉ DE RESULTADOS (contenido + reglas)
+# ==========================================
+# Clave = sha256(PDF) + versión del conjunto de reglas (reglas + contenido de
+# sus plantillas) + hash de las opciones que cambian el informe (evidencias,
+# teselado). Dos niveles:
+#   1. LRU en memoria del worker
+#   2. Blob persistente junto a los informes: validaciones/cache/<clave>.json
+
+PREFIJO_BLOB = "validaciones/cache"
+
+_memoria = CacheLRU(int(os.getenv("VALIDADOR_CACHE_MAX", "64")))
+
+def _hash_json(datos) -> str:
+    canon = json.dumps(datos, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()[:16]
+
+def version_reglas(reglas, plantillas: dict = None) -> str:
+    """
+    Hash estable del conjunto de reglas activo. plantillas: ruta -> hash del
+    fichero, para que cambiar una imagen de assets/ invalide la caché.
+    """
+    if not plantillas:
+        return _hash_json(reglas)
+    return _hash_json({"reglas": reglas, "plantillas": plantillas})
+
+def clave_resultado(pdf_bytes: bytes, version: str, opciones_salida: dict = None) -> str:
+    """opciones_salida: opciones ya resueltas que cambian el informe (no las de rendimiento)."""
+    clave = f"{hashlib.sha256(pdf_bytes).hexdigest()}_{version}"
+    return f"{clave}_{_hash_json(opciones_salida)}" if opciones_salida else clave
+
+def obtener(clave: str, container: str):
+    """Informe cacheado o None. Un acierto en blob se promociona a memoria."""
+    informe = _memoria.get(clave)
+    if informe is not None:
+        return informe
+    data = descargar_bytes(container, f"{PREFIJO_BLOB}/{clave}.json")
+    if data is None:
+        return None
+    try:
+        informe = json.loads(data)
+    except ValueError:
+        logging.warning(f"Entrada de caché corrupta: {clave}")
+        return None
+    _memoria.set(clave, informe)
+    return informe
+
+# Evidencias de errores de infraestructura ("Errores encontrados: ..." de las
+# reglas de texto es un resultado, no un error)
+PREFIJOS_ERROR = ("Error OCR", "Error OpenCV", "Error leyendo")
+
+def cacheable(informe) -> bool:
+    """
+    No se guardan informes con errores de infraestructura (OCR, OpenCV...)
+    ni informes parciales de fail_fast (con reglas omitidas).
+    """
+    return not any(str(r.get("evidencia", "")).startswith(PREFIJOS_ERROR) or r.get("omitida")
+                   for r in informe.get("resultados", []))
+
+def guardar(clave: str, informe: dict, container: str):
+    if not cacheable(informe):
+        return
+    _memoria.set(clave, informe)
+    subir_json(informe, container, f"{PREFIJO_BLOB}/{clave}.json")
@@ -0,0 +1,167 @@
+import base64
+import logging
+import binascii
+
+from shared.azure_blob import descargar_en_bloques
+
+# ==========================================
+# MODOS DE ENTRADA DEL PDF
+# ==========================================
+# Memoria pico aproximada para un PDF de N bytes (sin contar al host):
+#
+#   JSON + base64 ('file')     ~4 N   : cuerpo (1.33 N) + texto del cuerpo y
+#                                       str base64 mientras se parsea el JSON
+#                                       (2 x 1.33 N); el base64 se decodifica
+#                                       por bloques a un bytearray (N) sin la
+#                                       copia ASCII completa de b64decode
+#   application/pdf (crudo)    ~1 N   : el cuerpo se pasa tal cual a fitz
+#   multipart/form-data        ~1 N   : la parte del PDF es un memoryview
+#                                       sobre el cuerpo (sin copia)
+#   referencia 'blob'          ~1 N   : bytearray pre-reservado con el tamaño
+#                                       del blob + 2 bloques de descarga (el
+#                                       anterior sigue vivo mientras se lee)
+#
+# tests/test_entrada.py mide estos picos con tracemalloc.
+#
+# Las opciones (subir_imagenes, paralelo, usar_cache...) van en el JSON o,
+# para los modos binarios, en la query string (?filename=x.pdf&paralelo=1).
+# Las booleanas se normalizan igual en todos los modos: "false" o "0" en el
+# JSON también son False.
+
+class EntradaInvalida(ValueError):
+    """Error de la petición que se devuelve como 400."""
+
+def _bool(valor):
+    if isinstance(valor, str):
+        return valor.strip().lower() in ("1", "true", "si", "sí", "yes")
+    return bool(valor)
+
+BLOQUE_BASE64 = 1024 * 1024  # caracteres (múltiplo de 4)
+
+OPCIONES_BOOL = ("subir_imagenes", "paralelo", "usar_cache", "subidas_en_segundo_plano", "timings", "perfil", "fail_fast", "teselado",
+                  "evidencias_recortes")
+
+def normalizar_opciones(opciones: dict) -> dict:
+    """Copia de las opciones con las de OPCIONES_BOOL convertidas a bool."""
+    return {k: _bool(v) if k in OPCIONES_BOOL else v for k, v in (opciones or {}).items()}
+
+def _decodificar_base64(texto: str):
+    """
+    base64 -> bytearray decodificando por bloques: b64decode(str) haría antes
+    una copia ASCII completa del texto. Con separadores (saltos de línea...)
+    que descuadran los bloques se usa b64decode tal cual.
+    """
+    relleno = 2 if texto.endswith("==") else 1 if texto.endswith("=") else 0
+    if len(texto) % 4 == 0:
+        salida = bytearray(len(texto) // 4 * 3 - relleno)
+        pos = 0
+        try:
+            for i in range(0, len(texto), BLOQUE_BASE64):
+                trozo = base64.b64decode(texto[i:i + BLOQUE_BASE64])
+                salida[pos:pos + len(trozo)] = trozo
+                pos += len(trozo)
+        except (binascii.Error, ValueError):
+            pos = -1
+        if pos == len(salida):
+            return salida
+        del salida
+    return base64.b64decode(texto)
+
+def _partes_multipart(body: bytes, content_type: str):
+    """
+    Parser multipart mínimo que devuelve memoryviews sobre el cuerpo en lugar
+    de copiar cada parte. Devuelve {nombre_campo: (filename, memoryview)}.
+    """
+    boundary = None
+    for trozo in content_type.split(";"):
+        trozo = trozo.strip()
+        if trozo.lower().startswith("boundary="):
+            boundary = trozo.split("=", 1)[1].strip('"')
+    if not boundary:
+        raise EntradaInvalida("multipart sin boundary")
+
+    delim = b"--" + boundary.encode("latin-1")
+    vista = memoryview(body)
+    partes = {}
+    pos = body.find(delim)
+    while pos != -1:
+        inicio = pos + len(delim)
+        if body[inicio:inicio + 2] == b"--":
+            break
+        fin_cab = body.find(b"\r\n\r\n", inicio)
+        if fin_cab == -1:
+            break
+        cabeceras = body[inicio:fin_cab].decode("utf-8", "replace")
+        siguiente = body.find(b"\r\n" + delim, fin_cab + 4)
+        if siguiente == -1:
+            break
+        nombre, filename = None, None
+        for linea in cabeceras.split("\r\n"):
+            if linea.lower().startswith("content-disposition"):
+                for attr in linea.split(";")[1:]:
+                    k, _, v = attr.strip().partition("=")
+                    if k == "name": nombre = v.strip('"')
+                    elif k == "filename": filename = v.strip('"')
+        if nombre:
+            partes[nombre] = (filename, vista[fin_cab + 4:siguiente])
+        pos = siguiente + 2
+    return partes
+
+def leer_entrada(req, container: str):
+    """
+    Obtiene (pdf_bytes, filename, opciones) de la petición en cualquiera de
+    los modos soportados. pdf_bytes puede ser bytes, bytearray o memoryview.
+    Lanza EntradaInvalida para errores del cliente.
+    """
+    content_type = (req.headers.get("Content-Type") or "").lower()
+    opciones = normalizar_opciones(req.params)
+
+    # --- Modo 1: PDF crudo ---
+    if content_type.startswith("application/pdf"):
+        pdf_bytes = req.get_body()
+        if not pdf_bytes:
+            raise EntradaInvalida("Body PDF vacío")
+        filename = opciones.pop("filename", None) or req.headers.get("X-Filename") or "documento.pdf"
+        return pdf_bytes, filename, opciones
+
+    # --- Modo 2: multipart/form-data ---
+    if content_type.startswith("multipart/form-data"):
+        partes = _partes_multipart(req.get_body(), req.headers.get("Content-Type"))
+        pdf = partes.pop("file", None) or next((p for p in partes.values() if p[0]), None)
+        if pdf is None:
+            raise EntradaInvalida("Falta la parte 'file' en multipart")
+        for nombre, (fname, valor) in partes.items():
+            if fname is None:
+                opciones[nombre] = bytes(valor).decode("utf-8", "replace")
+        filename = opciones.pop("filename", None) or pdf[0] or "documento.pdf"
+        return pdf[1], filename, normalizar_opciones(opciones)
+
+    # --- Modos JSON: referencia a blob o base64 (compatibilidad) ---
+    try:
+        body = req.get_json()
+    except ValueError:
+        raise EntradaInvalida("El body debe ser JSON válido")
+    if not isinstance(body, dict):
+        raise EntradaInvalida("El body debe ser un objeto JSON")
+    opciones.update(normalizar_opciones({k: v for k, v in body.items() if k not in ("file", "blob", "container", "filename")}))
+
+    if body.get("blob"):
+        ruta = body["blob"]
+        cont = body.get("container", container)
+        logging.info(f"Leyendo PDF desde blob: {cont}/{ruta}")
+        pdf_bytes = descargar_en_bloques(cont, ruta)
+        if pdf_bytes is None:
+            raise EntradaInvalida(f"No existe el blob '{cont}/{ruta}'")
+        filename = body.get("filename") or ruta.rsplit("/", 1)[-1]
+        return pdf_bytes, filename, opciones
+
+    pdf_base64 = body.get("file")
+    if not pdf_base64 or not isinstance(pdf_base64, str):
+        raise EntradaInvalida("Falta 'file' (base64)")
+    # Se suelta la referencia al str base64 en cuanto se decodifica
+    try:
+        pdf_bytes = _decodificar_base64(body.pop("file"))
+    except (binascii.Error, ValueError):
+        raise EntradaInvalida("'file' no es base64 válido")
+    del pdf_base64
+    return pdf_bytes, body.get("filename", "documento.pdf"), opciones
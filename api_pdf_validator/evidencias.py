@@ -0,0 +1,286 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from shared.perezoso import perezoso
+from .entrada import normalizar_opciones
+
+fitz = perezoso("fitz")  # PyMuPDF
+cv2 = perezoso("cv2")
+np = perezoso("numpy")
+
+# ==========================================
+# EVIDENCIAS COMPACTAS (páginas, miniaturas y recortes)
+# ==========================================
+# Las evidencias se renderizan desde el PDF a la resolución que necesita el
+# visor (lado mayor <= LADO_MAX, como mucho 300 dpi), no desde las páginas
+# a 300 dpi del template matching, y se codifican en WebP/JPEG:
+#   - imagen de cada página
+#   - miniatura de cada página (lado mayor LADO_MINIATURA)
+#   - recorte alrededor de cada pictograma localizado por las reglas template_*
+#
+# Las rutas son direccionables por contenido: validaciones/evidencias/<hash>.<ext>,
+# con el hash de los píxeles y de la configuración de codificación. Páginas
+# idénticas (del mismo PDF o de otro ya validado) se codifican y suben una
+# sola vez; el worker recuerda las rutas ya subidas para no repetirlas.
+# El informe lleva el manifiesto "evidencias" con las rutas de cada página;
+# se publica cuando terminan las subidas y una imagen que no se pudo subir
+# lleva "subida": False (ver marcar_fallidas).
+#
+# Antes se subía un PNG a 300 dpi por página en validaciones/imagenes/<nombre>/pag_N.png.
+# Con EVIDENCIAS_RUTAS_ANTIGUAS=1 se sigue escribiendo además esa ruta (PNG a
+# la resolución de la evidencia) para los consumidores que aún la leen.
+
+PREFIJO = "validaciones/evidencias"
+FORMATO = os.getenv("EVIDENCIAS_FORMATO", "webp")           # webp | jpeg | png
+CALIDAD = int(os.getenv("EVIDENCIAS_CALIDAD", "80"))         # 1-100 (webp/jpeg)
+LADO_MAX = int(os.getenv("EVIDENCIAS_LADO_MAX", "2000"))     # px; 0 = sin límite (300 dpi)
+LADO_MINIATURA = int(os.getenv("EVIDENCIAS_LADO_MINIATURA", "320"))
+RECORTES = os.getenv("EVIDENCIAS_RECORTES", "1") == "1"
+RUTAS_ANTIGUAS = os.getenv("EVIDENCIAS_RUTAS_ANTIGUAS", "0") == "1"
+DPI_MAX = 300
+MARGEN_RECORTE = 0.5  # fracción del lado de la caja que se añade a cada lado
+MAX_RUTAS_RECORDADAS = 20000
+# cv2.imencode suelta el GIL: se codifica en hilos mientras se renderiza la
+# página siguiente (WebP cuesta ~200 ms por página de 2000 px)
+HILOS = int(os.getenv("EVIDENCIAS_HILOS", "0")) or min(4, os.cpu_count() or 1)
+
+# formato -> (extensión de cv2.imencode y del blob, content type)
+FORMATOS = {
+    "webp": ("webp", "image/webp"),
+    "jpeg": ("jpg", "image/jpeg"),
+    "jpg": ("jpg", "image/jpeg"),
+    "png": ("png", "image/png"),
+}
+
+_subidas_confirmadas = OrderedDict()
+_lock = threading.Lock()
+_pool = None
+
+class ConfiguracionInvalida(ValueError):
+    """Opciones de codificación de la petición no válidas (se devuelve como 400)."""
+
+class Configuracion:
+    """Parámetros de codificación: los de entorno, sobrescribibles por petición."""
+
+    def __init__(self, opciones: dict = None):
+        opciones = normalizar_opciones(opciones)
+        self.formato = str(opciones.get("evidencias_formato") or FORMATO).lower()
+        if self.formato not in FORMATOS:
+            raise ConfiguracionInvalida(f"Formato de evidencias no soportado: {self.formato} ({', '.join(FORMATOS)})")
+        try:
+            self.calidad = max(1, min(100, int(opciones.get("evidencias_calidad") or CALIDAD)))
+            lado = opciones.get("evidencias_lado_max")
+            self.lado_max = max(0, int(lado)) if lado not in (None, "") else LADO_MAX
+        except (TypeError, ValueError):
+            raise ConfiguracionInvalida("evidencias_calidad y evidencias_lado_max deben ser enteros")
+        self.lado_miniatura = LADO_MINIATURA
+        self.recortes = opciones.get("evidencias_recortes", RECORTES)
+        self.rutas_antiguas = RUTAS_ANTIGUAS
+        self.extension, self.content_type = FORMATOS[self.formato]
+
+    def parametros(self):
+        """Parámetros de cv2.imencode para el formato."""
+        if self.extension == "webp":
+            return [cv2.IMWRITE_WEBP_QUALITY, self.calidad]
+        if self.extension == "jpg":
+            return [cv2.IMWRITE_JPEG_QUALITY, self.calidad, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+        return [cv2.IMWRITE_PNG_COMPRESSION, 6]
+
+    def opciones_salida(self) -> dict:
+        """Lo que cambia el manifiesto del informe (parte de la clave de caché)."""
+        return {"formato": self.extension, "calidad": self.calidad, "lado_max": self.lado_max,
+                "recortes": self.recortes, "rutas_antiguas": self.rutas_antiguas}
+
+    def firma(self) -> bytes:
+        return f"{self.extension}:{self.calidad}:{self.lado_miniatura}".encode()
+
+# ------------------------------------------
+# Coincidencias (las anotan los motores de template matching)
+# ------------------------------------------
+def coincidencia(regla: str, plantilla: str, caja_px, dpi: float) -> dict:
+    """Coincidencia de una plantilla con su caja en puntos PDF (independiente del dpi del render)."""
+    escala = 72.0 / dpi
+    return {"regla": regla, "plantilla": plantilla, "caja": [round(v * escala, 2) for v in caja_px]}
+
+# ------------------------------------------
+# Render y codificación
+# ------------------------------------------
+def dpi_para(ancho_pt: float, alto_pt: float, lado_max: int) -> float:
+    """Resolución con la que el lado mayor no pasa de lado_max px (y nunca de DPI_MAX)."""
+    if not lado_max:
+        return DPI_MAX
+    return min(DPI_MAX, lado_max * 72.0 / max(ancho_pt, alto_pt, 1))
+
+def _renderizar(page, dpi: float, clip=None):
+    """Array RGB (vista sobre el pixmap, que se devuelve también)."""
+    pix = page.get_pixmap(dpi=max(1, int(dpi)), clip=clip, colorspace=fitz.csRGB, alpha=False)
+    if pix.stride == pix.width * 3:
+        rgb = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+    else:
+        rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+    return rgb, pix
+
+def huella(rgb, config: Configuracion) -> str:
+    """Hash de los píxeles + la configuración de codificación (nombre del blob)."""
+    h = hashlib.sha256(config.firma())
+    h.update(f"{rgb.shape[1]}x{rgb.shape[0]}".encode())
+    h.update(np.ascontiguousarray(rgb).data)
+    return h.hexdigest()[:32]
+
+def codificar(rgb, config: Configuracion) -> bytes:
+    ok, buf = cv2.imencode("." + config.extension, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), config.parametros())
+    if not ok:
+        raise RuntimeError(f"No se pudo codificar la evidencia en {config.formato}")
+    return buf.tobytes()
+
+def miniatura(rgb, lado: int):
+    h, w = rgb.shape[:2]
+    factor = lado / max(h, w)
+    if factor >= 1:
+        return rgb
+    return cv2.resize(rgb, (max(1, round(w * factor)), max(1, round(h * factor))), interpolation=cv2.INTER_AREA)
+
+def _ruta(hash_: str, config: Configuracion, sufijo: str = "") -> str:
+    return f"{PREFIJO}/{hash_}{sufijo}.{config.extension}"
+
+def ya_subida(ruta: str) -> bool:
+    with _lock:
+        if ruta in _subidas_confirmadas:
+            _subidas_confirmadas.move_to_end(ruta)
+            return True
+        return False
+
+def confirmar_subida(ruta: str, ok: bool):
+    """Anota una ruta de evidencia ya subida (las demás rutas se ignoran)."""
+    if not ok or not ruta.startswith(PREFIJO + "/"):
+        return
+    with _lock:
+        _subidas_confirmadas[ruta] = True
+        _subidas_confirmadas.move_to_end(ruta)
+        while len(_subidas_confirmadas) > MAX_RUTAS_RECORDADAS:
+            _subidas_confirmadas.popitem(last=False)
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=HILOS, thread_name_prefix="evidencias")
+        return _pool
+
+class _Lote:
+    """
+    Subidas de una petición, sin repetir rutas ni codificar lo ya subido.
+    Las codificaciones van al pool; como mucho 2 * HILOS imágenes (con su
+    pixmap) esperan a la vez.
+    """
+
+    def __init__(self, container: str, config: Configuracion):
+        self.container = container
+        self.config = config
+        self._rutas = set()
+        self._pendientes = deque()  # (ruta, content_type, future)
+        self._hechas = []
+
+    def _codificar(self, rgb, pix, preparar, config):
+        return codificar(preparar(rgb) if preparar else rgb, config)
+
+    def anadir(self, rgb, pix, hash_: str = None, sufijo: str = "", preparar=None, ruta: str = None,
+               config: Configuracion = None) -> str:
+        """
+        Ruta de la imagen; sólo se codifica si no está ya en esta petición ni
+        subida. ruta/config fijan una ruta no direccionable por contenido.
+        """
+        config = config or self.config
+        ruta = ruta or _ruta(hash_ or huella(rgb, config), config, sufijo)
+        if ruta not in self._rutas and not ya_subida(ruta):
+            if len(self._pendientes) >= 2 * HILOS:
+                self._recoger(self._pendientes.popleft())
+            futuro = _get_pool().submit(self._codificar, rgb, pix, preparar, config)
+            self._pendientes.append((ruta, config.content_type, futuro))
+        self._rutas.add(ruta)
+        return ruta
+
+    def _recoger(self, pendiente):
+        ruta, content_type, futuro = pendiente
+        self._hechas.append((futuro.result(), self.container, ruta, content_type))
+
+    def subidas(self):
+        """(data, container, ruta, content_type) de las imágenes nuevas, en orden."""
+        while self._pendientes:
+            self._recoger(self._pendientes.popleft())
+        return self._hechas
+
+def _caja_recorte(caja, rect):
+    """Caja de la coincidencia ampliada con el margen y limitada a la página (en puntos)."""
+    x0, y0, x1, y1 = caja
+    mx, my = (x1 - x0) * MARGEN_RECORTE, (y1 - y0) * MARGEN_RECORTE
+    return fitz.Rect(max(0, x0 - mx), max(0, y0 - my),
+                     min(rect.width, x1 + mx), min(rect.height, y1 + my)) + (rect.x0, rect.y0, rect.x0, rect.y0)
+
+def marcar_fallidas(manifiesto: dict, fallidas) -> dict:
+    """Copia del manifiesto con "subida": False en las entradas con alguna imagen sin subir."""
+    fallidas = set(fallidas)
+    def marcar(entrada):
+        if fallidas.intersection(v for k, v in entrada.items() if k in ("imagen", "miniatura")):
+            return {**entrada, "subida": False}
+        return entrada
+    return {**manifiesto, "paginas": [marcar(p) for p in manifiesto["paginas"]],
+            "recortes": [marcar(r) for r in manifiesto["recortes"]]}
+
+def generar_evidencias(pdf_bytes, container: str, coincidencias=None, opciones: dict = None, nombre: str = None):
+    """
+    Renderiza y codifica las evidencias del PDF. coincidencias: {num_pagina:
+    [coincidencia]} para los recortes. Devuelve (manifiesto, subidas): el
+    manifiesto va al informe y las subidas son (data, container, ruta,
+    content_type) sólo de lo que aún no está en blob. nombre: nombre seguro
+    del PDF para las rutas antiguas (EVIDENCIAS_RUTAS_ANTIGUAS).
+    """
+    config = Configuracion(opciones)
+    lote = _Lote(container, config)
+    config_png = Configuracion({**(opciones or {}), "evidencias_formato": "png"})
+    manifiesto = {"formato": config.formato, "paginas": [], "recortes": []}
+    coincidencias = coincidencias or {}
+
+    doc = fitz.open(stream=bytes(pdf_bytes) if isinstance(pdf_bytes, memoryview) else pdf_bytes, filetype="pdf")
+    try:
+        for num, page in enumerate(doc, start=1):
+            rect = page.rect
+            rgb, pix = _renderizar(page, dpi_para(rect.width, rect.height, config.lado_max))
+            hash_ = huella(rgb, config)
+            manifiesto["paginas"].append({
+                "pagina": num,
+                "imagen": lote.anadir(rgb, pix, hash_),
+                "miniatura": lote.anadir(rgb, pix, hash_, "_mini", lambda a: miniatura(a, config.lado_miniatura)),
+                "ancho": pix.width,
+                "alto": pix.height,
+            })
+            if config.rutas_antiguas and nombre:
+                lote.anadir(rgb, pix, ruta=f"validaciones/imagenes/{nombre}/pag_{num}.png", config=config_png)
+            del rgb, pix
+
+            if not config.recortes:
+                continue
+            vistas = set()
+            for c in coincidencias.get(num, []):
+                clave = (c["plantilla"], tuple(c["caja"]))
+                if clave in vistas:
+                    continue
+                vistas.add(clave)
+                clip = _caja_recorte(c["caja"], rect)
+                if clip.is_empty:
+                    continue
+                rgb, pix = _renderizar(page, dpi_para(clip.width, clip.height, config.lado_max), clip)
+                manifiesto["recortes"].append({"pagina": num, "regla": c["regla"], "plantilla": c["plantilla"],
+                                               "caja": c["caja"], "imagen": lote.anadir(rgb, pix)})
+                del rgb, pix
+        subidas = lote.subidas()
+    finally:
+        doc.close()
+
+    logging.info(f"Evidencias: {len(manifiesto['paginas'])} páginas, {len(manifiesto['recortes'])} recortes, "
+                 f"{len(subidas)} imágenes nuevas ({sum(len(s[0]) for s in subidas) / 1024:.0f} KB, {config.formato})")
+    return manifiesto, subidas
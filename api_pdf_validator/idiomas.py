@@ -0,0 +1,76 @@
+import os
+import hashlib
+import threading
+
+from shared.cache import CacheLRU
+
+# ==========================================
+# DETECCIÓN DE IDIOMAS POR BLOQUE
+# ==========================================
+# langdetect es aleatorio salvo que se fije la semilla. Los perfiles se cargan
+# una vez por worker y se detecta bloque a bloque (agrupando los spans de
+# extraer_texto_pdf), porque una sola pasada sobre el documento completo
+# suele quedarse con uno o dos idiomas dominantes. langdetect se importa (y
+# se fija su semilla) en el primer uso.
+
+MIN_CARACTERES = 20      # Bloques más cortos no dan una detección fiable
+MAX_CARACTERES = 1500    # Tope de muestra por bloque
+PROB_MINIMA = 0.5
+
+_cache = CacheLRU(int(os.getenv("IDIOMAS_CACHE_MAX", "4096")))
+_langdetect = None
+_lock = threading.Lock()
+
+def _get_langdetect():
+    """Importa langdetect y fija la semilla (detección reproducible)."""
+    global _langdetect
+    if _langdetect is not None:
+        return _langdetect
+    with _lock:
+        if _langdetect is None:
+            import langdetect
+            from langdetect.detector_factory import init_factory
+            langdetect.DetectorFactory.seed = 0
+            init_factory()
+            _langdetect = langdetect
+        return _langdetect
+
+def precargar_perfiles():
+    """Carga los perfiles de langdetect (idempotente)."""
+    _get_langdetect()
+
+def _muestra(texto: str) -> str:
+    """Si el bloque es muy largo, toma tres ventanas repartidas (inicio, medio y final)."""
+    if len(texto) <= MAX_CARACTERES:
+        return texto
+    ventana = MAX_CARACTERES // 3
+    medio = (len(texto) - ventana) // 2
+    return " ".join([texto[:ventana], texto[medio:medio + ventana], texto[-ventana:]])
+
+def detectar_bloque(texto: str):
+    """Idiomas (prob >= PROB_MINIMA) de un bloque de texto, cacheados por hash."""
+    muestra = _muestra(texto)
+    clave = hashlib.sha1(muestra.encode("utf-8")).hexdigest()
+    idiomas = _cache.get(clave)
+    if idiomas is None:
+        langdetect = _get_langdetect()
+        try:
+            idiomas = tuple(l.lang for l in langdetect.detect_langs(muestra) if l.prob >= PROB_MINIMA)
+        except langdetect.LangDetectException:
+            idiomas = ()
+        _cache.set(clave, idiomas)
+    return idiomas
+
+def detectar_idiomas(bloques):
+    """
+    bloques: [(id_bloque, texto)].
+    Devuelve {idioma: [id_bloque, ...]} en orden de primera aparición.
+    """
+    precargar_perfiles()
+    encontrados = {}
+    for id_bloque, texto in bloques:
+        if len(texto) < MIN_CARACTERES:
+            continue
+        for lang in detectar_bloque(texto):
+            encontrados.setdefault(lang, []).append(id_bloque)
+    return encontrados
@@ -0,0 +1,156 @@
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+
+# ==========================================
+# ÍNDICE DE SPANS DE TEXTO
+# ==========================================
+# extraer_texto_pdf construye un IndiceTexto: cada span se normaliza y se pasa
+# a mayúsculas una sola vez y se indexa por su primer token (lo que consulta
+# primer_span_que_empieza). Las reglas de lista (alérgenos) se resuelven con
+# un autómata multipatrón en una sola pasada: buscan subcadenas, así que un
+# índice por token no les sirve.
+
+_RE_TOKEN = re.compile(r"\w+")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+def normalizar(texto: str) -> str:
+    """NFC + espacios colapsados (los PDF mezclan acentos compuestos y descompuestos)."""
+    return _RE_ESPACIOS.sub(" ", unicodedata.normalize("NFC", texto)).strip()
+
+class AutomataPatrones:
+    """Aho-Corasick: encuentra todos los patrones contenidos en un texto en O(len(texto))."""
+
+    def __init__(self, patrones):
+        self.patrones = list(patrones)
+        self._goto = [{}]
+        self._fail = [0]
+        self._salida = [set()]
+        for idx, patron in enumerate(self.patrones):
+            estado = 0
+            for ch in patron:
+                sig = self._goto[estado].get(ch)
+                if sig is None:
+                    sig = len(self._goto)
+                    self._goto[estado][ch] = sig
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._salida.append(set())
+                estado = sig
+            self._salida[estado].add(idx)
+
+        cola = deque(self._goto[0].values())
+        while cola:
+            estado = cola.popleft()
+            for ch, sig in self._goto[estado].items():
+                cola.append(sig)
+                f = self._fail[estado]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                destino = self._goto[f].get(ch, 0)
+                self._fail[sig] = destino if destino != sig else 0
+                self._salida[sig] |= self._salida[self._fail[sig]]
+
+    def buscar(self, texto: str):
+        """Índices de los patrones que aparecen en texto."""
+        encontrados = set()
+        estado = 0
+        for ch in texto:
+            while estado and ch not in self._goto[estado]:
+                estado = self._fail[estado]
+            estado = self._goto[estado].get(ch, 0)
+            if self._salida[estado]:
+                encontrados |= self._salida[estado]
+        return encontrados
+
+@lru_cache(maxsize=64)
+def automata_para(patrones: tuple):
+    """Autómata reutilizable para una lista de patrones (ya normalizados)."""
+    return AutomataPatrones(patrones)
+
+class IndiceTexto:
+    """
+    Spans del PDF con su texto normalizado y en mayúsculas precalculado,
+    índice por primer token y metadatos de negrita/posición.
+    Cada span es un dict: text, norm, upper, bold, font, bbox, pagina, bloque.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self._primer_token = {}
+        self._texto_completo = None
+        self._texto_upper = None
+        self._por_pagina = {}
+        self.num_paginas = 0  # páginas leídas (todas las del PDF si completo)
+        self.completo = True
+
+    def agregar(self, text, bold=False, font="", bbox=None, pagina=1, bloque=0):
+        norm = normalizar(text)
+        if not norm:
+            return
+        idx = len(self.spans)
+        self.spans.append({
+            "text": text, "norm": norm, "upper": norm.upper(), "bold": bold,
+            "font": font, "bbox": bbox, "pagina": pagina, "bloque": bloque,
+        })
+        primero = _RE_TOKEN.search(norm.lower())
+        if primero:
+            self._primer_token.setdefault(primero.group(), []).append(idx)
+        self._por_pagina.setdefault(pagina, []).append(idx)
+        self._texto_completo = self._texto_upper = None
+
+    def __iter__(self):
+        return iter(self.spans)
+
+    def __len__(self):
+        return len(self.spans)
+
+    @property
+    def texto_completo(self):
+        if self._texto_completo is None:
+            self._texto_completo = " ".join(s["text"] for s in self.spans)
+        return self._texto_completo
+
+    @property
+    def texto_upper(self):
+        if self._texto_upper is None:
+            self._texto_upper = self.texto_completo.upper()
+        return self._texto_upper
+
+    def paginas(self):
+        """Números de página que tienen capa de texto, en orden."""
+        return sorted(self._por_pagina)
+
+    def texto_pagina_upper(self, num: int) -> str:
+        """Texto nativo normalizado y en mayúsculas de una página ('' si no tiene)."""
+        return " ".join(self.spans[i]["upper"] for i in self._por_pagina.get(num, []))
+
+    def bloques(self):
+        """[(id_bloque, texto)] agrupando los spans por página y bloque de PyMuPDF."""
+        grupos = {}
+        for s in self.spans:
+            grupos.setdefault((s["pagina"], s["bloque"]), []).append(s["norm"])
+        return [(f"p{pag}b{blq}", " ".join(textos)) for (pag, blq), textos in grupos.items()]
+
+    def primer_span_que_empieza(self, prefijo: str):
+        """Primer span (en orden de lectura) cuyo texto empieza por prefijo (sin distinguir mayúsculas)."""
+        prefijo = prefijo.lower()
+        tokens = _RE_TOKEN.findall(prefijo)
+        if not tokens:
+            return next((s for s in self.spans if s["text"].lower().startswith(prefijo)), None)
+        candidatos = sorted(i for tok, ids in self._primer_token.items() if tok.startswith(tokens[0]) for i in ids)
+        return next((self.spans[i] for i in candidatos if self.spans[i]["text"].lower().startswith(prefijo)), None)
+
+    def buscar_lista(self, patrones):
+        """
+        {patron: [spans que lo contienen]} comparando en mayúsculas, con una
+        sola pasada del autómata por span.
+        """
+        claves = tuple(normalizar(p).upper() for p in patrones)
+        automata = automata_para(claves)
+        hallados = {p: [] for p in patrones}
+        for span in self.spans:
+            for idx in automata.buscar(span["upper"]):
+                hallados[patrones[idx]].append(span)
+        return hallados
@@ -0,0 +1,136 @@
+import json
+import uuid
+import base64
+import logging
+from datetime import datetime, timezone
+
+from shared.azure_blob import subir_bytes, subir_json, descargar_bytes, descargar_en_bloques, listar_blobs
+from . import validar_pdf
+from .entrada import normalizar_opciones
+
+# ==========================================
+# VALIDACIÓN POR LOTES (fan-out por cola)
+# ==========================================
+# validaciones/lotes/<id>/manifiesto.json      -> lista de PDFs y opciones
+# validaciones/lotes/<id>/entrada/<n>.pdf      -> PDFs enviados inline
+# validaciones/lotes/<id>/resultados/<n>.json  -> un resultado por PDF
+# validaciones/lotes/<id>/informes/<n>.json    -> informe de cada PDF (dos
+#                                                 PDFs con el mismo nombre no se pisan)
+# validaciones/lotes/<id>/resumen.json         -> agregado al terminar
+# Cada PDF es un mensaje de la cola COLA_LOTES; el progreso se calcula
+# contando resultados, así los workers no comparten ningún contador.
+
+COLA_LOTES = "validaciones-lote"
+PREFIJO = "validaciones/lotes"
+MAX_REINTENTOS = 5  # Igual que maxDequeueCount por defecto de las colas
+
+def _ahora():
+    return datetime.now(timezone.utc).isoformat()
+
+def _ruta(lote_id, *partes):
+    return "/".join([PREFIJO, lote_id, *partes])
+
+def _leer_json(container, ruta):
+    data = descargar_bytes(container, ruta)
+    return json.loads(data) if data is not None else None
+
+def crear_lote(pdfs, opciones: dict, container: str):
+    """
+    Registra el lote y devuelve (lote_id, mensajes_cola).
+    pdfs: [{"filename", "file": base64}] o [{"blob": ruta, "filename"?}]
+    Lanza ValueError si el manifiesto no es válido (400) e IOError si no se
+    pudo guardar en blob.
+    """
+    if not isinstance(pdfs, list) or not all(isinstance(pdf, dict) for pdf in pdfs):
+        raise ValueError("'pdfs' debe ser una lista de objetos {filename, file} o {blob, filename}")
+    if not isinstance(opciones, dict):
+        raise ValueError("'opciones' debe ser un objeto")
+    for n, pdf in enumerate(pdfs, start=1):
+        if not pdf.get("blob") and not pdf.get("file"):
+            raise ValueError(f"Elemento {n} del manifiesto sin 'file' ni 'blob'")
+
+    lote_id = uuid.uuid4().hex
+    opciones = normalizar_opciones(opciones)
+    items = []
+    for n, pdf in enumerate(pdfs, start=1):
+        if pdf.get("blob"):
+            ruta = pdf["blob"]
+            filename = pdf.get("filename") or ruta.rsplit("/", 1)[-1]
+        elif pdf.get("file"):
+            # Los PDFs inline no caben en un mensaje de cola (64 KB): se dejan en blob
+            ruta = _ruta(lote_id, "entrada", f"{n}.pdf")
+            try:
+                datos = base64.b64decode(pdf["file"])
+            except (TypeError, ValueError):
+                raise ValueError(f"Elemento {n} del manifiesto: 'file' no es base64 válido")
+            if not subir_bytes(datos, container, ruta, "application/pdf"):
+                raise IOError(f"Lote {lote_id}: no se pudo guardar el PDF {n} en blob")
+            filename = pdf.get("filename") or f"documento_{n}.pdf"
+        items.append({"n": n, "filename": filename, "blob": ruta})
+
+    manifiesto = {"lote_id": lote_id, "total": len(items), "creado": _ahora(), "opciones": opciones, "items": items}
+    if not subir_json(manifiesto, container, _ruta(lote_id, "manifiesto.json")):
+        raise IOError(f"Lote {lote_id}: no se pudo guardar el manifiesto en blob")
+    mensajes = [json.dumps({"lote_id": lote_id, "opciones": opciones, "container": container, **it}, ensure_ascii=False)
+                for it in items]
+    logging.info(f"Lote {lote_id} creado con {len(items)} PDFs")
+    return lote_id, mensajes
+
+def procesar_item(mensaje: dict, intento: int = 1):
+    """Valida un PDF del lote y registra su resultado. Escribe el resumen si es el último."""
+    lote_id, n, container = mensaje["lote_id"], mensaje["n"], mensaje["container"]
+    filename = mensaje["filename"]
+    try:
+        pdf_bytes = descargar_en_bloques(container, mensaje["blob"])
+        if pdf_bytes is None:
+            raise FileNotFoundError(f"No existe el blob '{container}/{mensaje['blob']}'")
+        destino = _ruta(lote_id, "informes", f"{n}.json")
+        informe = validar_pdf(pdf_bytes, filename, mensaje.get("opciones") or {}, destino_informe=destino)
+        resultado = {"n": n, "archivo": filename, "estado_general": informe["estado_general"], "informe": destino}
+    except Exception as e:
+        if intento < MAX_REINTENTOS:
+            raise  # La cola reintenta
+        logging.exception(f"Lote {lote_id}: PDF {n} falló definitivamente")
+        resultado = {"n": n, "archivo": filename, "estado_general": "Error", "error": str(e)}
+
+    subir_json(resultado, container, _ruta(lote_id, "resultados", f"{n}.json"))
+    estado = estado_lote(lote_id, container)
+    if estado and estado["completados"] >= estado["total"] and not estado.get("resumen"):
+        escribir_resumen(lote_id, container)
+
+def escribir_resumen(lote_id: str, container: str):
+    """Agrega todos los resultados del lote (idempotente)."""
+    resultados = []
+    for ruta in listar_blobs(container, _ruta(lote_id, "resultados/")):
+        r = _leer_json(container, ruta)
+        if r: resultados.append(r)
+    resultados.sort(key=lambda r: r["n"])
+    resumen = {
+        "lote_id": lote_id,
+        "total": len(resultados),
+        "aprobados": sum(1 for r in resultados if r["estado_general"] == "Aprobado"),
+        "rechazados": sum(1 for r in resultados if r["estado_general"] == "Rechazado"),
+        "errores": sum(1 for r in resultados if r["estado_general"] == "Error"),
+        "completado": _ahora(),
+        "resultados": resultados,
+    }
+    subir_json(resumen, container, _ruta(lote_id, "resumen.json"))
+    logging.info(f"Lote {lote_id} completado")
+    return resumen
+
+def estado_lote(lote_id: str, container: str):
+    """Progreso del lote o None si no existe."""
+    manifiesto = _leer_json(container, _ruta(lote_id, "manifiesto.json"))
+    if manifiesto is None:
+        return None
+    completados = len(listar_blobs(container, _ruta(lote_id, "resultados/")))
+    resumen = _leer_json(container, _ruta(lote_id, "resumen.json"))
+    return {
+        "lote_id": lote_id,
+        "total": manifiesto["total"],
+        "completados": completados,
+        "pendientes": manifiesto["total"] - completados,
+        "estado": "Completado" if resumen else ("En curso" if completados else "En cola"),
+        "creado": manifiesto["creado"],
+        "resumen": resumen,
+    }
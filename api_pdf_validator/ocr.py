@@ -0,0 +1,88 @@
+import os
+import logging
+
+from shared.perezoso import perezoso
+from .indice_texto import normalizar
+
+fitz = perezoso("fitz")  # PyMuPDF
+
+# ==========================================
+# OCR ESCALONADO (texto nativo primero)
+# ==========================================
+# 1. Se busca el patrón en la capa de texto nativa de cada página.
+# 2. Sólo se envía a Azure Vision lo que no tiene capa de texto: la página
+#    completa si no tiene ningún span, o sus regiones de imagen / dibujo
+#    vectorial en caso contrario. Cada recorte se renderiza a la resolución
+#    justa para Vision en vez de a 300 dpi.
+
+OCR_DPI_MAX = 300
+OCR_LADO_MAX_PX = int(os.getenv("OCR_LADO_MAX_PX", "2048"))
+OCR_LADO_MIN_PX = 50          # Mínimo admitido por la API Read
+REGION_MIN_PT = 36            # Regiones menores (media pulgada) no contienen texto legible
+
+def _regiones_imagen(page):
+    """Rectángulos de imágenes y grupos de dibujos vectoriales de la página."""
+    rects = []
+    for info in page.get_image_info():
+        rects.append(fitz.Rect(info["bbox"]))
+    if hasattr(page, "cluster_drawings"):
+        try:
+            rects.extend(fitz.Rect(r) for r in page.cluster_drawings())
+        except Exception as e:
+            logging.debug(f"cluster_drawings no disponible: {e}")
+    visibles = []
+    for r in rects:
+        r = r & page.rect
+        if r.is_empty or r.width < REGION_MIN_PT or r.height < REGION_MIN_PT:
+            continue
+        visibles.append(r)
+    return _fusionar_solapadas(visibles)
+
+def _fusionar_solapadas(rects):
+    """Une rectángulos que se solapan para no enviar el mismo contenido dos veces."""
+    fusionados = []
+    for r in sorted(rects, key=lambda x: (x.y0, x.x0)):
+        for i, f in enumerate(fusionados):
+            if f.intersects(r):
+                fusionados[i] = f | r
+                break
+        else:
+            fusionados.append(fitz.Rect(r))
+    return fusionados
+
+def _dpi_para(rect):
+    """DPI que deja el lado mayor del recorte en OCR_LADO_MAX_PX (sin pasar de 300)."""
+    lado_pt = max(rect.width, rect.height)
+    dpi = min(OCR_DPI_MAX, OCR_LADO_MAX_PX * 72.0 / lado_pt)
+    lado_min_pt = min(rect.width, rect.height)
+    return int(round(max(dpi, OCR_LADO_MIN_PX * 72.0 / lado_min_pt)))
+
+def recortes_para_ocr(pdf_bytes: bytes, indice, paginas=None):
+    """
+    Devuelve [(num_pagina, png_bytes)] con lo que realmente necesita OCR.
+    indice: IndiceTexto con los spans nativos (para saber qué páginas tienen texto).
+    paginas: números de página a considerar (por defecto todas).
+    """
+    recortes = []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for num, page in enumerate(doc, start=1):
+            if paginas is not None and num not in paginas:
+                continue
+            if indice.texto_pagina_upper(num):
+                regiones = _regiones_imagen(page)
+            else:
+                regiones = [page.rect]
+            for rect in regiones:
+                pix = page.get_pixmap(dpi=_dpi_para(rect), clip=rect, alpha=False)
+                recortes.append((num, pix.tobytes("png")))
+    logging.info(f"OCR escalonado: {len(recortes)} recortes a Vision")
+    return recortes
+
+def patron_en_texto_nativo(indice, patrones):
+    """Primera página cuyo texto nativo contiene alguno de los patrones, o None."""
+    patrones = [normalizar(p).upper() for p in patrones]
+    for num in indice.paginas():
+        texto = indice.texto_pagina_upper(num)
+        if any(p in texto for p in patrones):
+            return num
+    return None
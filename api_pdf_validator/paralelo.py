@@ -0,0 +1,190 @@
+import os
+import logging
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# ==========================================
+# PIPELINE DE PÁGINAS EN PARALELO
+# ==========================================
+# Cada página se renderiza y se compara contra las plantillas en un proceso
+# del pool. Las reglas template_* se deciden en la primera página que las
+# resuelve; esa página se publica en memoria compartida para que las páginas
+# posteriores dejen de trabajar en la regla.
+#
+# El pool es uno por worker y se crea con la primera petición (o en el
+# precalentamiento): arrancar procesos forkserver y decodificar en cada uno
+# las plantillas cuesta más que validar un PDF de pocas páginas. El
+# inicializador carga las plantillas una vez por proceso; cada tarea sólo
+# comprueba su huella y recarga las que cambiaron. El PDF de cada petición
+# va en un bloque de memoria compartida junto con la página en la que se
+# decidió cada regla. Cada petición se reparte en una tarea por proceso
+# (páginas intercaladas: 1, 1+P, 1+2P...) que abre el PDF una vez y lo
+# suelta al terminar: un proceso ocioso no retiene nada de la última petición.
+
+TIPOS_PARALELOS = ("template_match", "template_prohibido")
+CONTEXTO_MP = os.getenv("VALIDADOR_MP_CONTEXTO", "forkserver")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def procesos_disponibles():
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    limite = int(os.getenv("VALIDADOR_MAX_PROCESOS", "0") or 0)
+    return max(1, min(cores, limite) if limite > 0 else cores)
+
+def _inicializar(rutas_plantillas):
+    """Inicializador del pool: decodifica las plantillas una vez por proceso."""
+    from .plantillas import obtener_plantilla
+    for ruta in rutas_plantillas:
+        obtener_plantilla(ruta)
+
+def _get_pool(rutas_plantillas=()):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            max_workers = procesos_disponibles()
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context(CONTEXTO_MP),
+                                        initializer=_inicializar, initargs=(tuple(sorted(rutas_plantillas)),))
+            logging.info(f"Pipeline paralelo: pool de {max_workers} procesos ({CONTEXTO_MP})")
+        return _pool
+
+def iniciar_pool(rutas_plantillas=()):
+    """Crea el pool (si no existe) y arranca sus procesos con las plantillas cargadas (warmup)."""
+    pool = _get_pool(rutas_plantillas)
+    list(pool.map(int, range(procesos_disponibles())))
+
+def cerrar_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _desplazamiento(tam_pdf):
+    """Posición (alineada a 4 bytes) de las páginas decididas tras el PDF."""
+    return (tam_pdf + 3) // 4 * 4
+
+# Sin cerrojo: si dos procesos marcan a la vez puede quedar la página mayor.
+# Sólo se salta menos trabajo; _fusionar recorre las páginas en orden y la
+# página que decidió la regla siempre trae su resultado.
+def _decidida_antes(decididas, idx, num):
+    pag = int(decididas[idx])
+    return pag != 0 and pag < num
+
+def _marcar_decidida(decididas, idx, num):
+    if decididas[idx] == 0 or num < decididas[idx]:
+        decididas[idx] = num
+
+def _procesar_pagina(doc, decididas, reglas, dpi, codificar, num):
+    """Renderiza la página `num` (1-based) y evalúa las reglas template_* pendientes."""
+    from . import renderizar_pagina, evaluar_plantillas_pagina
+
+    pagina = renderizar_pagina(doc[num - 1], num, dpi, gris=not codificar)
+    resultados = {}
+    for idx, r in enumerate(reglas):
+        if _decidida_antes(decididas, idx, num):
+            continue
+        ok, evidencia = evaluar_plantillas_pagina(pagina, r)
+        if ok == (r["tipo"] == "template_match"):
+            _marcar_decidida(decididas, idx, num)
+        resultados[idx] = (ok, evidencia)
+
+    png = pagina.a_bytes("png") if codificar else None
+    return num, resultados, png, pagina.coincidencias
+
+def _procesar_paginas(peticion, reglas, dpi, codificar, nums):
+    """
+    Tarea del pool: las páginas `nums` (en orden) de una petición. El PDF y
+    la vista de las decididas sólo viven mientras dura la tarea.
+    """
+    import fitz
+    import numpy as np
+    from .plantillas import actualizar_plantillas
+
+    nombre_shm, tam_pdf, num_reglas, huellas = peticion
+    actualizar_plantillas(huellas)
+    shm = shared_memory.SharedMemory(name=nombre_shm)
+    decididas = None
+    try:
+        decididas = np.ndarray((num_reglas,), dtype=np.int32, buffer=shm.buf, offset=_desplazamiento(tam_pdf))
+        with fitz.open(stream=bytes(shm.buf[:tam_pdf]), filetype="pdf") as doc:
+            return [_procesar_pagina(doc, decididas, reglas, dpi, codificar, num) for num in nums]
+    finally:
+        del decididas  # la vista numpy impide cerrar el bloque
+        shm.close()
+
+class PaginaCodificada:
+    """
+    Página devuelta por el pool: sólo conserva los bytes ya codificados y
+    dónde se localizaron las plantillas (en puntos PDF).
+    """
+    def __init__(self, num, png, coincidencias=None):
+        self.num = num
+        self._png = png
+        self.coincidencias = coincidencias or []
+
+    def a_bytes(self, formato: str = "png"):
+        if formato != "png":
+            raise ValueError(f"Formato no disponible en modo paralelo: {formato}")
+        return self._png
+
+def _fusionar(regla, por_pagina):
+    """Reproduce la semántica serie de validar_visual recorriendo páginas en orden."""
+    ok, evidencia = False, "No evaluado"
+    for num in sorted(por_pagina):
+        ok, evidencia = por_pagina[num]
+        if regla["tipo"] == "template_match" and ok: break
+        if regla["tipo"] == "template_prohibido" and not ok: break
+    if regla["tipo"] == "template_match" and not ok:
+        evidencia = "No evaluado"
+    return ok, evidencia
+
+def validar_paginas_paralelo(pdf_bytes: bytes, num_paginas: int, reglas, dpi: int = 300, codificar: bool = False):
+    """
+    Ejecuta render + template matching por página en el pool de procesos.
+    Devuelve ({idx_regla: (ok, evidencia)}, [PaginaCodificada]) donde idx_regla
+    es la posición en `reglas` (sólo reglas template_*). Las páginas sólo
+    traen bytes si codificar=True (subida de evidencias).
+    """
+    from functools import partial
+    from .plantillas import plantillas_de_reglas, huellas_plantillas
+
+    reglas_tmpl = [r for r in reglas if r["tipo"] in TIPOS_PARALELOS]
+    indices = [i for i, r in enumerate(reglas) if r["tipo"] in TIPOS_PARALELOS]
+    rutas = plantillas_de_reglas(reglas_tmpl)
+    pool = _get_pool(rutas)
+    logging.info(f"Pipeline paralelo: {num_paginas} páginas")
+
+    tam_pdf = len(pdf_bytes)
+    num_reglas = max(1, len(reglas_tmpl))
+    shm = shared_memory.SharedMemory(create=True, size=_desplazamiento(tam_pdf) + 4 * num_reglas)
+    por_regla = {i: {} for i in range(len(reglas_tmpl))}
+    paginas = {}
+    try:
+        shm.buf[:tam_pdf] = pdf_bytes
+        shm.buf[_desplazamiento(tam_pdf):] = bytes(4 * num_reglas)
+        peticion = (shm.name, tam_pdf, num_reglas, huellas_plantillas(rutas))
+        tarea = partial(_procesar_paginas, peticion, reglas_tmpl, dpi, codificar)
+        procesos = min(procesos_disponibles(), num_paginas)
+        repartos = [range(k, num_paginas + 1, procesos) for k in range(1, procesos + 1)]
+        for lote in pool.map(tarea, repartos):
+            for num, resultados, png, coincidencias in lote:
+                for idx, res in resultados.items():
+                    por_regla[idx][num] = res
+                paginas[num] = PaginaCodificada(num, png, coincidencias)
+    except BrokenProcessPool:
+        # Un proceso murió (p. ej. sin memoria): la siguiente petición crea otro pool
+        cerrar_pool()
+        raise
+    finally:
+        shm.close()
+        shm.unlink()
+
+    fusionados = {indices[i]: _fusionar(r, por_regla[i]) for i, r in enumerate(reglas_tmpl)}
+    return fusionados, [paginas[n] for n in sorted(paginas)]
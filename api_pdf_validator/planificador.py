@@ -0,0 +1,76 @@
+# ==========================================
+# PLANIFICADOR DE REGLAS (orden por coste + fail-fast)
+# ==========================================
+# Las reglas se evalúan de la más barata a la más cara según un coste
+# estimado: regex sobre el índice de texto < langdetect < template matching
+# (que además obliga a renderizar) < OCR en Azure Vision. En modo completo
+# se evalúan todas; con fail_fast la evaluación se corta en la primera regla
+# requerida que no se cumple y el resto sale en el informe como omitida.
+# El informe conserva siempre el orden de Reglas.json.
+#
+# Una regla puede fijar su propio coste con "coste" y declararse opcional
+# con "requerido": false (no rechaza el PDF ni detiene el fail_fast).
+
+COSTE_POR_TIPO = {
+    "texto": 1,
+    "regex_valido": 1,
+    "regex_invalido": 1,
+    "ingredientes_titulo": 1,
+    "texto_condicional": 2,
+    "alergenos": 3,
+    "idiomas_manual": 20,
+    "template_prohibido": 100,  # por plantilla (+ render de las páginas)
+    "template_match": 100,
+    "ocr_text": 1000,
+}
+COSTE_DESCONOCIDO = 50
+
+# (grupo en Reglas.json, categoría en el informe) en el orden del informe
+CATEGORIAS = (("texto", "Texto"), ("visual", "Visual"), ("idiomas", "Idiomas"))
+
+def coste_regla(regla) -> float:
+    """Coste relativo estimado de evaluar la regla."""
+    if "coste" in regla:
+        return float(regla["coste"])
+    coste = COSTE_POR_TIPO.get(regla.get("tipo"), COSTE_DESCONOCIDO)
+    if regla.get("tipo") == "template_match":
+        coste *= max(1, len([t for t in regla.get("templates", [regla.get("template")]) if t]))
+    return coste
+
+def es_requerida(regla) -> bool:
+    return regla.get("requerido", True) is not False
+
+def planificar(reglas: dict):
+    """[(grupo, idx, regla)] de más barata a más cara (a igual coste, orden de Reglas.json)."""
+    tareas = [(grupo, idx, r) for grupo, _ in CATEGORIAS for idx, r in enumerate(reglas.get(grupo, []))]
+    return sorted(tareas, key=lambda t: coste_regla(t[2]))
+
+def ejecutar(reglas: dict, evaluar, fail_fast: bool = False):
+    """
+    Evalúa las reglas en el orden del plan con evaluar(grupo, idx, regla) ->
+    (cumple, evidencia). Devuelve (resultados, aprobado, detenida): los
+    resultados en el orden del informe, si todas las requeridas se cumplen
+    y el nombre de la regla que cortó la evaluación (None en modo completo).
+    """
+    hechos = {}
+    detenida = None
+    for grupo, idx, r in planificar(reglas):
+        ok, evidencia = evaluar(grupo, idx, r)
+        hechos[(grupo, idx)] = (ok, evidencia)
+        if fail_fast and not ok and es_requerida(r):
+            detenida = r["nombre"]
+            break
+
+    resultados = []
+    aprobado = detenida is None
+    for grupo, categoria in CATEGORIAS:
+        for idx, r in enumerate(reglas.get(grupo, [])):
+            if (grupo, idx) in hechos:
+                ok, evidencia = hechos[(grupo, idx)]
+                resultados.append({"categoria": categoria, "regla": r["nombre"], "cumple": ok, "evidencia": evidencia})
+                if not ok and es_requerida(r):
+                    aprobado = False
+            else:
+                resultados.append({"categoria": categoria, "regla": r["nombre"], "cumple": None,
+                                   "evidencia": f"Omitida (fail_fast tras '{detenida}')", "omitida": True})
+    return resultados, aprobado, detenida
@@ -0,0 +1,160 @@
+import os
+import hashlib
+import logging
+import threading
+
+from shared.perezoso import perezoso
+
+cv2 = perezoso("cv2")
+np = perezoso("numpy")
+
+# ==========================================
+# ALMACÉN DE PLANTILLAS (Pictogramas)
+# ==========================================
+# Las plantillas se decodifican una sola vez por worker y se guardan en gris.
+# Los niveles de la pirámide de escalas se construyen al pedirlos: la
+# similitud es el máximo sobre los niveles probados, así que cada nivel de
+# más sube también la puntuación de las páginas sin el logo. Por eso una
+# regla sólo usa la escala 1.0 salvo que declare "escalas" en Reglas.json
+# (y su umbral esté calibrado para ellas). El almacén es global al proceso.
+
+ESCALAS_PIRAMIDE = (0.5, 0.75, 1.0, 1.25, 1.5)  # escalas que puede pedir una regla
+ESCALAS_POR_DEFECTO = (1.0,)
+TAMANO_MINIMO_PX = 8
+
+_plantillas = {}
+_lock = threading.Lock()
+
+def _base_assets():
+    # __file__ = .../api_pdf_validator/plantillas.py
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+
+def _escalar(img, escala):
+    """Nivel de la pirámide (None si queda demasiado pequeño)."""
+    if escala == 1.0:
+        return img
+    h, w = img.shape[:2]
+    nw, nh = int(round(w * escala)), int(round(h * escala))
+    if nw < TAMANO_MINIMO_PX or nh < TAMANO_MINIMO_PX:
+        return None
+    interp = cv2.INTER_AREA if escala < 1.0 else cv2.INTER_LINEAR
+    return cv2.resize(img, (nw, nh), interpolation=interp)
+
+def escalas_regla(regla):
+    """Escalas de la pirámide que prueba la regla ("escalas" en Reglas.json)."""
+    return tuple(regla.get("escalas") or ESCALAS_POR_DEFECTO)
+
+def niveles(plantilla, escalas=ESCALAS_POR_DEFECTO, alto: int = None, ancho: int = None):
+    """
+    [(escala, array)] de la plantilla en las escalas pedidas, sin los niveles
+    que no caben en una página de alto x ancho px (nunca pueden coincidir).
+    """
+    piramide = plantilla["piramide"]
+    resultado = []
+    for escala in escalas:
+        if escala not in piramide:
+            img = _escalar(plantilla["gris"], escala)
+            with _lock:
+                piramide.setdefault(escala, img)
+        img = piramide[escala]
+        if img is None:
+            continue
+        th, tw = img.shape[:2]
+        if (alto is not None and th > alto) or (ancho is not None and tw > ancho):
+            continue
+        resultado.append((escala, img))
+    return resultado
+
+def _cargar(rel_path):
+    full_path = os.path.join(_base_assets(), rel_path)
+    if not os.path.exists(full_path):
+        return None
+    with open(full_path, "rb") as f:
+        data = f.read()
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        logging.warning(f"No se pudo decodificar la plantilla: {rel_path}")
+        return None
+    return {
+        "ruta": rel_path,
+        "mtime": os.path.getmtime(full_path),
+        "huella": hashlib.sha256(data).hexdigest(),  # contenido del fichero (versión de las reglas)
+        "gris": img,
+        "piramide": {1.0: img},  # escala -> array (None si queda demasiado pequeña)
+    }
+
+def plantillas_de_reglas(reglas_visual):
+    """Conjunto de rutas de plantilla referenciadas por las reglas visuales."""
+    rutas = set()
+    for r in reglas_visual or []:
+        for t in r.get("templates", []) or []:
+            if t: rutas.add(t)
+        if r.get("template"):
+            rutas.add(r["template"])
+    return rutas
+
+def obtener_plantilla(rel_path):
+    """
+    Devuelve la entrada del almacén para rel_path (o None si no existe en assets).
+    Entrada: {"ruta", "mtime", "huella", "gris": ndarray, "piramide": {escala: ndarray}};
+    los niveles se piden con niveles().
+    """
+    with _lock:
+        entrada = _plantillas.get(rel_path)
+    if entrada is not None:
+        return entrada
+    entrada = _cargar(rel_path)
+    if entrada is not None:
+        with _lock:
+            _plantillas[rel_path] = entrada
+    return entrada
+
+def huellas_plantillas(rutas) -> dict:
+    """ruta -> sha256 del fichero de la plantilla (None si no está en assets)."""
+    huellas = {}
+    for ruta in sorted(rutas):
+        entrada = obtener_plantilla(ruta)
+        huellas[ruta] = entrada["huella"] if entrada is not None else None
+    return huellas
+
+def actualizar_plantillas(huellas: dict):
+    """
+    Recarga las plantillas cuya huella no coincide con la del proceso que
+    reparte el trabajo (ficheros cambiados desde que se cargaron). No expulsa
+    nada: el almacén puede servir a varios conjuntos de reglas.
+    """
+    for ruta, huella in huellas.items():
+        entrada = obtener_plantilla(ruta)
+        if entrada is not None and entrada["huella"] == huella:
+            continue
+        nueva = _cargar(ruta)
+        with _lock:
+            if nueva is None:
+                _plantillas.pop(ruta, None)
+            else:
+                _plantillas[ruta] = nueva
+
+def sincronizar_plantillas(reglas_visual):
+    """
+    Carga todas las plantillas usadas por las reglas, recarga las que cambiaron
+    en disco y expulsa las que ya no usa ninguna regla.
+    """
+    usadas = plantillas_de_reglas(reglas_visual)
+    with _lock:
+        for ruta in list(_plantillas):
+            if ruta not in usadas:
+                del _plantillas[ruta]
+        actuales = dict(_plantillas)
+
+    for ruta in usadas:
+        entrada = actuales.get(ruta)
+        full_path = os.path.join(_base_assets(), ruta)
+        if entrada is not None and os.path.exists(full_path) and os.path.getmtime(full_path) == entrada["mtime"]:
+            continue
+        nueva = _cargar(ruta)
+        with _lock:
+            if nueva is None:
+                _plantillas.pop(ruta, None)
+            else:
+                _plantillas[ruta] = nueva
+    return usadas
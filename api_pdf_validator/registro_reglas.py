@@ -0,0 +1,368 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+import unicodedata
+from types import MappingProxyType
+
+from shared.azure_blob import descargar_bytes, listar_etags
+from .busqueda import MODO_EXHAUSTIVO, MODO_GRUESO_FINO
+from .plantillas import (obtener_plantilla, sincronizar_plantillas, plantillas_de_reglas, huellas_plantillas,
+                         ESCALAS_PIRAMIDE)
+from .cache_resultados import version_reglas
+
+# ==========================================
+# REGISTRO DE CONJUNTOS DE REGLAS
+# ==========================================
+# Cada conjunto es un JSON con los grupos texto / visual / idiomas:
+#   assets/Reglas.json                    -> conjunto "default"
+#   assets/reglas/<nombre>.json           -> conjunto <nombre> (marca o retailer)
+#   <REGLAS_BLOB_CONTAINER>/reglas/<nombre>.json
+#                                         -> igual desde Blob Storage; pisa al
+#                                            local del mismo nombre
+# Un conjunto declara a qué marcas y retailers aplica con
+#   "meta": {"marcas": ["HIPERCOR"], "retailers": ["El Corte Inglés"]}
+# y la petición lo elige con "conjunto", "marca" o "retailer" (si la marca
+# no tiene conjunto propio se usa "default").
+#
+# Al cargarse, el conjunto se valida contra ESQUEMA, sus regex se
+# precompilan, sus plantillas pasan al almacén y las reglas se congelan (una
+# plantilla ausente sólo se avisa: falla su regla, no el conjunto). La
+# versión es el hash del contenido: entra en la clave de la caché de
+# informes y cada informe la anota. Las fuentes se revisan cada REGLAS_TTL_S
+# (mtime en disco, ETag en blob); si un conjunto cambia y la versión nueva
+# no es válida, se sigue sirviendo la anterior.
+
+TTL_S = float(os.getenv("REGLAS_TTL_S", "10"))
+BLOB_PREFIJO = os.getenv("REGLAS_BLOB_PREFIJO", "reglas/")
+CONJUNTO_POR_DEFECTO = "default"
+
+GRUPOS = ("texto", "visual", "idiomas")
+# grupo -> tipo -> campos obligatorios y su tipo
+ESQUEMA = {
+    "texto": {
+        "ingredientes_titulo": {},
+        "alergenos": {"lista": list},
+        "regex_valido": {"patron": str},
+        "regex_invalido": {"patron": str},
+        "texto": {"patron": str},
+        "texto_condicional": {"condiciones": list},
+    },
+    "visual": {
+        "template_match": {},  # "templates" (lista) o "template"
+        "template_prohibido": {"template": str},
+        "ocr_text": {"patrones": list},
+    },
+    "idiomas": {
+        "idiomas_manual": {},
+    },
+}
+OPCIONALES = {
+    "requerido": bool,
+    "coste": (int, float),
+    "umbral": (int, float),
+    "busqueda": str,
+    "factor_grueso": (int, float),
+    "holgura": (int, float),
+    "min_idiomas": int,
+    "templates": list,
+    "template": str,
+    "escalas": list,
+}
+
+class ReglasInvalidas(ValueError):
+    def __init__(self, nombre, errores):
+        self.errores = errores
+        super().__init__(f"Conjunto de reglas '{nombre}' inválido: " + "; ".join(errores))
+
+class ConjuntoDesconocido(ValueError):
+    """La petición pide un conjunto que no existe (se devuelve como 400)."""
+
+def _base_assets():
+    # __file__ = .../api_pdf_validator/registro_reglas.py
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+
+def _normalizar(texto: str) -> str:
+    """Clave de marca/retailer: sin tildes, mayúsculas y espacios simples."""
+    sin_tildes = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    return " ".join(sin_tildes.upper().split())
+
+def _compilar(patron):
+    return re.compile(patron, re.IGNORECASE)
+
+# ------------------------------------------
+# Validación y precompilado
+# ------------------------------------------
+def validar_esquema(datos) -> list:
+    """Lista de errores del conjunto (vacía si es válido)."""
+    if not isinstance(datos, dict):
+        return ["el conjunto debe ser un objeto JSON"]
+    errores = []
+    for clave in datos:
+        if clave not in GRUPOS and clave != "meta":
+            errores.append(f"clave desconocida '{clave}'")
+
+    meta = datos.get("meta", {})
+    if not isinstance(meta, dict):
+        errores.append("'meta' debe ser un objeto")
+    else:
+        for campo in ("marcas", "retailers"):
+            valores = meta.get(campo, [])
+            if not isinstance(valores, list) or not all(isinstance(v, str) for v in valores):
+                errores.append(f"'meta.{campo}' debe ser una lista de textos")
+
+    for grupo in GRUPOS:
+        reglas = datos.get(grupo, [])
+        if not isinstance(reglas, list):
+            errores.append(f"'{grupo}' debe ser una lista")
+            continue
+        for n, r in enumerate(reglas):
+            donde = f"{grupo}[{n}]"
+            if not isinstance(r, dict):
+                errores.append(f"{donde}: la regla debe ser un objeto")
+                continue
+            if not isinstance(r.get("nombre"), str) or not r["nombre"].strip():
+                errores.append(f"{donde}: falta 'nombre'")
+            else:
+                donde = f"{grupo}[{n}] '{r['nombre']}'"
+            tipo = r.get("tipo")
+            if tipo not in ESQUEMA[grupo]:
+                errores.append(f"{donde}: tipo '{tipo}' no válido en '{grupo}' ({', '.join(ESQUEMA[grupo])})")
+                continue
+            for campo, clase in ESQUEMA[grupo][tipo].items():
+                if not isinstance(r.get(campo), clase):
+                    errores.append(f"{donde}: falta '{campo}' ({clase.__name__})")
+            for campo, clase in OPCIONALES.items():
+                if campo in r and (not isinstance(r[campo], clase) or (clase != bool and isinstance(r[campo], bool))):
+                    errores.append(f"{donde}: '{campo}' tiene un tipo no válido")
+            errores.extend(_validar_campos(donde, tipo, r))
+    return errores
+
+def _validar_campos(donde, tipo, r):
+    errores = []
+    if isinstance(r.get("patron"), str):
+        try:
+            _compilar(r["patron"])
+        except re.error as e:
+            errores.append(f"{donde}: regex no válida ({e})")
+    if tipo == "texto_condicional" and isinstance(r.get("condiciones"), list):
+        for c in r["condiciones"]:
+            if not isinstance(c, dict) or not isinstance(c.get("marca"), str) or not isinstance(c.get("patron"), str):
+                errores.append(f"{donde}: cada condición necesita 'marca' y 'patron'")
+                continue
+            try:
+                _compilar(c["patron"])
+            except re.error as e:
+                errores.append(f"{donde}: regex no válida en la marca {c['marca']} ({e})")
+    for campo in ("lista", "patrones"):
+        if isinstance(r.get(campo), list) and not all(isinstance(v, str) for v in r[campo]):
+            errores.append(f"{donde}: '{campo}' debe ser una lista de textos")
+    if isinstance(r.get("umbral"), (int, float)) and not 0 <= r["umbral"] <= 1:
+        errores.append(f"{donde}: 'umbral' fuera de [0, 1]")
+    if "busqueda" in r and r["busqueda"] not in (MODO_EXHAUSTIVO, MODO_GRUESO_FINO):
+        errores.append(f"{donde}: 'busqueda' debe ser '{MODO_EXHAUSTIVO}' o '{MODO_GRUESO_FINO}'")
+    if tipo in ("template_match", "template_prohibido"):
+        rutas = [t for t in r.get("templates", []) or [] if isinstance(t, str)]
+        if isinstance(r.get("template"), str):
+            rutas.append(r["template"])
+        if not rutas:
+            errores.append(f"{donde}: falta 'templates' o 'template'")
+    if isinstance(r.get("escalas"), list) and (not r["escalas"] or not all(e in ESCALAS_PIRAMIDE for e in r["escalas"])):
+        errores.append(f"{donde}: 'escalas' debe tomar valores de {list(ESCALAS_PIRAMIDE)}")
+    return errores
+
+def plantillas_ausentes(datos) -> list:
+    """
+    Rutas de plantilla que no están en assets. No invalidan el conjunto: la
+    regla que las usa sale como no cumplida con "Template no encontrado".
+    """
+    rutas = plantillas_de_reglas(datos.get("visual", []))
+    return sorted(ruta for ruta in rutas if obtener_plantilla(ruta) is None)
+
+class ReglaCongelada(dict):
+    """dict de sólo lectura; se puede enviar al pool de procesos (pickle)."""
+
+    def _inmutable(self, *args, **kwargs):
+        raise TypeError("Las reglas de un conjunto cargado no se pueden modificar")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _inmutable
+
+    def __reduce__(self):
+        return (ReglaCongelada, (dict(self),))
+
+def _congelar(valor):
+    if isinstance(valor, dict):
+        return ReglaCongelada({k: _congelar(v) for k, v in valor.items()})
+    if isinstance(valor, list):
+        return tuple(_congelar(v) for v in valor)
+    return valor
+
+def _precompilar(regla: dict) -> dict:
+    """Copia de la regla con las regex compiladas en 'patron_re'."""
+    regla = dict(regla)
+    if "patron" in regla:
+        regla["patron_re"] = _compilar(regla["patron"])
+    if "condiciones" in regla:
+        regla["condiciones"] = [{**c, "patron_re": _compilar(c["patron"])} for c in regla["condiciones"]]
+    return regla
+
+class ConjuntoReglas:
+    """
+    Conjunto de reglas cargado y validado. `reglas` es un mapping de sólo
+    lectura grupo -> tupla de reglas congeladas (con sus regex compiladas).
+    """
+
+    def __init__(self, nombre: str, datos: dict, origen: str):
+        errores = validar_esquema(datos)
+        if errores:
+            raise ReglasInvalidas(nombre, errores)
+        meta = datos.get("meta", {})
+        self.plantillas_ausentes = tuple(plantillas_ausentes(datos))
+        if self.plantillas_ausentes:
+            logging.warning(f"Reglas: el conjunto '{nombre}' usa plantillas que no están en assets: "
+                            f"{', '.join(self.plantillas_ausentes)}")
+        self.nombre = nombre
+        self.origen = origen
+        self._version_datos = version_reglas(datos)
+        self._plantillas = tuple(sorted(plantillas_de_reglas(datos.get("visual", []))))
+        self.marcas = tuple(meta.get("marcas", []))
+        self.retailers = tuple(meta.get("retailers", []))
+        self.reglas = MappingProxyType({
+            grupo: _congelar([_precompilar(r) for r in datos.get(grupo, [])]) for grupo in GRUPOS})
+
+    @property
+    def version(self) -> str:
+        """
+        Versión de las reglas y del contenido de sus plantillas: las plantillas
+        se recargan si cambian en disco, así que se calcula en cada consulta.
+        """
+        return version_reglas(self._version_datos, huellas_plantillas(self._plantillas))
+
+    def descripcion(self) -> dict:
+        """Lo que se anota en cada informe."""
+        return {"conjunto": self.nombre, "version": self.version, "origen": self.origen}
+
+    def __repr__(self):
+        return f"<ConjuntoReglas {self.nombre} v{self.version} ({self.origen})>"
+
+# ------------------------------------------
+# Fuentes y recarga
+# ------------------------------------------
+_conjuntos = {}   # nombre -> ConjuntoReglas
+_firmas = {}      # nombre -> (origen, referencia, mtime/etag) de la versión leída
+_indice = {}      # marca/retailer normalizado -> nombre del conjunto
+_revisado = None
+_lock = threading.Lock()
+
+def _contenedor_blob():
+    return os.getenv("REGLAS_BLOB_CONTAINER")
+
+def _fuentes():
+    """{nombre: (origen, referencia, firma)} de los conjuntos disponibles."""
+    fuentes = {}
+    base = _base_assets()
+    ruta = os.path.join(base, "Reglas.json")
+    if os.path.exists(ruta):
+        fuentes[CONJUNTO_POR_DEFECTO] = ("local", ruta, os.stat(ruta).st_mtime_ns)
+    carpeta = os.path.join(base, "reglas")
+    if os.path.isdir(carpeta):
+        for archivo in sorted(os.listdir(carpeta)):
+            if archivo.endswith(".json"):
+                ruta = os.path.join(carpeta, archivo)
+                fuentes[archivo[:-5].lower()] = ("local", ruta, os.stat(ruta).st_mtime_ns)
+    contenedor = _contenedor_blob()
+    if contenedor:
+        etags = listar_etags(contenedor, BLOB_PREFIJO)
+        if etags is None:
+            # Blob no disponible: se conservan los conjuntos que ya venían de blob
+            fuentes.update({n: f for n, f in _firmas.items() if f[0] == "blob"})
+        for blob, etag in sorted((etags or {}).items()):
+            if blob.endswith(".json"):
+                fuentes[blob.rsplit("/", 1)[-1][:-5].lower()] = ("blob", blob, etag)
+    return fuentes
+
+def _leer(origen: str, referencia: str) -> dict:
+    if origen == "blob":
+        data = descargar_bytes(_contenedor_blob(), referencia)
+        if data is None:
+            raise ValueError(f"no se pudo descargar {referencia}")
+        return json.loads(data)
+    with open(referencia, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _reconstruir_indice():
+    _indice.clear()
+    for nombre in sorted(_conjuntos):
+        c = _conjuntos[nombre]
+        for clave in (nombre, *c.marcas, *c.retailers):
+            clave = _normalizar(clave)
+            previo = _indice.setdefault(clave, nombre)
+            if previo != nombre:
+                logging.warning(f"Reglas: '{clave}' está en los conjuntos '{previo}' y '{nombre}'; se usa '{previo}'")
+
+def revisar(forzar: bool = False):
+    """Recarga los conjuntos cuya fuente cambió (como mucho una vez cada TTL_S)."""
+    global _revisado
+    with _lock:
+        if not forzar and _revisado is not None and time.monotonic() - _revisado < TTL_S:
+            return
+        fuentes = _fuentes()
+        for nombre, firma in fuentes.items():
+            if _firmas.get(nombre) == firma:
+                continue
+            # Se anota la firma aunque falle: no se reintenta hasta que la fuente cambie
+            _firmas[nombre] = firma
+            try:
+                conjunto = ConjuntoReglas(nombre, _leer(firma[0], firma[1]), firma[0])
+            except ValueError as e:  # JSON o esquema no válidos
+                sigue = " (se mantiene la versión anterior)" if nombre in _conjuntos else ""
+                logging.error(f"Reglas: {e}{sigue}")
+                continue
+            _conjuntos[nombre] = conjunto
+            logging.info(f"Reglas: conjunto '{nombre}' v{conjunto.version} cargado ({firma[0]})")
+        for nombre in set(_conjuntos) - set(fuentes):
+            logging.info(f"Reglas: conjunto '{nombre}' retirado")
+            del _conjuntos[nombre]
+        for nombre in set(_firmas) - set(fuentes):
+            del _firmas[nombre]
+        _reconstruir_indice()
+        # Recarga plantillas cambiadas en disco y expulsa las que ya no usa ningún conjunto
+        sincronizar_plantillas([r for c in _conjuntos.values() for r in c.reglas["visual"]])
+        _revisado = time.monotonic()
+
+def plantillas_en_uso() -> set:
+    """Rutas de plantilla que usa algún conjunto cargado."""
+    revisar()
+    with _lock:
+        return plantillas_de_reglas([r for c in _conjuntos.values() for r in c.reglas["visual"]])
+
+def conjuntos_disponibles() -> dict:
+    """{nombre: descripción} de los conjuntos cargados."""
+    revisar()
+    with _lock:
+        return {n: {**c.descripcion(), "marcas": list(c.marcas), "retailers": list(c.retailers)}
+                for n, c in sorted(_conjuntos.items())}
+
+def obtener(conjunto: str = None, marca: str = None, retailer: str = None) -> ConjuntoReglas:
+    """
+    Conjunto para la petición: por nombre, por marca o por retailer (en ese
+    orden). Una marca o retailer sin conjunto propio usa el conjunto por
+    defecto; un nombre desconocido lanza ConjuntoDesconocido.
+    """
+    revisar()
+    with _lock:
+        if conjunto:
+            elegido = _conjuntos.get(conjunto.strip().lower())
+            if elegido is None:
+                raise ConjuntoDesconocido(
+                    f"Conjunto de reglas desconocido: '{conjunto}' (disponibles: {', '.join(sorted(_conjuntos))})")
+            return elegido
+        for clave in (marca, retailer):
+            if clave and _normalizar(clave) in _indice:
+                return _conjuntos[_indice[_normalizar(clave)]]
+        elegido = _conjuntos.get(CONJUNTO_POR_DEFECTO)
+    if elegido is None:
+        raise RuntimeError("No hay conjunto de reglas por defecto (assets/Reglas.json ausente o inválido)")
+    return elegido
@@ -0,0 +1,245 @@
+import os
+import math
+import logging
+
+from shared.perezoso import perezoso
+from .plantillas import obtener_plantilla, niveles as niveles_plantilla, escalas_regla
+from .paralelo import TIPOS_PARALELOS, PaginaCodificada, _fusionar
+
+fitz = perezoso("fitz")  # PyMuPDF
+cv2 = perezoso("cv2")
+np = perezoso("numpy")
+
+# ==========================================
+# RENDER Y MATCHING POR TESELAS (memoria acotada)
+# ==========================================
+# Un troquel de 1 m de ancho a 300 dpi son ~100 Mpx: el pixmap, la matriz
+# float32 de matchTemplate y sus buffers de DFT superan con mucho la memoria
+# del worker. En modo teselado cada página se renderiza por recortes
+# (page.get_pixmap(clip=...)) que se solapan al menos el lado de la mayor
+# plantilla, de modo que cualquier posición de la plantilla cae entera en
+# alguna tesela: el máximo de las teselas es el máximo de la página y la
+# evidencia 'Similitud' no cambia. Sólo hay una tesela en memoria a la vez.
+# Cada tesela es "dueña" de las posiciones hasta el inicio de la siguiente y
+# sólo busca ahí (más el lado de la plantilla): el solape que exige la mayor
+# plantilla no hace repetir la búsqueda de las pequeñas.
+#
+# El lado de la tesela sale del presupuesto (VALIDADOR_MEMORIA_RENDER_MB).
+# Si con él no cabe el doble del solape a 300 dpi, se baja la resolución
+# (hasta DPI_MINIMO) y las plantillas se reescalan en la misma proporción.
+# El solape sólo cuenta los niveles de pirámide que pide cada regla y que
+# caben en la página: con las reglas por defecto (escala 1.0, punto_verde de
+# ~2040 px) el presupuesto por defecto mantiene los 300 dpi.
+#
+# A 300 dpi la similitud de las teselas es la de la página completa. A menor
+# resolución la página y las plantillas pierden detalle y la similitud se
+# desvía algo (medido: hasta +0.03, p. ej. 0.31 -> 0.33), como mucho
+# TOLERANCIA_DPI_REDUCIDO; una regla con la similitud a menos de eso de su
+# umbral puede decidirse distinto que en serie (tests/test_teselas.py).
+#
+# El teselado cambia memoria por tiempo (la plantilla mayor se busca también
+# en el solape): sólo se activa solo cuando una página completa no cabe en
+# el presupuesto.
+
+MEMORIA_MB = float(os.getenv("VALIDADOR_MEMORIA_RENDER_MB", "512"))
+DPI_BASE = 300  # Resolución a la que corresponden las plantillas de assets/
+DPI_MINIMO = int(os.getenv("VALIDADOR_DPI_MINIMO", "150"))
+BYTES_POR_PIXEL = 20        # pico medido por px de tesela: gris + matchTemplate (resultado float32 + DFT)
+BYTES_POR_PIXEL_COLOR = 4   # vista previa RGB + su PNG (evidencias)
+MARGEN_SOLAPE_PX = 2
+TOLERANCIA_DPI_REDUCIDO = 0.05  # desviación máxima de 'Similitud' frente al render completo a 300 dpi
+
+def presupuesto_bytes(memoria_mb=None) -> int:
+    return int(float(memoria_mb or MEMORIA_MB) * 1024 * 1024)
+
+def pixeles_pagina(rect, dpi: int):
+    """(ancho, alto) en píxeles de un rectángulo de página (en puntos) a `dpi`."""
+    return math.ceil(rect.width * dpi / 72), math.ceil(rect.height * dpi / 72)
+
+def necesita_teselas(doc, presupuesto: int, dpi: int = DPI_BASE) -> bool:
+    """True si alguna página completa a `dpi` no cabe en el presupuesto."""
+    for page in doc:
+        ancho, alto = pixeles_pagina(page.rect, dpi)
+        if ancho * alto * BYTES_POR_PIXEL > presupuesto:
+            return True
+    return False
+
+def lado_maximo_plantillas(reglas, alto: int = None, ancho: int = None) -> int:
+    """
+    Lado mayor (px a DPI_BASE) de los niveles de pirámide que prueban las
+    reglas, sin contar los que no caben en una página de alto x ancho px.
+    """
+    lado = 0
+    for r in reglas:
+        for ruta in r.get("templates", [r.get("template")]):
+            plantilla = obtener_plantilla(ruta) if ruta else None
+            if plantilla is None:
+                continue
+            for _, img in niveles_plantilla(plantilla, escalas_regla(r), alto, ancho):
+                lado = max(lado, *img.shape[:2])
+    return lado
+
+def elegir_teselado(presupuesto: int, lado_plantilla: int):
+    """(dpi, lado_tesela_px, solape_px) para el presupuesto y la mayor plantilla."""
+    lado = int(math.sqrt(presupuesto / BYTES_POR_PIXEL))
+    dpi = DPI_BASE
+    solape = lado_plantilla + MARGEN_SOLAPE_PX
+    if lado < 2 * solape:
+        dpi = max(DPI_MINIMO, int(DPI_BASE * lado / (2 * max(1, lado_plantilla))))
+        solape = math.ceil(lado_plantilla * dpi / DPI_BASE) + MARGEN_SOLAPE_PX
+        if lado < 2 * solape:
+            logging.warning(f"Teselado: el presupuesto de {presupuesto >> 20} MB no alcanza a {dpi} dpi; "
+                            f"se usan teselas de {2 * solape} px")
+            lado = 2 * solape
+    return dpi, lado, solape
+
+def rejilla(ancho: int, alto: int, lado: int, solape: int):
+    """
+    Teselas que cubren la página con el solape pedido: [(caja, propias)] en
+    píxeles, donde propias = (x0, y0, x1, y1) son las posiciones de esquina
+    de la plantilla que busca esa tesela (hasta el inicio de la siguiente).
+    """
+    def cortes(total):
+        if total <= lado:
+            return [(0, 0, total)]
+        paso = lado - solape
+        inicios = list(range(0, total - lado, paso))
+        inicios.append(total - lado)  # la última tesela se ajusta al borde
+        fines = inicios[1:] + [total]
+        propios = [0] + fines[:-1]
+        return list(zip(inicios, propios, fines))
+    teselas = []
+    for y0, py0, py1 in cortes(alto):
+        for x0, px0, px1 in cortes(ancho):
+            teselas.append(((x0, y0, min(ancho, x0 + lado), min(alto, y0 + lado)), (px0, py0, px1, py1)))
+    return teselas
+
+def _renderizar_tesela(page, dpi: int, caja):
+    """Tesela en gris como array 2D (vista sobre el pixmap, que se devuelve también)."""
+    x0, y0, x1, y1 = caja
+    escala = 72.0 / dpi
+    origen = page.rect.tl
+    clip = fitz.Rect(x0 * escala, y0 * escala, x1 * escala, y1 * escala) + (origen.x, origen.y, origen.x, origen.y)
+    pix = page.get_pixmap(dpi=dpi, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+    if pix.stride == pix.width:
+        gris = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width)
+    else:
+        gris = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+    return gris, pix
+
+def _niveles(ruta: str, dpi: int, escalas):
+    """Niveles `escalas` de la plantilla reescalados a `dpi` (los de assets/ corresponden a DPI_BASE)."""
+    plantilla = obtener_plantilla(ruta)
+    if plantilla is None:
+        return None
+    if dpi == DPI_BASE:
+        return niveles_plantilla(plantilla, escalas)
+    factor = dpi / DPI_BASE
+    niveles = []
+    for escala, img in niveles_plantilla(plantilla, escalas):
+        h, w = img.shape[:2]
+        nw, nh = max(1, int(round(w * factor))), max(1, int(round(h * factor)))
+        niveles.append((escala, cv2.resize(img, (nw, nh), interpolation=cv2.INTER_AREA)))
+    return niveles
+
+def _vista_previa(page, num: int, presupuesto: int):
+    """PNG de la página completa a la mayor resolución (<= DPI_BASE) que cabe en el presupuesto."""
+    ancho_pt, alto_pt = page.rect.width, page.rect.height
+    dpi = min(DPI_BASE, int(72 * math.sqrt(presupuesto / (BYTES_POR_PIXEL_COLOR * ancho_pt * alto_pt))))
+    pix = page.get_pixmap(dpi=max(1, dpi), colorspace=fitz.csRGB, alpha=False)
+    return PaginaCodificada(num, pix.tobytes("png"))
+
+def validar_paginas_teseladas(pdf_bytes: bytes, reglas, presupuesto: int = None, codificar: bool = False):
+    """
+    Render + template matching por teselas con memoria acotada.
+    Devuelve ({idx_regla: (ok, evidencia)}, [PaginaCodificada]) como
+    validar_paginas_paralelo: idx_regla es la posición en `reglas` (sólo
+    reglas template_*). Con codificar=True cada página trae una vista previa
+    PNG dentro del presupuesto para las evidencias.
+    """
+    from . import busqueda, opciones_busqueda, evidencia_similitud
+    from .evidencias import coincidencia
+
+    presupuesto = presupuesto or presupuesto_bytes()
+    indices = [i for i, r in enumerate(reglas) if r["tipo"] in TIPOS_PARALELOS]
+    doc = fitz.open(stream=bytes(pdf_bytes) if isinstance(pdf_bytes, memoryview) else pdf_bytes, filetype="pdf")
+    # Los niveles mayores que la página más grande no pueden coincidir: no cuentan para el solape
+    tamanos = [pixeles_pagina(page.rect, DPI_BASE) for page in doc]
+    ancho_max = max((w for w, _ in tamanos), default=None)
+    alto_max = max((h for _, h in tamanos), default=None)
+    dpi, lado, solape = elegir_teselado(
+        presupuesto, lado_maximo_plantillas([reglas[i] for i in indices], alto_max, ancho_max))
+
+    # Plantillas de cada regla: template_prohibido usa el umbral por defecto
+    # (igual que el camino serie y el paralelo)
+    plantillas = {}
+    for i in indices:
+        r = reglas[i]
+        rutas = r.get("templates", [r.get("template")]) if r["tipo"] == "template_match" else [r["template"]]
+        plantillas[i] = [(ruta, _niveles(ruta, dpi, escalas_regla(r))) for ruta in rutas if ruta]
+
+    por_regla = {i: {} for i in indices}
+    decididas = set()
+    paginas = []
+    try:
+        for num, page in enumerate(doc, start=1):
+            pendientes = [i for i in indices if i not in decididas]
+            ancho, alto = pixeles_pagina(page.rect, dpi)
+            cajas = rejilla(ancho, alto, lado, solape)
+            # Máximo por (regla, plantilla) en la página, fusionando las teselas,
+            # y su caja en píxeles de la página (recortes de evidencia)
+            maximos = {(i, ruta): None for i in pendientes for ruta, _ in plantillas[i]}
+            ubicaciones = {}
+            if pendientes:
+                logging.info(f"Teselado pág {num}: {ancho}x{alto} px a {dpi} dpi en {len(cajas)} teselas de {lado} px")
+            for caja, (px0, py0, px1, py1) in cajas if pendientes else []:
+                gris, pix = _renderizar_tesela(page, dpi, caja)
+                x0, y0 = caja[:2]
+                for i in pendientes:
+                    modo, opciones = opciones_busqueda(reglas[i])
+                    umbral = reglas[i].get("umbral", 0.3) if reglas[i]["tipo"] == "template_match" else 0.3
+                    for ruta, niveles in plantillas[i]:
+                        for _, tmpl in niveles or []:
+                            th, tw = tmpl.shape[:2]
+                            # Posiciones propias de la tesela + lo que ocupa la plantilla
+                            zona = gris[py0 - y0:py1 - y0 + th - 1, px0 - x0:px1 - x0 + tw - 1]
+                            if th > zona.shape[0] or tw > zona.shape[1]:
+                                continue
+                            val, (lx, ly) = busqueda.buscar(zona, tmpl, umbral, modo, **opciones)
+                            previo = maximos[(i, ruta)]
+                            if previo is None or val > previo:
+                                maximos[(i, ruta)] = val
+                                ubicaciones[(i, ruta)] = (px0 + lx, py0 + ly, px0 + lx + tw, py0 + ly + th)
+                del gris, pix
+
+            coincidencias = []
+            for i in pendientes:
+                r = reglas[i]
+                prohibido = r["tipo"] == "template_prohibido"
+                umbral = 0.3 if prohibido else r.get("umbral", 0.3)
+                ok, evidencia = False, "No evaluado"
+                for ruta, niveles in plantillas[i]:
+                    if maximos.get((i, ruta)) is not None and maximos[(i, ruta)] >= umbral:
+                        coincidencias.append(coincidencia(r["nombre"], ruta, ubicaciones[(i, ruta)], dpi))
+                    if niveles is None:
+                        ok, evidencia = False, f"Template no encontrado en assets: {ruta}"
+                    elif maximos[(i, ruta)] is None:
+                        ok, evidencia = False, "Error OpenCV: la plantilla es mayor que la página"
+                    else:
+                        ok, evidencia = evidencia_similitud(maximos[(i, ruta)], umbral, prohibido)
+                        if ok and not prohibido:
+                            evidencia = f"Logo {ruta}: {evidencia}"
+                            break
+                if not prohibido and not ok:
+                    evidencia = "No evaluado"
+                por_regla[i][num] = (ok, evidencia)
+                if (ok and not prohibido) or (prohibido and not ok):
+                    decididas.add(i)
+
+            pagina = _vista_previa(page, num, presupuesto) if codificar else PaginaCodificada(num, None)
+            pagina.coincidencias = coincidencias
+            paginas.append(pagina)
+    finally:
+        doc.close()
+
+    return {i: _fusionar(reglas[i], por_regla[i]) for i in indices}, paginas
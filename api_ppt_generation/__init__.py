@@ -1,98 +1,141 @@
 import azure.functions as func
-from pptx import Presentation
-from pptx.util import Inches, Pt
 import io
-import os
-import requests
-import matplotlib.pyplot as plt
-
-# URL pública del Blob Storage
-TEMPLATE_URL = "https://hibecistorage1.blob.core.windows.net/blob-publico/PPT Generator Template HAVAS.pptx"
-
-def generar_grafica(planned, delivered, categorias, output_path):
-    fig, ax = plt.subplots(figsize=(10, 6))
-    bar_width = 0.35
-    x = range(len(categorias))
-
-    # Barras
-    ax.bar(x, planned, width=bar_width, label="Planned Spend", color="#A52A2A")
-    ax.bar([i + bar_width for i in x], delivered, width=bar_width, label="Delivered Spend", color="#FFD700")
-
-    # Etiquetas y título
-    ax.set_xticks([i + bar_width/2 for i in x])
-    ax.set_xticklabels(categorias, rotation=45, ha="right")
-    ax.set_ylabel("£")
-    ax.set_title("Planned vs Delivered Spend")
-    ax.legend()
-
-    # Guardar con fondo transparente
-    plt.tight_layout()
-    plt.savefig(output_path, transparent=True)
-    plt.close(fig)
-
-def main(req: func.HttpRequest) -> func.HttpResponse:
+import json
+import time
+import logging
+
+from shared.instrumentacion import medir, etapa, perfilar
+from shared.trabajos import es_asincrona, aceptar
+from shared.perezoso import perezoso
+from .plantillas import obtener_plantilla, precargar_plantillas, PLANTILLAS, PLANTILLA_POR_DEFECTO
+from .graficas import renderizar_graficas, generar_grafica, iniciar_pool, FORMATOS
+from .diapositivas import MARCA, buscar_marca, primera_diapositiva_con_marca, clonar_diapositiva, rellenar_marca
+
+pptx = perezoso("pptx")  # python-pptx se importa en la primera petición (o en el warmup)
+
+def main(req: func.HttpRequest, cola: func.Out[str]) -> func.HttpResponse:
+    # ?async=1 o Prefer: respond-async -> 202 con el id del trabajo (shared/trabajos.py)
+    if es_asincrona(req):
+        return aceptar(req, "api_ppt_generation", cola)
+    return atender(req)
+
+def atender(req: func.HttpRequest) -> func.HttpResponse:
+    """Generación síncrona (también la usa el worker de trabajos asíncronos)."""
+    with medir("api_ppt_generation") as medidor, perfilar(req.params.get("perfil") == "1") as perfil:
+        respuesta = _generar(req)
+        # La respuesta es binaria: los tiempos van en cabeceras (?timings=1 añade el detalle)
+        respuesta.headers["Server-Timing"] = medidor.server_timing()
+        if req.params.get("timings") == "1":
+            respuesta.headers["X-Timings"] = json.dumps(medidor.resumen())
+    if perfil:
+        logging.info(f"Perfil ({perfil['motor']}):\n{perfil['texto']}")
+    return respuesta
+
+# Valores por defecto de cada diapositiva (modo simple o cada entrada de "slides")
+POR_DEFECTO = {
+    "title": "Informe",
+    "subtitle": "",
+    "bullets": [
+        "Total planned: £4.3M | Delivered: £324K (8%)",
+        "Digital pacing steady: OLV and Social platforms delivering 63–78% of planned spend.",
+        "PPC ramp-up: Current delivery is between 22–25% as activation is phased.",
+        "Gap expected: Digital providing strong early base; PPC will scale further."
+    ],
+    "planned": [30000,25000,20000,40000,60000,35000,30000,150000,50000,10000],
+    "delivered": [15000,12000,10000,30000,40000,25000,20000,33000,12000,5000],
+    "categorias": ["YouTube View","YouTube Reach","Havas Marketplace","Teads","META","LinkedIn","TikTok","Google Search","Google Demand","Bing"],
+}
+
+def _datos_diapositiva(payload: dict) -> dict:
+    return {k: payload.get(k, v) for k, v in POR_DEFECTO.items()}
+
+def precalentar():
+    """
+    Warmup: importa python-pptx y matplotlib, carga las plantillas en memoria,
+    deja en caché la gráfica con los datos por defecto y arranca el pool de gráficas.
+    """
+    with etapa("ppt:imports"):
+        pptx.cargar()
+    with etapa("ppt:plantillas"):
+        precargar_plantillas()
+    with etapa("ppt:grafica_por_defecto"):
+        generar_grafica(POR_DEFECTO["planned"], POR_DEFECTO["delivered"], POR_DEFECTO["categorias"])
+    with etapa("ppt:pool_graficas"):
+        iniciar_pool()
+
+def _generar(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Modo simple: el body es una diapositiva (title, subtitle, bullets, planned,
+    delivered, categorias). Modo presentación: {"slides": [ {...}, ... ]}
+    clona la diapositiva con la marca una vez por entrada.
+    """
     try:
+        inicio = time.perf_counter()
         # Leer datos del body
         body = req.get_json()
-        title = body.get("title", "Informe")
-        subtitle = body.get("subtitle", "")
-        bullets = body.get("bullets", [
-            "Total planned: £4.3M | Delivered: £324K (8%)",
-            "Digital pacing steady: OLV and Social platforms delivering 63–78% of planned spend.",
-            "PPC ramp-up: Current delivery is between 22–25% as activation is phased.",
-            "Gap expected: Digital providing strong early base; PPC will scale further."
-        ])
-        planned = body.get("planned", [30000,25000,20000,40000,60000,35000,30000,150000,50000,10000])
-        delivered = body.get("delivered", [15000,12000,10000,30000,40000,25000,20000,33000,12000,5000])
-        categorias = body.get("categorias", ["YouTube View","YouTube Reach","Havas Marketplace","Teads","META","LinkedIn","TikTok","Google Search","Google Demand","Bing"])
-
-        # Descargar plantilla desde Blob Storage
-        response = requests.get(TEMPLATE_URL)
-        if response.status_code != 200:
-            return func.HttpResponse("Error al descargar la plantilla desde Blob Storage", status_code=500)
-
-        prs = Presentation(io.BytesIO(response.content))
-
-        # Generar gráfica transparente
-        grafico_path = os.path.join(os.getcwd(), "grafico.png")
-        generar_grafica(planned, delivered, categorias, grafico_path)
-
-        # Buscar la marca plannedvsdeliveredtext
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if shape.has_text_frame and "plannedvsdeliveredtext" in shape.text:
-                    # Insertar imagen encima del bloque de texto
-                    left = shape.left
-                    top = shape.top - Inches(4)  # mover arriba
-                    width = Inches(6)
-                    height = Inches(4)
-                    slide.shapes.add_picture(grafico_path, left, top, width, height)
-
-                    # Reemplazar texto con título y bullets
-                    text_frame = shape.text_frame
-                    text_frame.clear()
-                    p_title = text_frame.add_paragraph()
-                    p_title.text = f"{title} - {subtitle}"
-                    p_title.font.size = Pt(18)
-                    p_title.font.bold = True
-
-                    for bullet in bullets:
-                        p = text_frame.add_paragraph()
-                        p.text = bullet
-                        p.font.size = Pt(14)
-                        p.level = 0
-                    break
+        modo_presentacion = "slides" in body
+        payloads = body["slides"] if modo_presentacion else [body]
+        if not isinstance(payloads, list) or not payloads or not all(isinstance(p, dict) for p in payloads):
+            return func.HttpResponse("'slides' debe ser una lista no vacía de objetos", status_code=400)
+        diapositivas = [_datos_diapositiva(p) for p in payloads]
+
+        nombre_plantilla = body.get("plantilla", PLANTILLA_POR_DEFECTO)
+        if nombre_plantilla not in PLANTILLAS:
+            return func.HttpResponse(f"Plantilla desconocida: {nombre_plantilla}. Disponibles: {list(PLANTILLAS)}", status_code=400)
+
+        # "svg": gráfica vectorial con el PNG como respaldo
+        formato = body.get("formato_grafica", "png")
+        if formato not in FORMATOS:
+            return func.HttpResponse(f"formato_grafica no soportado: {formato}. Disponibles: {list(FORMATOS)}", status_code=400)
+
+        # Plantilla en memoria del worker (revalidada contra Blob Storage cada TTL)
+        with etapa("descarga_plantilla"):
+            plantilla, origen = obtener_plantilla(nombre_plantilla)
+        if origen == "local":
+            logging.warning(f"Usando la copia local de la plantilla '{nombre_plantilla}'")
+
+        with etapa("parse_plantilla"):
+            prs = pptx.Presentation(io.BytesIO(plantilla))
+
+        # Generar gráficas transparentes (en memoria, cacheadas por datos + estilo
+        # y, si hay varias, en paralelo en un pool de procesos)
+        series = [(d["planned"], d["delivered"], d["categorias"]) for d in diapositivas]
+        with etapa("grafica"):
+            pngs = renderizar_graficas(series)
+            svgs = renderizar_graficas(series, formato="svg") if formato == "svg" else [None] * len(series)
+
+        if modo_presentacion:
+            base = primera_diapositiva_con_marca(prs)
+            if base is None:
+                return func.HttpResponse(f"La plantilla '{nombre_plantilla}' no tiene la marca {MARCA}", status_code=400)
+            # Se clona antes de rellenar: los clones parten de la diapositiva original
+            with etapa("clonar_diapositivas"):
+                posicion = list(prs.slides).index(base)
+                destinos = [base] + [clonar_diapositiva(prs, base, posicion + i) for i in range(1, len(diapositivas))]
+            for slide, datos, png, svg in zip(destinos, diapositivas, pngs, svgs):
+                rellenar_marca(slide, buscar_marca(slide), datos, png, svg)
+        else:
+            # Buscar la marca plannedvsdeliveredtext
+            for slide in prs.slides:
+                shape = buscar_marca(slide)
+                if shape is not None:
+                    rellenar_marca(slide, shape, diapositivas[0], pngs[0], svgs[0])
 
         # Guardar en memoria
         ppt_stream = io.BytesIO()
-        prs.save(ppt_stream)
+        with etapa("save"):
+            prs.save(ppt_stream)
         ppt_stream.seek(0)
 
+        duracion_ms = round((time.perf_counter() - inicio) * 1000, 1)
+        logging.info(f"Presentación de {len(diapositivas)} diapositiva(s) generada en {duracion_ms} ms")
         return func.HttpResponse(
             ppt_stream.read(),
             mimetype="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-            headers={"Content-Disposition": "attachment; filename=planned_vs_delivered.pptx"}
+            headers={"Content-Disposition": "attachment; filename=planned_vs_delivered.pptx",
+                     "X-Diapositivas": str(len(diapositivas)),
+                     "X-Tiempo-Generacion-Ms": str(duracion_ms)}
         )
 
     except Exception as e:
-        return func.HttpResponse(f"Error interno: {str(e)}", status_code=500)
\ No newline at end of file
+        return func.HttpResponse(f"Error interno: {str(e)}", status_code=500)
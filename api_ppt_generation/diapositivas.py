@@ -0,0 +1,90 @@
+import copy
+
+from shared.perezoso import perezoso
+from .graficas import insertar_grafica
+
+_constantes = perezoso("pptx.opc.constants")
+_util = perezoso("pptx.util")
+
+# ==========================================
+# DIAPOSITIVAS CON MARCA (modo presentación)
+# ==========================================
+# La diapositiva con la marca se clona una vez por campaña antes de
+# rellenarla: cada clon comparte layout e imágenes con la original (las
+# partes de imagen no se duplican) y se coloca justo detrás de ella.
+
+MARCA = "plannedvsdeliveredtext"
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+def buscar_marca(slide):
+    """Primera forma de la diapositiva que contiene la marca (o None)."""
+    for shape in slide.shapes:
+        if shape.has_text_frame and MARCA in shape.text:
+            return shape
+    return None
+
+def primera_diapositiva_con_marca(prs):
+    for slide in prs.slides:
+        if buscar_marca(slide) is not None:
+            return slide
+    return None
+
+def clonar_diapositiva(prs, origen, posicion: int):
+    """Copia `origen` (formas, fondo y relaciones) y la coloca en `posicion`."""
+    nueva = prs.slides.add_slide(origen.slide_layout)
+    arbol = nueva.shapes._spTree
+    for shape in list(nueva.shapes):  # placeholders que añade el layout
+        arbol.remove(shape._element)
+
+    # Relaciones propias de cada diapositiva que no se copian al clon
+    rt = _constantes.RELATIONSHIP_TYPE
+    no_copiadas = (rt.SLIDE_LAYOUT, rt.NOTES_SLIDE)
+    rids = {}
+    for rid, rel in origen.part.rels.items():
+        if rel.reltype in no_copiadas:
+            continue
+        if rel.is_external:
+            rids[rid] = nueva.part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+        else:
+            rids[rid] = nueva.part.relate_to(rel.target_part, rel.reltype)
+
+    # nvGrpSpPr y grpSpPr ya existen en el árbol nuevo
+    for elemento in list(origen.shapes._spTree)[2:]:
+        arbol.append(copy.deepcopy(elemento))
+    fondo = origen._element.cSld.bg
+    if fondo is not None:
+        nueva._element.cSld.insert(0, copy.deepcopy(fondo))
+
+    # Los r:embed / r:id del XML copiado apuntan a los rId del origen
+    for elemento in nueva._element.iter():
+        for attr, valor in elemento.attrib.items():
+            if attr.startswith(f"{{{NS_R}}}") and valor in rids:
+                elemento.set(attr, rids[valor])
+
+    ids = prs.slides._sldIdLst
+    sld_id = ids[-1]
+    ids.remove(sld_id)
+    ids.insert(posicion, sld_id)
+    return nueva
+
+def rellenar_marca(slide, shape, datos: dict, png: bytes, svg: bytes = None):
+    """Inserta la gráfica encima del bloque con la marca y lo sustituye por título y bullets."""
+    left = shape.left
+    top = shape.top - _util.Inches(4)  # mover arriba
+    width = _util.Inches(6)
+    height = _util.Inches(4)
+    insertar_grafica(slide, png, left, top, width, height, svg=svg)
+
+    # Reemplazar texto con título y bullets
+    text_frame = shape.text_frame
+    text_frame.clear()
+    p_title = text_frame.add_paragraph()
+    p_title.text = f"{datos['title']} - {datos['subtitle']}"
+    p_title.font.size = _util.Pt(18)
+    p_title.font.bold = True
+
+    for bullet in datos["bullets"]:
+        p = text_frame.add_paragraph()
+        p.text = bullet
+        p.font.size = _util.Pt(14)
+        p.level = 0
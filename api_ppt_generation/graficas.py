@@ -0,0 +1,191 @@
+import io
+import os
+import json
+import hashlib
+import logging
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from shared.cache import CacheLRU
+from shared.perezoso import perezoso
+
+# matplotlib es la dependencia más lenta de importar: se carga con la primera gráfica
+_figure = perezoso("matplotlib.figure")
+_agg = perezoso("matplotlib.backends.backend_agg")
+_etree = perezoso("lxml.etree")
+_constantes = perezoso("pptx.opc.constants")
+_paquete = perezoso("pptx.opc.package")
+
+# ==========================================
+# GRÁFICAS EN MEMORIA
+# ==========================================
+# Se usa la API orientada a objetos de matplotlib (Figure + FigureCanvasAgg)
+# en lugar de pyplot: cada llamada tiene su propia figura, sin estado global
+# compartido entre peticiones concurrentes, y el resultado va a un buffer en
+# memoria (sin ficheros en el directorio de trabajo).
+#
+# Formatos: "png" (siempre) y "svg". El SVG se incrusta como svgBlip con el
+# PNG como respaldo, igual que hace PowerPoint al insertar un SVG; las
+# versiones que no entienden SVG muestran el PNG. EMF no está disponible:
+# matplotlib no tiene backend EMF.
+#
+# Las gráficas de una presentación se dibujan en un pool de procesos que es
+# uno por worker: se crea con la primera presentación (o en el warmup, que ya
+# importa matplotlib en cada proceso) y se reutiliza. Arrancar procesos
+# forkserver por petición cuesta más que dibujar en serie. Con un solo
+# proceso disponible se dibuja en serie.
+
+FORMATOS = ("png", "svg")
+CONTEXTO_MP = os.getenv("PPT_MP_CONTEXTO", "forkserver")
+MIN_GRAFICAS_PARALELO = 2  # Por debajo no compensa repartir entre procesos
+
+ESTILO_POR_DEFECTO = {
+    "figsize": (10, 6),
+    "dpi": 100,
+    "color_planned": "#A52A2A",
+    "color_delivered": "#FFD700",
+    "titulo": "Planned vs Delivered Spend",
+    "ylabel": "£",
+    "transparente": True,
+}
+
+# Extensión de Office para SVG en un <a:blip>
+URI_EXT_SVG = "{96DAC541-7B7A-43D3-8B79-37D633B846F1}"
+NS_SVG = "http://schemas.microsoft.com/office/drawing/2016/SVG/main"
+NS_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+_cache = CacheLRU(int(os.getenv("PPT_GRAFICAS_CACHE_MAX", "64")))
+_pool = None
+_pool_lock = threading.Lock()
+
+def clave_grafica(planned, delivered, categorias, estilo: dict, formato: str) -> str:
+    """Hash de los datos + estilo + formato (misma clave -> mismos bytes)."""
+    contenido = json.dumps([planned, delivered, categorias, estilo, formato], sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+def _dibujar(planned, delivered, categorias, estilo: dict, formato: str) -> bytes:
+    fig = _figure.Figure(figsize=estilo["figsize"], dpi=estilo["dpi"])
+    _agg.FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    bar_width = 0.35
+    x = range(len(categorias))
+
+    # Barras
+    ax.bar(x, planned, width=bar_width, label="Planned Spend", color=estilo["color_planned"])
+    ax.bar([i + bar_width for i in x], delivered, width=bar_width, label="Delivered Spend", color=estilo["color_delivered"])
+
+    # Etiquetas y título
+    ax.set_xticks([i + bar_width/2 for i in x])
+    ax.set_xticklabels(categorias, rotation=45, ha="right")
+    ax.set_ylabel(estilo["ylabel"])
+    ax.set_title(estilo["titulo"])
+    ax.legend()
+
+    # Guardar (fondo transparente por defecto) en memoria
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format=formato, transparent=estilo["transparente"])
+    return buf.getvalue()
+
+def generar_grafica(planned, delivered, categorias, estilo: dict = None, formato: str = "png") -> bytes:
+    """Bytes de la gráfica Planned vs Delivered, cacheados por datos y estilo."""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de gráfica no soportado: {formato} (disponibles: {FORMATOS})")
+    estilo = {**ESTILO_POR_DEFECTO, **(estilo or {})}
+    clave = clave_grafica(planned, delivered, categorias, estilo, formato)
+    datos = _cache.get(clave)
+    if datos is None:
+        datos = _dibujar(planned, delivered, categorias, estilo, formato)
+        _cache.set(clave, datos)
+    return datos
+
+def procesos_disponibles():
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    limite = int(os.getenv("PPT_MAX_PROCESOS", "0") or 0)
+    return max(1, min(cores, limite) if limite > 0 else cores)
+
+def _dibujar_trabajo(args):
+    return _dibujar(*args)
+
+def _inicializar():
+    """Inicializador del pool: importa matplotlib una vez por proceso."""
+    _figure.cargar(); _agg.cargar()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            max_workers = procesos_disponibles()
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context(CONTEXTO_MP),
+                                        initializer=_inicializar)
+            logging.info(f"Gráficas: pool de {max_workers} procesos ({CONTEXTO_MP})")
+        return _pool
+
+def iniciar_pool():
+    """Crea el pool (si hay más de un proceso disponible) y arranca sus procesos (warmup)."""
+    if procesos_disponibles() > 1:
+        list(_get_pool().map(int, range(procesos_disponibles())))
+
+def cerrar_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def renderizar_graficas(series, estilo: dict = None, formato: str = "png"):
+    """
+    Varias gráficas a la vez. series: [(planned, delivered, categorias)].
+    Las que no están en caché se dibujan en el pool de procesos del worker
+    (matplotlib es CPU puro y no libera el GIL). Devuelve los bytes en el mismo orden.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de gráfica no soportado: {formato} (disponibles: {FORMATOS})")
+    estilo = {**ESTILO_POR_DEFECTO, **(estilo or {})}
+    claves = [clave_grafica(p, d, c, estilo, formato) for p, d, c in series]
+    resultado = {clave: _cache.get(clave) for clave in claves}
+    pendientes = {}
+    for clave, (p, d, c) in zip(claves, series):
+        if resultado[clave] is None and clave not in pendientes:
+            pendientes[clave] = (p, d, c, estilo, formato)
+
+    if len(pendientes) >= MIN_GRAFICAS_PARALELO and procesos_disponibles() > 1:
+        logging.info(f"Renderizando {len(pendientes)} gráficas en el pool de procesos")
+        try:
+            for clave, datos in zip(pendientes, _get_pool().map(_dibujar_trabajo, pendientes.values())):
+                resultado[clave] = datos
+        except BrokenProcessPool:
+            # Un proceso murió: se descarta el pool (la siguiente petición crea
+            # otro) y esta petición termina en serie
+            logging.warning("Gráficas: pool de procesos roto, se recrea")
+            cerrar_pool()
+    for clave, args in pendientes.items():
+        if resultado[clave] is None:
+            resultado[clave] = _dibujar(*args)
+    for clave in pendientes:
+        _cache.set(clave, resultado[clave])
+    return [resultado[clave] for clave in claves]
+
+def insertar_grafica(slide, png: bytes, left, top, width, height, svg: bytes = None):
+    """
+    Añade la gráfica a la diapositiva. Con `svg` la imagen queda vectorial
+    (svgBlip) y el PNG se conserva como respaldo.
+    """
+    pic = slide.shapes.add_picture(io.BytesIO(png), left, top, width, height)
+    if svg is not None:
+        package = slide.part.package
+        parte_svg = _paquete.Part(package.next_image_partname("svg"), "image/svg+xml", package, svg)
+        rid = slide.part.relate_to(parte_svg, _constantes.RELATIONSHIP_TYPE.IMAGE)
+        blip = pic._element.find(f".//{{{NS_A}}}blip")
+        ext_lst = blip.find(f"{{{NS_A}}}extLst")
+        if ext_lst is None:
+            ext_lst = _etree.SubElement(blip, f"{{{NS_A}}}extLst")
+        ext = _etree.SubElement(ext_lst, f"{{{NS_A}}}ext", uri=URI_EXT_SVG)
+        _etree.SubElement(ext, f"{{{NS_SVG}}}svgBlip", {f"{{{NS_R}}}embed": rid}, nsmap={"asvg": NS_SVG})
+    return pic
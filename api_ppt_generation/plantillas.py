@@ -0,0 +1,115 @@
+import os
+import time
+import logging
+import threading
+from urllib.parse import quote
+
+from shared.perezoso import perezoso
+
+requests = perezoso("requests")
+
+# ==========================================
+# PLANTILLAS PPT (caché en proceso + revalidación)
+# ==========================================
+# Los bytes de cada plantilla se guardan en el worker. Pasado el TTL se
+# revalidan contra Blob Storage con una petición condicional (ETag /
+# Last-Modified): un 304 no descarga nada. Si el storage no responde se
+# sigue usando la copia en memoria o, si aún no hay ninguna, la de assets/.
+
+BASE_URL = os.getenv("PPT_TEMPLATE_BASE_URL", "https://hibecistorage1.blob.core.windows.net/blob-publico/")
+TTL_S = float(os.getenv("PPT_TEMPLATE_TTL_S", "300"))
+TIMEOUT = (3.05, 15)  # (conexión, lectura)
+
+# Nombre lógico -> fichero (mismo nombre en el contenedor y en assets/)
+PLANTILLAS = {
+    "havas": "PPT Generator Template HAVAS.pptx",
+    "default": "PPT Generator Template.pptx",
+}
+PLANTILLA_POR_DEFECTO = "havas"
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+
+_sesion = None
+_lock = threading.Lock()
+_cache = {}     # nombre -> {"datos", "etag", "last_modified", "validado", "origen"}
+_locks = {}     # nombre -> Lock (una sola revalidación concurrente por plantilla)
+
+def get_sesion() -> "requests.Session":
+    """Sesión HTTP reutilizada por el worker (pool de conexiones keep-alive)."""
+    global _sesion
+    with _lock:
+        if _sesion is None:
+            _sesion = requests.Session()
+            _sesion.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+            _sesion.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        return _sesion
+
+def _lock_de(nombre):
+    with _lock:
+        return _locks.setdefault(nombre, threading.Lock())
+
+def url_plantilla(nombre: str) -> str:
+    return BASE_URL.rstrip("/") + "/" + quote(PLANTILLAS[nombre])
+
+def _leer_local(nombre: str) -> bytes:
+    with open(os.path.join(ASSETS_DIR, PLANTILLAS[nombre]), "rb") as f:
+        return f.read()
+
+def _revalidar(nombre: str, entrada: dict):
+    """Petición condicional. Devuelve la entrada nueva o None si el storage falla."""
+    cabeceras = {}
+    if entrada:
+        if entrada.get("etag"): cabeceras["If-None-Match"] = entrada["etag"]
+        if entrada.get("last_modified"): cabeceras["If-Modified-Since"] = entrada["last_modified"]
+    try:
+        resp = get_sesion().get(url_plantilla(nombre), headers=cabeceras, timeout=TIMEOUT)
+    except requests.RequestException as e:
+        logging.warning(f"Plantilla '{nombre}': storage no disponible ({e})")
+        return None
+
+    if resp.status_code == 304 and entrada:
+        return {**entrada, "validado": time.monotonic()}
+    if resp.status_code == 200:
+        return {
+            "datos": resp.content,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "validado": time.monotonic(),
+            "origen": "blob",
+        }
+    logging.warning(f"Plantilla '{nombre}': respuesta {resp.status_code} del storage")
+    return None
+
+def obtener_plantilla(nombre: str = PLANTILLA_POR_DEFECTO):
+    """
+    Bytes de la plantilla `nombre` y su origen ("blob" o "local").
+    Lanza KeyError si el nombre no existe.
+    """
+    if nombre not in PLANTILLAS:
+        raise KeyError(nombre)
+    entrada = _cache.get(nombre)
+    if entrada and time.monotonic() - entrada["validado"] < TTL_S:
+        return entrada["datos"], entrada["origen"]
+
+    with _lock_de(nombre):
+        # Otra petición pudo revalidarla mientras esperábamos
+        entrada = _cache.get(nombre)
+        if entrada and time.monotonic() - entrada["validado"] < TTL_S:
+            return entrada["datos"], entrada["origen"]
+
+        nueva = _revalidar(nombre, entrada)
+        if nueva is None:
+            # Se sigue sirviendo la copia que haya (en memoria o assets/) y se
+            # reintenta al cumplirse de nuevo el TTL
+            if entrada:
+                nueva = {**entrada, "validado": time.monotonic()}
+            else:
+                nueva = {"datos": _leer_local(nombre), "etag": None, "last_modified": None,
+                         "validado": time.monotonic(), "origen": "local"}
+        _cache[nombre] = nueva
+        return nueva["datos"], nueva["origen"]
+
+def precargar_plantillas():
+    """Carga todas las plantillas en memoria (para el arranque del worker)."""
+    for nombre in PLANTILLAS:
+        obtener_plantilla(nombre)
@@ -0,0 +1,18 @@
+import azure.functions as func
+
+from shared.trabajos import respuesta_estado, respuesta_resultado
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    GET trabajos/{trabajo_id}            -> estado del trabajo asíncrono
+    GET trabajos/{trabajo_id}/resultado  -> respuesta de la función (202 si aún no ha terminado)
+    """
+    trabajo_id = req.route_params.get("trabajo_id")
+    accion = req.route_params.get("accion")
+    if not trabajo_id:
+        return func.HttpResponse("Falta el id del trabajo en la ruta", status_code=400)
+    if accion == "resultado":
+        return respuesta_resultado(trabajo_id)
+    if accion:
+        return func.HttpResponse(f"Acción desconocida: {accion}", status_code=404)
+    return respuesta_estado(trabajo_id)
@@ -3,8 +3,16 @@ from io import BytesIO
 from datetime import datetime
 from docx import Document
 from docx.shared import Pt, Cm
+from docx.oxml import parse_xml
 from docx.oxml.ns import qn
+from xml.sax.saxutils import escape
 import logging
+import json
+import re
+import threading
+
+from shared.instrumentacion import medir, etapa, perfilar
+from shared.trabajos import es_asincrona, aceptar
 
 # =========================
 #   Estilos: Montserrat
@@ -42,9 +50,41 @@ def _ensure_montserrat_styles(doc: Document, font_name="Montserrat"):
         except Exception:
             pass
 
+# =========================
+#   Documento base (una vez por worker)
+# =========================
+# Document() + estilos Montserrat se construye una sola vez y se guarda
+# serializado; cada petición abre una copia desde esos bytes.
+_base_lock = threading.Lock()
+_base_bytes = None
+
+def _documento_base() -> Document:
+    global _base_bytes
+    if _base_bytes is None:
+        with _base_lock:
+            if _base_bytes is None:
+                doc = Document()
+                _ensure_montserrat_styles(doc, font_name="Montserrat")
+                stream = BytesIO()
+                doc.save(stream)
+                _base_bytes = stream.getvalue()
+    return Document(BytesIO(_base_bytes))
+
+def precalentar():
+    """Warmup: construye el documento base con los estilos."""
+    _documento_base()
+
 # =========================
 #   Helpers de contenido
 # =========================
+# Los párrafos se escriben como fragmentos XML (los mismos elementos que
+# generan doc.add_paragraph / add_heading / add_run) y se insertan de una
+# sola vez: el coste es lineal en el número de ítems y no pasa por el
+# modelo de objetos de python-docx en cada párrafo.
+_W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_ESTILOS = {"Title": "Title", "Heading 1": "Heading1", "Heading 2": "Heading2",
+            "List Bullet": "ListBullet", "List Paragraph": "ListParagraph"}
+
 def _as_text(value):
     if value is None:
         return ""
@@ -52,90 +92,145 @@ def _as_text(value):
         return value.get("item") or value.get("descripcion") or str(value)
     return str(value)
 
-def _add_item_bullet(doc: Document, text: str):
-    p = doc.add_paragraph(style="List Bullet")
-    p.add_run(text)
-    return p
+def _run_xml(text: str) -> str:
+    """<w:r> equivalente a paragraph.add_run(text) (tabs y saltos incluidos)."""
+    if not text:
+        return "<w:r/>"
+    partes = []
+    for trozo in re.split(r"(\t|\n|\r)", text):
+        if trozo == "\t":
+            partes.append("<w:tab/>")
+        elif trozo in ("\n", "\r"):
+            partes.append("<w:br/>")
+        elif trozo:
+            space = ' xml:space="preserve"' if trozo != trozo.strip() else ""
+            partes.append(f"<w:t{space}>{escape(trozo)}</w:t>")
+    return f"<w:r>{''.join(partes)}</w:r>"
+
+class _EscritorParrafos:
+    """Acumula párrafos como XML y los vuelca al cuerpo del documento."""
+
+    def __init__(self, doc: Document):
+        self.doc = doc
+        self.partes = []
+
+    def parrafo(self, text: str, style: str = None, indent_cm: float = None):
+        ppr = ""
+        if style or indent_cm is not None:
+            pstyle = f'<w:pStyle w:val="{_ESTILOS[style]}"/>' if style else ""
+            ind = f'<w:ind w:left="{Cm(indent_cm).twips}"/>' if indent_cm is not None else ""
+            ppr = f"<w:pPr>{pstyle}{ind}</w:pPr>"
+        self.partes.append(f"<w:p>{ppr}{_run_xml(text)}</w:p>")
+
+    def heading(self, text: str, level: int):
+        self.parrafo(text, style="Title" if level == 0 else f"Heading {level}")
+
+    def volcar(self):
+        if not self.partes:
+            return
+        cuerpo = parse_xml(f'<w:body xmlns:w="{_W}">{"".join(self.partes)}</w:body>')
+        body = self.doc.element.body
+        sect_pr = body.sectPr
+        if sect_pr is not None:
+            body.remove(sect_pr)
+        body.extend(list(cuerpo))
+        if sect_pr is not None:
+            body.append(sect_pr)
+        self.partes = []
+
+def _add_item_bullet(w: _EscritorParrafos, text: str):
+    w.parrafo(text, style="List Bullet")
 
-def _add_subitem_dash(doc: Document, text: str, indent_cm: float = 0.75):
-    p = doc.add_paragraph(style="List Paragraph")
-    p.add_run(f"- {text}")
-    p.paragraph_format.left_indent = Cm(indent_cm)
-    return p
+def _add_subitem_dash(w: _EscritorParrafos, text: str, indent_cm: float = 0.75):
+    w.parrafo(f"- {text}", style="List Paragraph", indent_cm=indent_cm)
 
-def _render_items_with_subitems(doc: Document, entries: list, *, expect_item_key: bool = True, indent_cm: float = 0.75, legacy_pair: bool = False):
+def _render_items_with_subitems(w: _EscritorParrafos, entries: list, *, expect_item_key: bool = True, indent_cm: float = 0.75, legacy_pair: bool = False):
     if not entries:
         return
     for e in entries:
         if legacy_pair:
             desc = _as_text(e.get("descripcion"))
             estado = _as_text(e.get("estado") or "N/A")
-            _add_item_bullet(doc, f"{desc} – Estado: {estado}")
+            _add_item_bullet(w, f"{desc} – Estado: {estado}")
             continue
         item_text = _as_text(e.get("item") if isinstance(e, dict) else e)
-        _add_item_bullet(doc, item_text)
+        _add_item_bullet(w, item_text)
         subitems = []
         if isinstance(e, dict):
             raw = e.get("subitems") or []
             for si in raw:
                 subitems.append(_as_text(si))
         for si_text in subitems:
-            _add_subitem_dash(doc, si_text, indent_cm=indent_cm)
+            _add_subitem_dash(w, si_text, indent_cm=indent_cm)
 
 # =========================
 #   Constructor del DOCX
 # =========================
 def _build_doc(payload, owner="Jhonatan Giraldo Cardona") -> bytes:
-    doc = Document()
-    _ensure_montserrat_styles(doc, font_name="Montserrat")
+    with etapa("estilos"):
+        doc = _documento_base()
+    w = _EscritorParrafos(doc)
 
     # Título dinámico
     titulo = "Reporte Comercial"
     if isinstance(payload, dict):
         titulo = payload.get("titulo", titulo)
-    doc.add_heading(titulo, 0)
+    w.heading(titulo, 0)
 
     clientes = payload if isinstance(payload, list) else payload.get("clientes", [])
+    with etapa("contenido"):
+        _render_clientes(w, clientes)
+        w.volcar()
+
+    stream = BytesIO()
+    with etapa("save"):
+        doc.save(stream)
+    stream.seek(0)
+    return stream.getvalue()
+
+def _render_clientes(w: _EscritorParrafos, clientes: list):
     for c in clientes:
         nombre = (c.get("cliente") or c.get("nombre") or "Cliente")
-        doc.add_heading(nombre, level=1)
+        w.heading(nombre, 1)
 
         # ---- Oportunidades ----
-        doc.add_heading("Oportunidades", level=2)
+        w.heading("Oportunidades", 2)
         oportunidades = c.get("oportunidades") or []
         legacy_mode = False
         if oportunidades and isinstance(oportunidades[0], dict) and "descripcion" in oportunidades[0]:
             legacy_mode = True
         if oportunidades:
-            _render_items_with_subitems(doc, oportunidades, legacy_pair=legacy_mode, indent_cm=0.75)
+            _render_items_with_subitems(w, oportunidades, legacy_pair=legacy_mode, indent_cm=0.75)
         else:
-            doc.add_paragraph("Sin oportunidades registradas.")
+            w.parrafo("Sin oportunidades registradas.")
 
         # ---- Riesgos y bloqueos ----
-        doc.add_heading("Riesgos y bloqueos", level=2)
+        w.heading("Riesgos y bloqueos", 2)
         riesgos = c.get("riesgos") or []
         if riesgos:
-            _render_items_with_subitems(doc, riesgos, indent_cm=0.75)
+            _render_items_with_subitems(w, riesgos, indent_cm=0.75)
         else:
-            doc.add_paragraph("Sin riesgos registrados.")
+            w.parrafo("Sin riesgos registrados.")
 
         # ---- Tareas pendientes ----
-        doc.add_heading("Tareas Pendientes", level=2)
+        w.heading("Tareas Pendientes", 2)
         tareas = c.get("tareas") or []
         if tareas:
-            _render_items_with_subitems(doc, tareas, indent_cm=0.75)
+            _render_items_with_subitems(w, tareas, indent_cm=0.75)
         else:
-            doc.add_paragraph("Sin tareas pendientes.")
-
-    stream = BytesIO()
-    doc.save(stream)
-    stream.seek(0)
-    return stream.getvalue()
+            w.parrafo("Sin tareas pendientes.")
 
 # =========================
 #   Azure Function entry
 # =========================
-def main(req: func.HttpRequest) -> func.HttpResponse:
+def main(req: func.HttpRequest, cola: func.Out[str]) -> func.HttpResponse:
+    # ?async=1 o Prefer: respond-async -> 202 con el id del trabajo (shared/trabajos.py)
+    if req.method == "POST" and es_asincrona(req):
+        return aceptar(req, "word_generation", cola)
+    return atender(req)
+
+def atender(req: func.HttpRequest) -> func.HttpResponse:
+    """Generación síncrona (también la usa el worker de trabajos asíncronos)."""
     logging.info("HTTP trigger -> generación de Word con bullets y subitems con guiones.")
 
     if req.method == "GET":
@@ -152,11 +247,19 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         or "Jhonatan Giraldo Cardona"
     )
 
-    try:
-        content = _build_doc(payload, owner=owner)
-    except Exception as e:
-        logging.exception("Error generando el documento.")
-        return func.HttpResponse(f"Error generando el documento: {e}", status_code=500)
+    with medir("word_generation") as medidor, perfilar(req.params.get("perfil") == "1") as perfil:
+        try:
+            content = _build_doc(payload, owner=owner)
+        except Exception as e:
+            logging.exception("Error generando el documento.")
+            return func.HttpResponse(f"Error generando el documento: {e}", status_code=500)
+    if perfil:
+        logging.info(f"Perfil ({perfil['motor']}):\n{perfil['texto']}")
+
+    # La respuesta es binaria: los tiempos van en cabeceras (?timings=1 añade el detalle)
+    cabeceras = {"Server-Timing": medidor.server_timing()}
+    if req.params.get("timings") == "1":
+        cabeceras["X-Timings"] = json.dumps(medidor.resumen())
 
     # Nombre dinámico del archivo
     titulo_archivo = "ReporteComercial"
@@ -167,5 +270,5 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     return func.HttpResponse(
         content,
         mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+        headers={"Content-Disposition": f"attachment; filename={filename}", **cabeceras}
     )
\ No newline at end of file
@@ -0,0 +1,11 @@
+import logging
+import json
+import azure.functions as func
+
+from api_pdf_validator.lotes import procesar_item
+
+def main(msg: func.QueueMessage) -> None:
+    """Worker del lote: valida un PDF por mensaje (escala con el número de instancias)."""
+    mensaje = json.loads(msg.get_body().decode("utf-8"))
+    logging.info(f"Lote {mensaje['lote_id']}: validando PDF {mensaje['n']} ({mensaje['filename']})")
+    procesar_item(mensaje, intento=msg.dequeue_count or 1)
@@ -0,0 +1,21 @@
+import logging
+import json
+import azure.functions as func
+
+from shared.trabajos import procesar_trabajo
+from api_pdf_validator import atender as atender_validador
+from api_ppt_generation import atender as atender_ppt
+from obs.word_generation import atender as atender_word
+
+# Función que encoló el trabajo -> manejador síncrono (req -> HttpResponse)
+MANEJADORES = {
+    "api_pdf_validator": atender_validador,
+    "api_ppt_generation": atender_ppt,
+    "word_generation": atender_word,
+}
+
+def main(msg: func.QueueMessage) -> None:
+    """Worker de trabajos asíncronos: ejecuta la petición guardada y deja el resultado en blob."""
+    mensaje = json.loads(msg.get_body().decode("utf-8"))
+    logging.info(f"Trabajo {mensaje['trabajo_id']}: {mensaje['funcion']} (intento {msg.dequeue_count or 1})")
+    procesar_trabajo(mensaje, MANEJADORES, intento=msg.dequeue_count or 1)
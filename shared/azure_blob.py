@@ -1,34 +1,198 @@
 import os
 import json
 import logging
-from azure.storage.blob import BlobServiceClient, ContentSettings
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from shared.blob_local import ServicioBlobLocal
+from shared.instrumentacion import etapa, ejecutar_con_contexto
+from shared.perezoso import perezoso
+
+# SDK de Blob: se importa al crear el primer cliente (no hace falta con BLOB_LOCAL_DIR)
+_sdk_blob = perezoso("azure.storage.blob")
+_excepciones = perezoso("azure.core.exceptions")
+
+# Configuración
+MAX_CONCURRENCIA = int(os.getenv("BLOB_MAX_CONCURRENCIA", "8"))
+
+_servicio = None
+_servicio_clave = None
+_contenedores_ok = set()
+_lock = threading.Lock()
+
+# Subidas en segundo plano (fuera del camino de la respuesta HTTP)
+_pool_fondo = None
+_pendientes = set()
 
 def get_blob_service():
-    """Obtiene el cliente de Blob usando la variable de entorno."""
+    """
+    Cliente de Blob único por worker (reutiliza su pool de conexiones).
+    Con BLOB_LOCAL_DIR se usa el sustituto local en disco (shared/blob_local.py).
+    """
+    global _servicio, _servicio_clave
+    local_dir = os.getenv("BLOB_LOCAL_DIR")
     conn = os.getenv("AzureWebJobsStorage")
-    if not conn:
+    clave = ("local", local_dir) if local_dir else ("azure", conn)
+    if not local_dir and not conn:
         logging.error("Falta la configuración 'AzureWebJobsStorage'.")
         return None
-    return BlobServiceClient.from_connection_string(conn)
+    with _lock:
+        if _servicio is None or _servicio_clave != clave:
+            if local_dir:
+                _servicio = ServicioBlobLocal(local_dir)
+            else:
+                _servicio = _sdk_blob.BlobServiceClient.from_connection_string(conn)
+            _servicio_clave = clave
+            _contenedores_ok.clear()
+        return _servicio
+
+def _get_container(service, container: str):
+    """Cliente del contenedor; la comprobación/creación se hace una vez por worker."""
+    container_client = service.get_container_client(container)
+    if container not in _contenedores_ok:
+        if not container_client.exists():
+            container_client.create_container()
+        _contenedores_ok.add(container)
+    return container_client
 
-def subir_bytes(data: bytes, container: str, blob_name: str, content_type: str = None):
-    """Sube bytes a una ruta específica."""
+def subir_bytes(data: bytes, container: str, blob_name: str, content_type: str = None) -> bool:
+    """Sube bytes a una ruta específica. Devuelve si se subió."""
     try:
         service = get_blob_service()
         if service:
-            # Crear contenedor si no existe (opcional, pero útil)
-            container_client = service.get_container_client(container)
-            if not container_client.exists():
-                container_client.create_container()
-
-            blob_client = container_client.get_blob_client(blob_name)
-            settings = ContentSettings(content_type=content_type) if content_type else None
-            blob_client.upload_blob(data, overwrite=True, content_settings=settings)
+            with etapa(f"subida:{blob_name}"):
+                container_client = _get_container(service, container)
+                blob_client = container_client.get_blob_client(blob_name)
+                # El sustituto local ignora content_settings: así no carga el SDK
+                local = isinstance(service, ServicioBlobLocal)
+                settings = _sdk_blob.ContentSettings(content_type=content_type) if content_type and not local else None
+                blob_client.upload_blob(data, overwrite=True, content_settings=settings)
             logging.info(f"Subido: {blob_name}")
+            return True
     except Exception as e:
         logging.error(f"Error subiendo blob {blob_name}: {e}")
+    return False
+
+def crear_si_no_existe(data: bytes, container: str, blob_name: str, content_type: str = None) -> bool:
+    """
+    Sube el blob sólo si aún no existe (escritura condicional, atómica en el
+    storage). Devuelve False si ya existía; otros errores se propagan.
+    """
+    service = get_blob_service()
+    if service is None:
+        raise RuntimeError("Blob Storage no configurado")
+    blob_client = _get_container(service, container).get_blob_client(blob_name)
+    local = isinstance(service, ServicioBlobLocal)
+    settings = _sdk_blob.ContentSettings(content_type=content_type) if content_type and not local else None
+    try:
+        blob_client.upload_blob(data, overwrite=False, content_settings=settings)
+    except FileExistsError:  # sustituto local
+        return False
+    except Exception as e:
+        if not local and isinstance(e, _excepciones.ResourceExistsError):
+            return False
+        raise
+    return True
 
-def subir_json(data_dict: dict, container: str, blob_name: str):
-    """Helper para subir diccionarios como JSON."""
+def subir_json(data_dict: dict, container: str, blob_name: str) -> bool:
+    """Helper para subir diccionarios como JSON. Devuelve si se subió."""
     json_bytes = json.dumps(data_dict, ensure_ascii=False, indent=2).encode("utf-8")
-    subir_bytes(json_bytes, container, blob_name, content_type="application/json")
\ No newline at end of file
+    return subir_bytes(json_bytes, container, blob_name, content_type="application/json")
+
+def subir_muchos(subidas, max_concurrencia: int = None):
+    """
+    Sube en paralelo una lista de (data, container, blob_name, content_type)
+    y espera a que terminen todas. Devuelve si se subió cada una (en orden).
+    """
+    subidas = list(subidas)
+    if not subidas:
+        return []
+    workers = max(1, min(max_concurrencia or MAX_CONCURRENCIA, len(subidas)))
+    tareas = [ejecutar_con_contexto(subir_bytes, *s) for s in subidas]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda t: t(), tareas))
+
+def encolar_tarea(tarea, *args):
+    """
+    Ejecuta tarea(*args) en el pool de segundo plano y vuelve inmediatamente
+    (para secuencias de subidas que deben ir en orden). esperar_subidas también la espera.
+    """
+    global _pool_fondo
+    with _lock:
+        if _pool_fondo is None:
+            _pool_fondo = ThreadPoolExecutor(max_workers=MAX_CONCURRENCIA, thread_name_prefix="blob-fondo")
+        fut = _pool_fondo.submit(ejecutar_con_contexto(tarea, *args))
+        _pendientes.add(fut)
+    fut.add_done_callback(_pendientes.discard)
+    return fut
+
+def encolar_subida(data: bytes, container: str, blob_name: str, content_type: str = None):
+    """Programa una subida en segundo plano y vuelve inmediatamente."""
+    return encolar_tarea(subir_bytes, data, container, blob_name, content_type)
+
+def esperar_subidas(timeout: float = None):
+    """Espera a las subidas en segundo plano pendientes. Devuelve cuántas quedan."""
+    with _lock:
+        pendientes = list(_pendientes)
+    _, quedan = wait(pendientes, timeout=timeout)
+    return len(quedan)
+
+def descargar_bytes(container: str, blob_name: str):
+    """Descarga un blob completo. Devuelve None si no existe o falla."""
+    try:
+        service = get_blob_service()
+        if service:
+            blob_client = service.get_blob_client(container, blob_name)
+            if not blob_client.exists():
+                return None
+            return blob_client.download_blob().readall()
+    except Exception as e:
+        logging.error(f"Error descargando blob {blob_name}: {e}")
+    return None
+
+def descargar_en_bloques(container: str, blob_name: str):
+    """
+    Descarga un blob por bloques a un bytearray reservado con su tamaño final,
+    sin acumular copias intermedias. Devuelve None si no existe o falla.
+    """
+    try:
+        service = get_blob_service()
+        if service:
+            blob_client = service.get_blob_client(container, blob_name)
+            if not blob_client.exists():
+                return None
+            descarga = blob_client.download_blob(max_concurrency=1)
+            buffer = bytearray(descarga.size)
+            pos = 0
+            for bloque in descarga.chunks():
+                buffer[pos:pos + len(bloque)] = bloque
+                pos += len(bloque)
+            return buffer
+    except Exception as e:
+        logging.error(f"Error descargando blob {blob_name}: {e}")
+    return None
+
+def listar_blobs(container: str, prefijo: str = None):
+    """Nombres de los blobs del contenedor que empiezan por prefijo."""
+    try:
+        service = get_blob_service()
+        if service:
+            container_client = service.get_container_client(container)
+            return [b.name for b in container_client.list_blobs(name_starts_with=prefijo)]
+    except Exception as e:
+        logging.error(f"Error listando blobs {prefijo}: {e}")
+    return []
+
+def listar_etags(container: str, prefijo: str = None):
+    """
+    {nombre: etag} de los blobs que empiezan por prefijo (para detectar
+    cambios). None si no se pudo listar: "no hay blobs" y "no se sabe" no
+    son lo mismo para quien recarga configuración.
+    """
+    try:
+        service = get_blob_service()
+        if service:
+            container_client = service.get_container_client(container)
+            return {b.name: b.etag for b in container_client.list_blobs(name_starts_with=prefijo)}
+    except Exception as e:
+        logging.error(f"Error listando blobs {prefijo}: {e}")
+    return None
@@ -1,45 +1,147 @@
 import os
+import io
 import time
+import hashlib
 import logging
-from msrest.authentication import CognitiveServicesCredentials
-from azure.cognitiveservices.vision.computervision import ComputerVisionClient
-from azure.cognitiveservices.vision.computervision.models import OperationStatusCodes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from shared.cache import CacheLRU
+from shared.perezoso import perezoso
+
+# SDK de Vision (msrest incluido): se importa al crear el primer cliente
+_auth = perezoso("msrest.authentication")
+_vision = perezoso("azure.cognitiveservices.vision.computervision")
+_modelos = perezoso("azure.cognitiveservices.vision.computervision.models")
+
+# Configuración (VISION_ENDPOINT puede apuntar al stub local: shared/vision_stub.py)
+MAX_CONCURRENCIA = int(os.getenv("VISION_MAX_CONCURRENCIA", "4"))
+TIMEOUT_S = float(os.getenv("VISION_TIMEOUT_S", "60"))
+POLL_INICIAL_S = 0.1
+POLL_MAXIMO_S = 2.0
+POLL_FACTOR = 1.5
+# 429 (límite de peticiones del recurso): msrest no lo reintenta. Se espera
+# lo que indique Retry-After (con tope) y se reintenta hasta REINTENTOS_429 veces.
+REINTENTOS_429 = int(os.getenv("VISION_REINTENTOS_429", "3"))
+RETRY_AFTER_MAX_S = 30.0
+
+_cliente = None
+_cliente_clave = None
+_lock = threading.Lock()
+
+# Resultados OCR por hash de la imagen: reutilizados entre reglas y peticiones
+_cache_ocr = CacheLRU(int(os.getenv("VISION_CACHE_MAX", "256")))
 
 def get_vision_client():
+    """Cliente de Vision reutilizado por el worker (se recrea si cambian las credenciales)."""
+    global _cliente, _cliente_clave
     endpoint = os.getenv("VISION_ENDPOINT")
     key = os.getenv("VISION_KEY")
     if not endpoint or not key:
         return None
-    return ComputerVisionClient(endpoint, CognitiveServicesCredentials(key))
+    with _lock:
+        if _cliente is None or _cliente_clave != (endpoint, key):
+            _cliente = _vision.ComputerVisionClient(endpoint, _auth.CognitiveServicesCredentials(key))
+            _cliente_clave = (endpoint, key)
+        return _cliente
 
-def leer_texto_imagen(image_stream):
+def hash_imagen(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def _espera_429(error):
+    """Segundos a esperar si `error` es un 429 de Vision (None si es otro error)."""
+    respuesta = getattr(error, "response", None)
+    if getattr(respuesta, "status_code", None) != 429:
+        return None
+    try:
+        return min(RETRY_AFTER_MAX_S, max(0.0, float(respuesta.headers.get("Retry-After", 1))))
+    except (TypeError, ValueError):
+        return 1.0
+
+def _con_reintentos_429(llamada):
+    """Ejecuta llamada() reintentando los 429 tras su Retry-After."""
+    for intento in range(REINTENTOS_429 + 1):
+        try:
+            return llamada()
+        except Exception as e:
+            espera = _espera_429(e)
+            if espera is None or intento == REINTENTOS_429:
+                raise
+            logging.warning(f"Azure Vision: 429, reintento {intento + 1}/{REINTENTOS_429} en {espera:.1f}s")
+            time.sleep(espera)
+
+def _esperar_resultado(client, operation_id):
+    """Polling con backoff: empieza rápido y se espacia hasta POLL_MAXIMO_S."""
+    espera = POLL_INICIAL_S
+    limite = time.monotonic() + TIMEOUT_S
+    while True:
+        read_result = _con_reintentos_429(lambda: client.get_read_result(operation_id))
+        if read_result.status not in ['notStarted', 'running']:
+            return read_result
+        if time.monotonic() + espera > limite:
+            return None
+        time.sleep(espera)
+        espera = min(espera * POLL_FACTOR, POLL_MAXIMO_S)
+
+def leer_texto_bytes(image_bytes: bytes):
     """
-    Envía un stream de imagen a Azure y devuelve el texto plano.
+    OCR de una imagen (bytes) con caché por hash.
     Retorna: (texto_str, error_msg)
     """
+    clave = hash_imagen(image_bytes)
+    cacheado = _cache_ocr.get(clave)
+    if cacheado is not None:
+        return cacheado, None
+
     client = get_vision_client()
     if not client:
         return "", "Faltan credenciales de Vision"
 
     try:
-        read_response = client.read_in_stream(image_stream, raw=True)
+        # Stream nuevo en cada intento: el anterior ya se consumió
+        read_response = _con_reintentos_429(lambda: client.read_in_stream(io.BytesIO(image_bytes), raw=True))
         operation_location = read_response.headers["Operation-Location"]
         operation_id = operation_location.split("/")[-1]
 
-        while True:
-            read_result = client.get_read_result(operation_id)
-            if read_result.status not in ['notStarted', 'running']:
-                break
-            time.sleep(0.3)
+        read_result = _esperar_resultado(client, operation_id)
+        if read_result is None:
+            return "", f"Timeout Azure Vision ({TIMEOUT_S:.0f}s)"
 
-        if read_result.status == OperationStatusCodes.succeeded:
+        if read_result.status == _modelos.OperationStatusCodes.succeeded:
             texto = []
             for result in read_result.analyze_result.read_results:
                 for line in result.lines:
                     texto.append(line.text)
-            return "\n".join(texto), None
+            texto = "\n".join(texto)
+            _cache_ocr.set(clave, texto)
+            return texto, None
         else:
             return "", f"Error Azure Vision: {read_result.status}"
-            
+
     except Exception as e:
-        return "", str(e)
\ No newline at end of file
+        return "", str(e)
+
+def leer_texto_imagen(image_stream):
+    """
+    Envía un stream de imagen a Azure y devuelve el texto plano.
+    Retorna: (texto_str, error_msg)
+    """
+    return leer_texto_bytes(image_stream.read())
+
+def leer_textos_imagenes(imagenes, max_concurrencia: int = None):
+    """
+    OCR concurrente de varias imágenes (lista de bytes), con tope de concurrencia.
+    Las imágenes idénticas se envían una sola vez.
+    Retorna: lista de (texto_str, error_msg) en el mismo orden.
+    """
+    if not imagenes:
+        return []
+    claves = [hash_imagen(img) for img in imagenes]
+    unicas = {}
+    for clave, img in zip(claves, imagenes):
+        unicas.setdefault(clave, img)
+
+    workers = max(1, min(max_concurrencia or MAX_CONCURRENCIA, len(unicas)))
+    logging.info(f"OCR Azure: {len(unicas)} imágenes, concurrencia {workers}")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        resultados = dict(zip(unicas, pool.map(leer_texto_bytes, unicas.values())))
+    return [resultados[c] for c in claves]
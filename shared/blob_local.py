@@ -0,0 +1,125 @@
+"""
+Sustituto local de Azure Blob Storage respaldado por el sistema de archivos.
+
+Implementa el subconjunto de la API de azure-storage-blob que usa
+shared.azure_blob. Se activa con BLOB_LOCAL_DIR=<directorio>; cada
+contenedor es una carpeta y cada blob un archivo.
+"""
+import os
+import threading
+from datetime import datetime, timezone
+
+class BlobNoEncontrado(Exception):
+    pass
+
+class _Propiedades:
+    def __init__(self, name, path):
+        st = os.stat(path)
+        self.name = name
+        self.size = st.st_size
+        self.last_modified = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+        self.etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+class _Descarga:
+    TAM_CHUNK = 4 * 1024 * 1024
+
+    def __init__(self, path):
+        self._path = path
+        self.size = os.path.getsize(path)
+
+    def readall(self):
+        with open(self._path, "rb") as f:
+            return f.read()
+
+    def chunks(self):
+        with open(self._path, "rb") as f:
+            while True:
+                bloque = f.read(self.TAM_CHUNK)
+                if not bloque:
+                    break
+                yield bloque
+
+class BlobLocal:
+    def __init__(self, contenedor, nombre):
+        self.container_name = contenedor.nombre
+        self.blob_name = nombre
+        self._path = os.path.join(contenedor.path, *nombre.split("/"))
+
+    def exists(self):
+        return os.path.isfile(self._path)
+
+    def upload_blob(self, data, overwrite=False, content_settings=None, **kwargs):
+        if not overwrite and self.exists():
+            raise FileExistsError(self.blob_name)
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        if hasattr(data, "read"):
+            data = data.read()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        # Escritura atómica: otro hilo nunca ve un blob a medias
+        tmp = f"{self._path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        if overwrite:
+            os.replace(tmp, self._path)
+            return
+        # Sin sobrescribir: link() falla si el destino ya existe (como la
+        # subida condicional de Azure cuando dos peticiones compiten)
+        try:
+            os.link(tmp, self._path)
+        finally:
+            os.remove(tmp)
+
+    def download_blob(self, **kwargs):
+        if not self.exists():
+            raise BlobNoEncontrado(self.blob_name)
+        return _Descarga(self._path)
+
+    def get_blob_properties(self):
+        if not self.exists():
+            raise BlobNoEncontrado(self.blob_name)
+        return _Propiedades(self.blob_name, self._path)
+
+    def delete_blob(self):
+        if self.exists():
+            os.remove(self._path)
+
+class ContenedorLocal:
+    def __init__(self, raiz, nombre):
+        self.nombre = nombre
+        self.path = os.path.join(raiz, nombre)
+
+    def exists(self):
+        return os.path.isdir(self.path)
+
+    def create_container(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def get_blob_client(self, blob):
+        return BlobLocal(self, blob)
+
+    def list_blobs(self, name_starts_with=None):
+        if not self.exists():
+            return
+        for raiz, _, archivos in os.walk(self.path):
+            for a in sorted(archivos):
+                if a.endswith(".tmp"):
+                    continue
+                full = os.path.join(raiz, a)
+                nombre = os.path.relpath(full, self.path).replace(os.sep, "/")
+                if name_starts_with and not nombre.startswith(name_starts_with):
+                    continue
+                yield _Propiedades(nombre, full)
+
+class ServicioBlobLocal:
+    """Equivalente local de BlobServiceClient."""
+
+    def __init__(self, raiz):
+        self.raiz = os.path.abspath(raiz)
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def get_container_client(self, container):
+        return ContenedorLocal(self.raiz, container)
+
+    def get_blob_client(self, container, blob):
+        return ContenedorLocal(self.raiz, container).get_blob_client(blob)
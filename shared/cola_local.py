@@ -0,0 +1,74 @@
+"""
+Sustituto local de las colas de Azure Storage para probar sin conexión.
+
+ColaLocal hace de salida a cola (func.Out[str] / func.Out[List[str]]) de una
+función HTTP y guarda los mensajes en memoria; procesar() los entrega al
+main de la función con queueTrigger, con la semántica de reintentos del
+host: si main lanza, el mensaje vuelve a la cola con dequeue_count + 1 y,
+al llegar a MAX_DEQUEUE, pasa a la cola de mensajes envenenados.
+
+Junto con BLOB_LOCAL_DIR permite recorrer un flujo completo en un proceso:
+
+    cola = ColaLocal()
+    resp = api_ppt_generation.main(req_async, cola)     # 202 + trabajo_id
+    cola.procesar(queue_trabajos.main)                  # ejecuta el trabajo
+    api_trabajos.main(req_resultado)                    # 200 + pptx
+"""
+import json
+import logging
+from collections import deque
+
+MAX_DEQUEUE = 5  # maxDequeueCount por defecto del host
+
+class MensajeLocal:
+    """Equivalente de func.QueueMessage para el worker."""
+
+    def __init__(self, body, id: str, dequeue_count: int = 1):
+        self._body = body.encode("utf-8") if isinstance(body, str) else body
+        self.id = id
+        self.dequeue_count = dequeue_count
+
+    def get_body(self) -> bytes:
+        return self._body
+
+    def get_json(self):
+        return json.loads(self._body.decode("utf-8"))
+
+class ColaLocal:
+    def __init__(self, max_dequeue: int = MAX_DEQUEUE):
+        self.max_dequeue = max_dequeue
+        self.mensajes = deque()      # (body, dequeue_count)
+        self.envenenados = []
+        self._siguiente_id = 0
+
+    # --- Interfaz de func.Out ---
+    def set(self, valor):
+        for body in (valor if isinstance(valor, (list, tuple)) else [valor]):
+            self.mensajes.append((body, 1))
+
+    def get(self):
+        return [body for body, _ in self.mensajes]
+
+    def __len__(self):
+        return len(self.mensajes)
+
+    def procesar(self, worker, maximo: int = None) -> int:
+        """
+        Entrega los mensajes pendientes a `worker` (main con queueTrigger)
+        hasta vaciar la cola o llegar a `maximo` entregas. Devuelve las entregas.
+        """
+        entregas = 0
+        while self.mensajes and (maximo is None or entregas < maximo):
+            body, intento = self.mensajes.popleft()
+            self._siguiente_id += 1
+            entregas += 1
+            try:
+                worker(MensajeLocal(body, str(self._siguiente_id), intento))
+            except Exception as e:
+                if intento < self.max_dequeue:
+                    logging.warning(f"Mensaje reintentado ({intento}/{self.max_dequeue}): {e}")
+                    self.mensajes.append((body, intento + 1))
+                else:
+                    logging.error(f"Mensaje envenenado tras {intento} intentos: {e}")
+                    self.envenenados.append(body)
+        return entregas
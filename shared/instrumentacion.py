@@ -0,0 +1,184 @@
+import os
+import io
+import json
+import time
+import logging
+import threading
+import contextvars
+import unicodedata
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows (desarrollo local)
+    resource = None
+
+# ==========================================
+# INSTRUMENTACIÓN POR ETAPAS
+# ==========================================
+# Cada función crea un Medidor con `medir(...)`; el código interno marca sus
+# etapas con `etapa("nombre")` sin recibir el medidor como parámetro (se
+# propaga con contextvars). Por etapa se registra tiempo de pared, CPU y
+# memoria.
+#
+# Sólo trazas, no métricas personalizadas: cada etapa se emite como una
+# traza de log "METRICA {json}" que el host envía a Application Insights
+# (tabla traces, no customMetrics). Se agregan en consulta, p. ej.
+#   traces | where message startswith "METRICA "
+#          | extend m = parse_json(substring(message, 8))
+#          | summarize percentiles(todouble(m.wall_ms), 50, 95) by tostring(m.etapa)
+# Exportar a customMetrics exigiría un SDK de OpenTelemetry con exportador de
+# Azure Monitor, que no forma parte de las dependencias.
+#
+# CPU: cpu_ms es la del hilo que ejecuta la etapa (time.thread_time); no
+# incluye el trabajo que la etapa delega en hilos o procesos auxiliares
+# (codificación de evidencias, subidas, pools de páginas o gráficas).
+# cpu_proceso_ms es la de todo el proceso (time.process_time): con peticiones
+# concurrentes o subidas en segundo plano incluye CPU de otras peticiones.
+#
+# Memoria: ru_maxrss es el pico del proceso desde que arrancó, no el de la
+# etapa. rss_pico_mb es ese pico al terminar la etapa y rss_pico_subida_mb
+# cuánto lo subió la etapa (0 si no superó un pico anterior, aunque haya
+# reservado memoria).
+
+_medidor_actual = contextvars.ContextVar("medidor_actual", default=None)
+
+def _rss_pico_mb():
+    if resource is None:
+        return None
+    # ru_maxrss viene en KB en Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+class Medidor:
+    """Acumula las etapas medidas de una invocación."""
+
+    def __init__(self, funcion: str, invocation_id: str = None):
+        self.funcion = funcion
+        self.invocation_id = invocation_id
+        self.etapas = []
+        self._inicio = time.perf_counter()
+        self._cpu_inicio = time.thread_time()
+        self._cpu_proceso_inicio = time.process_time()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def etapa(self, nombre: str):
+        rss_antes = _rss_pico_mb()
+        t0, c0, p0 = time.perf_counter(), time.thread_time(), time.process_time()
+        try:
+            yield
+        finally:
+            registro = {
+                "etapa": nombre,
+                "wall_ms": round((time.perf_counter() - t0) * 1000, 2),
+                "cpu_ms": round((time.thread_time() - c0) * 1000, 2),
+                "cpu_proceso_ms": round((time.process_time() - p0) * 1000, 2),
+                "rss_pico_mb": _rss_pico_mb(),
+            }
+            if rss_antes is not None:
+                registro["rss_pico_subida_mb"] = round(registro["rss_pico_mb"] - rss_antes, 1)
+            with self._lock:
+                self.etapas.append(registro)
+
+    def resumen(self) -> dict:
+        with self._lock:
+            etapas = list(self.etapas)
+        return {
+            "funcion": self.funcion,
+            "total_ms": round((time.perf_counter() - self._inicio) * 1000, 2),
+            "cpu_ms": round((time.thread_time() - self._cpu_inicio) * 1000, 2),
+            "cpu_proceso_ms": round((time.process_time() - self._cpu_proceso_inicio) * 1000, 2),
+            "rss_pico_mb": _rss_pico_mb(),
+            "etapas": etapas,
+        }
+
+    def server_timing(self) -> str:
+        """Cabecera Server-Timing (visible en las DevTools del navegador)."""
+        with self._lock:
+            etapas = list(self.etapas)
+        partes = []
+        for i, e in enumerate(etapas):
+            # Las cabeceras HTTP sólo admiten ASCII
+            desc = unicodedata.normalize("NFKD", e["etapa"]).encode("ascii", "ignore").decode().replace('"', "'")
+            partes.append(f'e{i};dur={e["wall_ms"]};desc="{desc}"')
+        return ", ".join(partes)
+
+    def emitir(self):
+        """Emite cada etapa y el total como trazas "METRICA {json}"."""
+        resumen = self.resumen()
+        for e in resumen["etapas"]:
+            dims = {"funcion": self.funcion, "etapa": e["etapa"]}
+            logging.info(f"METRICA {json.dumps({**dims, **e}, ensure_ascii=False)}")
+        total = {"funcion": self.funcion, "etapa": "total", "wall_ms": resumen["total_ms"],
+                 "cpu_ms": resumen["cpu_ms"], "cpu_proceso_ms": resumen["cpu_proceso_ms"],
+                 "rss_pico_mb": resumen["rss_pico_mb"]}
+        logging.info(f"METRICA {json.dumps(total)}")
+
+@contextmanager
+def medir(funcion: str, invocation_id: str = None):
+    """Activa un Medidor para la invocación actual y emite sus métricas al salir."""
+    medidor = Medidor(funcion, invocation_id)
+    token = _medidor_actual.set(medidor)
+    try:
+        yield medidor
+    finally:
+        _medidor_actual.reset(token)
+        try:
+            medidor.emitir()
+        except Exception as e:
+            logging.warning(f"No se pudieron emitir métricas: {e}")
+
+@contextmanager
+def etapa(nombre: str):
+    """Mide una etapa en el Medidor activo (no-op si no hay ninguno)."""
+    medidor = _medidor_actual.get()
+    if medidor is None:
+        yield
+        return
+    with medidor.etapa(nombre):
+        yield
+
+def ejecutar_con_contexto(fn, *args, **kwargs):
+    """Para hilos: ejecuta fn en una copia del contexto actual (conserva el Medidor)."""
+    ctx = contextvars.copy_context()
+    return lambda: ctx.run(fn, *args, **kwargs)
+
+@contextmanager
+def perfilar(activo: bool):
+    """
+    Perfilado de una sola petición. Usa pyinstrument (muestreo) si está
+    instalado y cProfile si no. Sólo se activa si PERFIL_HABILITADO=1.
+    El informe de texto queda en el dict devuelto bajo "texto".
+    """
+    salida = {}
+    if not (activo and os.getenv("PERFIL_HABILITADO", "0") == "1"):
+        yield salida
+        return
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        perfilador = Profiler(interval=0.005)
+        perfilador.start()
+        try:
+            yield salida
+        finally:
+            perfilador.stop()
+            salida["texto"] = perfilador.output_text(unicode=True, color=False)
+            salida["motor"] = "pyinstrument"
+        return
+
+    import cProfile
+    import pstats
+    perfilador = cProfile.Profile()
+    perfilador.enable()
+    try:
+        yield salida
+    finally:
+        perfilador.disable()
+        buf = io.StringIO()
+        pstats.Stats(perfilador, stream=buf).sort_stats("cumulative").print_stats(40)
+        salida["texto"] = buf.getvalue()
+        salida["motor"] = "cProfile"
@@ -0,0 +1,40 @@
+import importlib
+import threading
+
+# ==========================================
+# IMPORTACIÓN DIFERIDA DE DEPENDENCIAS PESADAS
+# ==========================================
+# En el plan Consumo el host importa el módulo de cada función al arrancar
+# el worker: fitz, cv2, matplotlib o los SDK de Azure suman segundos de cold
+# start aunque la petición no llegue a usarlos. `perezoso("cv2")` devuelve un
+# sustituto que importa el módulo real en el primer acceso a un atributo, de
+# modo que el código que lo usa (`cv2.resize(...)`) no cambia.
+# Para ver qué cuesta cada import: python tests/tiempos_importacion.py
+
+class ModuloPerezoso:
+    """Sustituto de un módulo que se importa en el primer acceso."""
+
+    def __init__(self, nombre: str):
+        self.__dict__["_nombre"] = nombre
+        self.__dict__["_modulo"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def cargar(self):
+        modulo = self.__dict__["_modulo"]
+        if modulo is None:
+            with self.__dict__["_lock"]:
+                modulo = self.__dict__["_modulo"]
+                if modulo is None:
+                    modulo = importlib.import_module(self.__dict__["_nombre"])
+                    self.__dict__["_modulo"] = modulo
+        return modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self.cargar(), atributo)
+
+    def __repr__(self):
+        estado = "cargado" if self.__dict__["_modulo"] is not None else "sin cargar"
+        return f"<módulo perezoso {self.__dict__['_nombre']} ({estado})>"
+
+def perezoso(nombre: str) -> ModuloPerezoso:
+    return ModuloPerezoso(nombre)
@@ -0,0 +1,250 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+from datetime import datetime, timezone, timedelta
+
+import azure.functions as func
+
+from shared.azure_blob import subir_bytes, subir_json, descargar_bytes, crear_si_no_existe
+
+# ==========================================
+# TRABAJOS ASÍNCRONOS (202 + cola + blob)
+# ==========================================
+# Cualquier endpoint HTTP puede aceptar la petición y devolver 202 con un id
+# de trabajo (?async=1 o cabecera "Prefer: respond-async"). La petición
+# original se guarda en blob y la cola COLA_TRABAJOS sólo lleva el id; el
+# worker (queue_trabajos) la reconstruye y se la pasa al mismo manejador que
+# la atendería en modo síncrono, así que el resultado es idéntico.
+#
+#   trabajos/<id>/estado.json     -> estado, intentos, tipo y cabeceras del resultado
+#   trabajos/<id>/peticion.json   -> método, url, query y cabeceras originales
+#   trabajos/<id>/cuerpo          -> cuerpo original (puede ser un PDF grande)
+#   trabajos/<id>/resultado       -> cuerpo de la respuesta (JSON, pptx, docx...)
+#   trabajos/idempotencia/<funcion>/<sha256(clave)>.json -> id del trabajo
+#
+# Estados: registrando -> pendiente -> en_curso -> completado | error.
+# "registrando" se escribe antes de subir el cuerpo y el id sólo se encola
+# cuando petición y cuerpo están en blob (si no, la respuesta es 500).
+# Con la cabecera Idempotency-Key, los reintentos del cliente devuelven el
+# mismo trabajo en lugar de encolar otro (misma clave + otro cuerpo -> 422),
+# también mientras la petición original aún sube el cuerpo. Sólo se vuelve a
+# registrar si el registro original falló o lleva más de REGISTRO_CADUCADO_S
+# sin terminar (la petición original se cortó).
+
+COLA_TRABAJOS = "trabajos"
+CONTENEDOR = os.getenv("TRABAJOS_CONTAINER", "trabajos")
+PREFIJO = "trabajos"
+MAX_REINTENTOS = 5  # Igual que maxDequeueCount por defecto de las colas
+IDEMPOTENCIA_TTL_H = float(os.getenv("TRABAJOS_IDEMPOTENCIA_TTL_H", "24"))
+RETRY_AFTER_S = "5"
+REGISTRO_CADUCADO_S = float(os.getenv("TRABAJOS_REGISTRO_CADUCADO_S", "600"))
+
+FINALES = ("completado", "error")
+
+# Cabeceras de la petición que no se guardan (credenciales y control async)
+_CABECERAS_EXCLUIDAS = {"authorization", "cookie", "x-functions-key", "prefer", "idempotency-key"}
+# Cabeceras de la respuesta que se conservan para servir el resultado
+_CABECERAS_RESULTADO = ("Content-Disposition", "Server-Timing", "X-Timings", "X-Diapositivas",
+                        "X-Tiempo-Generacion-Ms")
+
+def _ahora():
+    return datetime.now(timezone.utc)
+
+def _ruta(trabajo_id, *partes):
+    return "/".join([PREFIJO, trabajo_id, *partes])
+
+def _leer_json(ruta):
+    data = descargar_bytes(CONTENEDOR, ruta)
+    return json.loads(data) if data is not None else None
+
+def _respuesta_json(datos, status_code, headers=None):
+    return func.HttpResponse(json.dumps(datos, ensure_ascii=False), mimetype="application/json",
+                             status_code=status_code, headers=headers)
+
+def es_asincrona(req: func.HttpRequest) -> bool:
+    """La petición pide modo asíncrono (?async=1 o Prefer: respond-async)."""
+    if (req.params.get("async") or "").strip().lower() in ("1", "true", "si", "sí", "yes"):
+        return True
+    return "respond-async" in (req.headers.get("Prefer") or "").lower()
+
+def leer_estado(trabajo_id: str):
+    """estado.json del trabajo o None si no existe."""
+    return _leer_json(_ruta(trabajo_id, "estado.json"))
+
+def _guardar_estado(estado: dict) -> bool:
+    estado["actualizado"] = _ahora().isoformat()
+    return subir_json(estado, CONTENEDOR, _ruta(estado["trabajo_id"], "estado.json"))
+
+def _huella(req: func.HttpRequest, cuerpo: bytes) -> str:
+    h = hashlib.sha256()
+    h.update(req.method.upper().encode())
+    h.update(b"\0")
+    h.update(cuerpo)
+    return h.hexdigest()
+
+def _aceptado(trabajo_id: str, estado: str, repetido: bool = False):
+    urls = {"estado": f"/api/trabajos/{trabajo_id}", "resultado": f"/api/trabajos/{trabajo_id}/resultado"}
+    cabeceras = {"Location": urls["estado"], "Retry-After": RETRY_AFTER_S}
+    if repetido:
+        cabeceras["Idempotent-Replayed"] = "true"
+    return _respuesta_json({"trabajo_id": trabajo_id, "situacion": estado, **urls}, 202, cabeceras)
+
+def _registrar(trabajo_id: str, funcion: str, req: func.HttpRequest, cuerpo: bytes, cola):
+    """
+    Guarda el estado "registrando", la petición y el cuerpo; sólo si todo
+    llegó a blob pasa a "pendiente" y encola el id. Lanza IOError si no.
+    """
+    estado = {"trabajo_id": trabajo_id, "funcion": funcion, "estado": "registrando",
+              "creado": _ahora().isoformat(), "intentos": 0}
+    params = {k: v for k, v in req.params.items() if k != "async"}
+    cabeceras = {k: v for k, v in req.headers.items() if k.lower() not in _CABECERAS_EXCLUIDAS}
+    peticion = {"method": req.method, "url": req.url, "params": params,
+                "route_params": dict(req.route_params or {}), "headers": cabeceras}
+    guardado = (_guardar_estado(estado)
+                and subir_bytes(cuerpo, CONTENEDOR, _ruta(trabajo_id, "cuerpo"), "application/octet-stream")
+                and subir_json(peticion, CONTENEDOR, _ruta(trabajo_id, "peticion.json")))
+    if guardado:
+        estado["estado"] = "pendiente"
+        guardado = _guardar_estado(estado)
+    if not guardado:
+        # Un reintento con la misma Idempotency-Key vuelve a registrarlo
+        estado["error_registro"] = "No se pudo guardar la petición en blob"
+        _guardar_estado(estado)
+        raise IOError(f"Trabajo {trabajo_id}: no se pudo guardar la petición en blob")
+    cola.set(json.dumps({"trabajo_id": trabajo_id, "funcion": funcion}))
+    logging.info(f"Trabajo {trabajo_id} ({funcion}) encolado")
+
+def _registro_caducado(previo: dict, estado: dict) -> bool:
+    """El registro de la petición original falló o lleva demasiado sin terminar."""
+    if estado is not None and estado.get("error_registro"):
+        return True
+    # Desde la última escritura del estado (un registro rehecho cuenta de nuevo)
+    desde = (estado or previo).get("actualizado") or previo.get("creado", "1970-01-01T00:00:00+00:00")
+    return _ahora() - datetime.fromisoformat(desde) > timedelta(seconds=REGISTRO_CADUCADO_S)
+
+def aceptar(req: func.HttpRequest, funcion: str, cola) -> func.HttpResponse:
+    """
+    Registra la petición como trabajo de `funcion` y devuelve 202 con su id.
+    `cola` es la salida a COLA_TRABAJOS de la función (func.Out[str]).
+    """
+    cuerpo = req.get_body() or b""
+    clave = (req.headers.get("Idempotency-Key") or "").strip()
+    try:
+        if not clave:
+            trabajo_id = uuid.uuid4().hex
+            _registrar(trabajo_id, funcion, req, cuerpo, cola)
+            return _aceptado(trabajo_id, "pendiente")
+
+        huella = _huella(req, cuerpo)
+        ruta_clave = "/".join([PREFIJO, "idempotencia", funcion,
+                               hashlib.sha256(clave.encode("utf-8")).hexdigest() + ".json"])
+        trabajo_id = uuid.uuid4().hex
+        registro = {"trabajo_id": trabajo_id, "huella": huella, "creado": _ahora().isoformat()}
+        datos = json.dumps(registro).encode("utf-8")
+
+        if not crear_si_no_existe(datos, CONTENEDOR, ruta_clave, "application/json"):
+            previo = _leer_json(ruta_clave) or {}
+            creado = datetime.fromisoformat(previo.get("creado", "1970-01-01T00:00:00+00:00"))
+            if _ahora() - creado < timedelta(hours=IDEMPOTENCIA_TTL_H):
+                if previo.get("huella") != huella:
+                    return func.HttpResponse(
+                        "La Idempotency-Key ya se usó con una petición distinta", status_code=422)
+                estado = leer_estado(previo["trabajo_id"])
+                registrando = estado is None or estado["estado"] == "registrando"
+                if not registrando or not _registro_caducado(previo, estado):
+                    # Incluido el caso en que la petición original aún sube el cuerpo
+                    situacion = estado["estado"] if estado is not None else "registrando"
+                    return _aceptado(previo["trabajo_id"], situacion, repetido=True)
+                # La petición original falló o se cortó antes de encolar el trabajo: se completa aquí
+                trabajo_id = previo["trabajo_id"]
+            else:
+                # Clave caducada: se reutiliza para un trabajo nuevo
+                subir_bytes(datos, CONTENEDOR, ruta_clave, "application/json")
+
+        _registrar(trabajo_id, funcion, req, cuerpo, cola)
+        return _aceptado(trabajo_id, "pendiente")
+    except Exception as e:
+        logging.exception("Error registrando el trabajo asíncrono")
+        return func.HttpResponse(f"Error interno: {str(e)}", status_code=500)
+
+def _reconstruir_peticion(trabajo_id: str) -> func.HttpRequest:
+    peticion = _leer_json(_ruta(trabajo_id, "peticion.json"))
+    cuerpo = descargar_bytes(CONTENEDOR, _ruta(trabajo_id, "cuerpo"))
+    if peticion is None or cuerpo is None:
+        raise FileNotFoundError(f"Trabajo {trabajo_id}: falta la petición en blob")
+    return func.HttpRequest(peticion["method"], peticion["url"], headers=peticion["headers"],
+                            params=peticion["params"], route_params=peticion["route_params"], body=cuerpo)
+
+def procesar_trabajo(mensaje: dict, manejadores: dict, intento: int = 1):
+    """
+    Ejecuta el trabajo del mensaje con manejadores[funcion] (req -> HttpResponse)
+    y guarda resultado y estado. Las excepciones y respuestas 5xx se reintentan
+    vía la cola hasta MAX_REINTENTOS; después el trabajo queda en "error".
+    """
+    trabajo_id, funcion = mensaje["trabajo_id"], mensaje["funcion"]
+    estado = leer_estado(trabajo_id)
+    if estado is None:
+        logging.error(f"Trabajo {trabajo_id}: no existe su estado, se descarta el mensaje")
+        return
+    if estado["estado"] in FINALES:
+        logging.info(f"Trabajo {trabajo_id}: ya estaba {estado['estado']} (mensaje repetido)")
+        return
+
+    estado.update({"estado": "en_curso", "intentos": intento, "iniciado": _ahora().isoformat()})
+    _guardar_estado(estado)
+
+    try:
+        manejador = manejadores[funcion]
+        respuesta = manejador(_reconstruir_peticion(trabajo_id))
+        if respuesta.status_code >= 500 and intento < MAX_REINTENTOS:
+            raise RuntimeError(f"{funcion} respondió {respuesta.status_code}")
+    except Exception as e:
+        if intento < MAX_REINTENTOS:
+            estado.update({"estado": "pendiente", "ultimo_error": str(e)})
+            _guardar_estado(estado)
+            raise  # La cola reintenta
+        logging.exception(f"Trabajo {trabajo_id} falló definitivamente")
+        estado.update({"estado": "error", "error": str(e), "terminado": _ahora().isoformat()})
+        _guardar_estado(estado)
+        return
+
+    subir_bytes(respuesta.get_body(), CONTENEDOR, _ruta(trabajo_id, "resultado"), respuesta.mimetype)
+    estado.update({
+        "estado": "completado" if respuesta.status_code < 400 else "error",
+        "status_code": respuesta.status_code,
+        "mimetype": respuesta.mimetype,
+        "cabeceras": {k: respuesta.headers[k] for k in _CABECERAS_RESULTADO if k in respuesta.headers},
+        "terminado": _ahora().isoformat(),
+    })
+    estado.pop("ultimo_error", None)
+    _guardar_estado(estado)
+    logging.info(f"Trabajo {trabajo_id} ({funcion}): {estado['estado']} ({respuesta.status_code})")
+
+def respuesta_estado(trabajo_id: str) -> func.HttpResponse:
+    """GET trabajos/{id}: estado del trabajo."""
+    estado = leer_estado(trabajo_id)
+    if estado is None:
+        return func.HttpResponse(f"Trabajo no encontrado: {trabajo_id}", status_code=404)
+    estado = {**estado, "resultado": f"/api/trabajos/{trabajo_id}/resultado"}
+    cabeceras = None if estado["estado"] in FINALES else {"Retry-After": RETRY_AFTER_S}
+    return _respuesta_json(estado, 200, cabeceras)
+
+def respuesta_resultado(trabajo_id: str) -> func.HttpResponse:
+    """
+    GET trabajos/{id}/resultado: la respuesta que habría dado la función en
+    modo síncrono, o 202 con el estado mientras no haya terminado.
+    """
+    estado = leer_estado(trabajo_id)
+    if estado is None:
+        return func.HttpResponse(f"Trabajo no encontrado: {trabajo_id}", status_code=404)
+    if estado["estado"] not in FINALES:
+        return _respuesta_json(estado, 202, {"Retry-After": RETRY_AFTER_S,
+                                             "Location": f"/api/trabajos/{trabajo_id}"})
+    cuerpo = descargar_bytes(CONTENEDOR, _ruta(trabajo_id, "resultado"))
+    if cuerpo is None:
+        # Error definitivo sin respuesta de la función (excepción en el worker)
+        return _respuesta_json(estado, 500)
+    return func.HttpResponse(bytes(cuerpo), status_code=estado.get("status_code", 200),
+                             mimetype=estado.get("mimetype"), headers=estado.get("cabeceras"))
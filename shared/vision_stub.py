@@ -0,0 +1,132 @@
+"""
+Stub local de la API Read de Azure Vision (v3.2) para pruebas sin red.
+
+Uso:
+    python -m shared.vision_stub --puerto 7072 --texto "SUGERENCIA DE PRESENTACIÓN"
+    VISION_ENDPOINT=http://localhost:7072  VISION_KEY=local
+
+Cada operación responde 'running' en la primera consulta para ejercitar el
+polling. El texto devuelto es fijo o, con --mapa, depende del hash SHA-256
+de la imagen ({hash: texto}). Para las pruebas de errores, `limitar`
+responde 429 (con Retry-After) a las primeras peticiones y `pendiente`
+deja las operaciones siempre en 'running'.
+"""
+import json
+import uuid
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RUTA_ANALIZAR = "/vision/v3.2/read/analyze"
+RUTA_RESULTADOS = "/vision/v3.2/read/analyzeResults/"
+
+class _Handler(BaseHTTPRequestHandler):
+    servidor_stub = None
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _limitada(self):
+        """Responde 429 mientras queden peticiones por limitar."""
+        stub = self.servidor_stub
+        with stub.lock:
+            if stub.limitadas >= stub.limitar:
+                return False
+            stub.limitadas += 1
+        self._json(429, {"error": {"code": "429", "message": "Rate limit is exceeded."}},
+                   {"Retry-After": stub.retry_after})
+        return True
+
+    def do_POST(self):
+        stub = self.servidor_stub
+        if not self.path.startswith(RUTA_ANALIZAR):
+            return self._json(404, {"error": {"code": "NotFound"}})
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self._limitada():
+            return
+        op_id = uuid.uuid4().hex
+        texto = stub.mapa.get(hashlib.sha256(data).hexdigest(), stub.texto)
+        with stub.lock:
+            stub.operaciones[op_id] = {"texto": texto, "consultas": 0}
+            stub.peticiones += 1
+        base = f"http://{self.headers.get('Host')}"
+        self.send_response(202)
+        self.send_header("Operation-Location", f"{base}{RUTA_RESULTADOS}{op_id}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        stub = self.servidor_stub
+        if not self.path.startswith(RUTA_RESULTADOS):
+            return self._json(404, {"error": {"code": "NotFound"}})
+        op_id = self.path[len(RUTA_RESULTADOS):].split("?")[0]
+        with stub.lock:
+            op = stub.operaciones.get(op_id)
+            if op is None:
+                return self._json(404, {"error": {"code": "NotFound"}})
+            op["consultas"] += 1
+            consultas = op["consultas"]
+        if consultas == 1 or stub.pendiente:
+            return self._json(200, {"status": "running"})
+        lineas = [{"boundingBox": [0, 0, 1, 0, 1, 1, 0, 1], "text": t, "words": []}
+                  for t in op["texto"].splitlines() if t]
+        return self._json(200, {
+            "status": "succeeded",
+            "analyzeResult": {
+                "version": "3.2.0",
+                "readResults": [{"page": 1, "angle": 0, "width": 1, "height": 1, "unit": "pixel", "lines": lineas}],
+            },
+        })
+
+class VisionStub:
+    """Servidor stub en un hilo. Se usa como context manager en pruebas locales."""
+
+    def __init__(self, puerto: int = 0, texto: str = "", mapa: dict = None,
+                 limitar: int = 0, retry_after: str = "1", pendiente: bool = False):
+        self.texto = texto
+        self.mapa = mapa or {}
+        self.limitar = limitar          # las primeras `limitar` peticiones responden 429
+        self.retry_after = retry_after  # cabecera Retry-After de esos 429
+        self.pendiente = pendiente      # True: las operaciones nunca terminan (timeout)
+        self.limitadas = 0
+        self.operaciones = {}
+        self.peticiones = 0
+        self.lock = threading.Lock()
+        handler = type("Handler", (_Handler,), {"servidor_stub": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", puerto), handler)
+        self._hilo = None
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self):
+        self._hilo = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub local de Azure Vision Read API")
+    parser.add_argument("--puerto", type=int, default=7072)
+    parser.add_argument("--texto", default="")
+    parser.add_argument("--mapa", help="JSON {sha256_imagen: texto}")
+    args = parser.parse_args()
+    mapa = json.load(open(args.mapa, encoding="utf-8")) if args.mapa else None
+    stub = VisionStub(args.puerto, args.texto, mapa)
+    print(f"Vision stub escuchando en {stub.endpoint}")
+    stub._server.serve_forever()
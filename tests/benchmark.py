@@ -0,0 +1,236 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import statistics
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+# ---------------- CONFIGURACIÓN ----------------
+# Benchmark por etapas con PDFs sintéticos y sustitutos locales de Azure:
+#   - Vision: shared/vision_stub.py (Read API v3.2 en 127.0.0.1)
+#   - Blob:   shared/blob_local.py (BLOB_LOCAL_DIR en un directorio temporal)
+#   - Plantilla PPT: servidor HTTP local sobre assets/
+#
+# Uso (desde la raíz del repo):
+#   python tests/benchmark.py                      -> tests/benchmarks/<fecha>.json
+#   python tests/benchmark.py --rapido             -> menos casos y repeticiones
+#   python tests/benchmark.py --comparar base.json -> ratio frente a otra ejecución
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIR_RESULTADOS = os.path.join(RAIZ, "tests", "benchmarks")
+TEXTO_OCR = "SUGERENCIA DE PRESENTACIÓN"
+
+# (páginas, tamaño, dpi de los pictogramas incrustados)
+CASOS_PDF = [
+    (1, "etiqueta", 150),
+    (1, "a4", 300),
+    (4, "a4", 300),
+    (2, "a3", 600),
+]
+CASOS_PDF_RAPIDO = [(1, "etiqueta", 150), (2, "a4", 300)]
+# Troqueles que no caben en memoria a página completa: sólo validar_pdf
+# (teselado automático), fuera del modo rápido
+CASOS_TROQUEL = [(1, "troquel", 150)]
+DPIS_RENDER = (150, 300)
+CLIENTES_WORD = (5, 50, 200, 800)  # _build_doc debe escalar linealmente
+DIAPOSITIVAS_PPT = (12,)
+
+sys.path.insert(0, RAIZ)
+
+class _ServidorAssets:
+    """Sirve assets/ por HTTP para la descarga de la plantilla PPT."""
+
+    def __init__(self):
+        handler = partial(_HandlerSilencioso, directory=os.path.join(RAIZ, "assets"))
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+
+    def url(self, nombre):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/{nombre}"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+class _HandlerSilencioso(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+def medir(fn, repeticiones, calentamiento=1):
+    """Ejecuta fn `calentamiento` veces sin medir y `repeticiones` midiendo (ms)."""
+    for _ in range(calentamiento):
+        fn()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return {
+        "repeticiones": repeticiones,
+        "min_ms": round(min(tiempos), 3),
+        "mediana_ms": round(statistics.median(tiempos), 3),
+        "media_ms": round(statistics.fmean(tiempos), 3),
+        "desv_ms": round(statistics.stdev(tiempos), 3) if len(tiempos) > 1 else 0.0,
+    }
+
+def _entorno():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    import fitz, cv2, numpy
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pymupdf": fitz.VersionBind,
+        "opencv": cv2.__version__,
+        "numpy": numpy.__version__,
+    }
+
+def ejecutar(rapido=False):
+    repeticiones = 3 if rapido else 7
+    casos_pdf = CASOS_PDF_RAPIDO if rapido else CASOS_PDF
+    casos_troquel = [] if rapido else CASOS_TROQUEL
+    clientes_word = CLIENTES_WORD[:2] if rapido else CLIENTES_WORD
+
+    # Los sustitutos locales se configuran antes de importar las funciones
+    from shared.vision_stub import VisionStub
+    dir_blob = tempfile.mkdtemp(prefix="bench_blob_")
+    with VisionStub(texto=TEXTO_OCR) as vision, _ServidorAssets() as assets:
+        os.environ["VISION_ENDPOINT"] = vision.endpoint
+        os.environ["VISION_KEY"] = "benchmark"
+        os.environ["BLOB_LOCAL_DIR"] = dir_blob
+        os.environ["PPT_TEMPLATE_BASE_URL"] = assets.url("")
+        try:
+            resultados = _ejecutar_etapas(repeticiones, casos_pdf, clientes_word, casos_troquel)
+        finally:
+            shutil.rmtree(dir_blob, ignore_errors=True)
+    return {"entorno": _entorno(), "rapido": rapido, "resultados": resultados}
+
+def _ejecutar_etapas(repeticiones, casos_pdf, clientes_word, casos_troquel=()):
+    import azure.functions as func
+    import api_pdf_validator as validador
+    from api_pdf_validator import evidencias
+    from api_pdf_validator.busqueda import MODO_EXHAUSTIVO, MODO_GRUESO_FINO
+    from tests.pdfs_sinteticos import generar_pdf, generar_payload_word
+
+    reglas = validador.leer_reglas()
+    resultados = []
+
+    def anotar(etapa, caso, fn, reps=repeticiones, unidades=None):
+        r = {"etapa": etapa, "caso": caso, **medir(fn, reps)}
+        extra = ""
+        if unidades:
+            # Coste por unidad (párrafos, diapositivas...): constante si escala lineal
+            r["unidades"] = unidades
+            r["ms_por_unidad"] = round(r["mediana_ms"] / unidades, 4)
+            extra = f"  ({r['ms_por_unidad']:.4f} ms/unidad)"
+        print(f"{etapa:<32} {caso:<36} mediana {r['mediana_ms']:>10.2f} ms{extra}")
+        resultados.append(r)
+
+    for paginas, tamano, dpi_img in casos_pdf:
+        pdf = generar_pdf(paginas=paginas, tamano=tamano, dpi_imagenes=dpi_img,
+                          idiomas=("es", "en", "pt", "fr"),
+                          pictogramas=("reciclaje_azul.png", "sin_gluten.png", "punto_verde.png"))
+        caso = f"{paginas}p {tamano} img{dpi_img}dpi"
+
+        anotar("extraer_texto_pdf", caso, lambda: validador.extraer_texto_pdf(pdf))
+        indice = validador.extraer_texto_pdf(pdf)
+        anotar("validar_texto", caso, lambda: validador.validar_texto(indice, reglas["texto"]))
+        anotar("validar_idiomas", caso, lambda: validador.validar_idiomas(indice, reglas["idiomas"]))
+
+        for dpi in DPIS_RENDER:
+            anotar("renderizar_pdf_a_imagenes", f"{caso} render{dpi}dpi",
+                   lambda: validador.renderizar_pdf_a_imagenes(pdf, dpi=dpi))
+        pagina = validador.renderizar_pdf_a_imagenes(pdf, dpi=300, gris=True)[0]
+        for modo in (MODO_EXHAUSTIVO, MODO_GRUESO_FINO):
+            for tmpl in ("reciclaje_azul.png", "punto_verde.png"):
+                anotar("detectar_template_opencv", f"{caso} {modo} {os.path.basename(tmpl)}",
+                       lambda: validador.detectar_template_opencv(pagina.gris, tmpl, modo=modo))
+
+        # Sin el registro de subidas del worker: cada repetición codifica todo
+        def generar_evidencias():
+            evidencias._subidas_confirmadas.clear()
+            return evidencias.generar_evidencias(pdf, "bench", {}, {})
+        anotar("generar_evidencias", caso, generar_evidencias)
+
+        opciones = {"subir_imagenes": True, "usar_cache": False}
+        anotar("validar_pdf", caso, lambda: validador.validar_pdf(pdf, "bench.pdf", opciones),
+               reps=max(1, repeticiones // 2))
+
+    for paginas, tamano, dpi_img in casos_troquel:
+        pdf = generar_pdf(paginas=paginas, tamano=tamano, dpi_imagenes=dpi_img,
+                          pictogramas=("reciclaje_azul.png", "punto_verde.png"))
+        opciones = {"subir_imagenes": False, "usar_cache": False}
+        anotar("validar_pdf teselado", f"{paginas}p {tamano} img{dpi_img}dpi",
+               lambda: validador.validar_pdf(pdf, "bench.pdf", opciones), reps=1)
+
+    from obs.word_generation import _build_doc
+    for n in clientes_word:
+        payload = generar_payload_word(clientes=n, items=5, subitems=3)
+        parrafos = 1 + n * (4 + 3 * 5 * (1 + 3))
+        anotar("_build_doc", f"{n} clientes", lambda: _build_doc(payload),
+               reps=max(1, repeticiones // 2) if n > 100 else repeticiones, unidades=parrafos)
+
+    import api_ppt_generation as ppt
+    cuerpo = json.dumps({"title": "Benchmark", "subtitle": "Q1"}).encode("utf-8")
+    def generar_ppt():
+        resp = ppt.atender(func.HttpRequest("POST", "/api/ppt", body=cuerpo))
+        assert resp.status_code == 200, resp.get_body()[:200]
+    anotar("api_ppt_generation", "plantilla HAVAS", generar_ppt)
+
+    # Modo presentación: sin caché de gráficas para medir el render en paralelo
+    from api_ppt_generation import graficas
+    for n in DIAPOSITIVAS_PPT:
+        slides = [{"title": f"Campaña {i + 1}", "planned": [i + 1, 20, 30], "delivered": [10, i + 1, 25],
+                   "categorias": ["OLV", "Social", "PPC"]} for i in range(n)]
+        cuerpo_deck = json.dumps({"slides": slides}).encode("utf-8")
+        def generar_deck():
+            graficas._cache.clear()
+            resp = ppt.atender(func.HttpRequest("POST", "/api/ppt", body=cuerpo_deck))
+            assert resp.status_code == 200, resp.get_body()[:200]
+        anotar("api_ppt_generation", f"presentación {n} diapositivas", generar_deck, reps=max(1, repeticiones // 2))
+    return resultados
+
+def comparar(actual, base):
+    """Imprime el ratio actual/base de la mediana por (etapa, caso)."""
+    previos = {(r["etapa"], r["caso"]): r for r in base["resultados"]}
+    print(f"\nComparación con {base['entorno'].get('commit')} ({base['entorno'].get('fecha')})")
+    for r in actual["resultados"]:
+        b = previos.get((r["etapa"], r["caso"]))
+        if b and b["mediana_ms"]:
+            ratio = r["mediana_ms"] / b["mediana_ms"]
+            print(f"{r['etapa']:<32} {r['caso']:<36} x{ratio:5.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark por etapas del backend de packaging")
+    parser.add_argument("--rapido", action="store_true", help="menos casos y repeticiones")
+    parser.add_argument("--salida", help="ruta del JSON de resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    args = parser.parse_args()
+
+    informe = ejecutar(rapido=args.rapido)
+    salida = args.salida or os.path.join(DIR_RESULTADOS, f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(informe, json.load(f))
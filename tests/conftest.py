@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# ==========================================
+# FIXTURES COMUNES (pytest)
+# ==========================================
+# Las pruebas usan los sustitutos locales de Azure (shared/blob_local.py,
+# shared/vision_stub.py, shared/cola_local.py): no necesitan red ni cuenta.
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+@pytest.fixture
+def blob_local(tmp_path, monkeypatch):
+    """
+    Blob Storage en un directorio temporal (BLOB_LOCAL_DIR). Se vacía también
+    lo que el worker recuerda del blob anterior: caché de informes en memoria
+    y evidencias ya subidas.
+    """
+    from api_pdf_validator import cache_resultados, evidencias
+    directorio = tmp_path / "blob"
+    monkeypatch.setenv("BLOB_LOCAL_DIR", str(directorio))
+    cache_resultados._memoria.clear()
+    evidencias._subidas_confirmadas.clear()
+    return directorio
+
+@pytest.fixture
+def vision(monkeypatch):
+    """Vision Read API local (shared/vision_stub.py) con el texto de la regla OCR."""
+    from shared import azure_vision
+    from shared.vision_stub import VisionStub
+    azure_vision._cache_ocr.clear()
+    with VisionStub(texto="SUGERENCIA DE PRESENTACIÓN") as stub:
+        monkeypatch.setenv("VISION_ENDPOINT", stub.endpoint)
+        monkeypatch.setenv("VISION_KEY", "pruebas")
+        yield stub
@@ -0,0 +1,141 @@
+import os
+import random
+
+import cv2
+import fitz  # PyMuPDF
+
+# ==========================================
+# PDFs DE ETIQUETA SINTÉTICOS (para benchmarks)
+# ==========================================
+# Genera etiquetas de envase reproducibles (misma semilla -> mismos bytes de
+# contenido) variando número de páginas, tamaño de página y resolución de los
+# pictogramas incrustados. El texto es multilingüe y cubre las reglas de
+# assets/Reglas.json: título de ingredientes en negrita, alérgenos en
+# mayúsculas, peso "g e", marca + email y bloques en varios idiomas.
+
+ASSETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+
+# Ancho x alto en puntos
+TAMANOS = {
+    "etiqueta": (283, 425),          # 100 x 150 mm
+    "a5": tuple(fitz.paper_size("a5")),
+    "a4": tuple(fitz.paper_size("a4")),
+    "a3": tuple(fitz.paper_size("a3")),
+    "troquel": (2835, 1984),         # 1000 x 700 mm (caja desplegada)
+}
+
+PICTOGRAMAS = ("reciclaje_azul.png", "reciclaje_amarillo.png", "composta_marron.png",
+               "sin_gluten.png", "punto_verde.png")
+
+PARRAFOS = {
+    "es": ("Conservar en lugar fresco y seco, protegido de la luz solar directa. "
+           "Una vez abierto, consumir preferentemente en los tres días siguientes "
+           "y mantener siempre refrigerado entre cero y cuatro grados."),
+    "en": ("Store in a cool and dry place away from direct sunlight. "
+           "Once opened, keep refrigerated and consume within three days. "
+           "This product has been packed in a protective atmosphere."),
+    "pt": ("Conservar em local fresco e seco, ao abrigo da luz solar direta. "
+           "Depois de aberto, manter refrigerado e consumir no prazo de três dias. "
+           "Embalado em atmosfera protetora para garantir a qualidade."),
+    "fr": ("À conserver dans un endroit frais et sec, à l'abri de la lumière. "
+           "Après ouverture, conserver au réfrigérateur et consommer dans les trois jours "
+           "qui suivent. Conditionné sous atmosphère protectrice."),
+    "it": ("Conservare in luogo fresco e asciutto, lontano dalla luce diretta del sole. "
+           "Dopo l'apertura conservare in frigorifero e consumare entro tre giorni. "
+           "Prodotto confezionato in atmosfera protettiva."),
+}
+
+ALERGENOS = ("LECHE", "SOJA", "HUEVO", "GLUTEN", "ALMENDRA", "TRIGO", "CACAHUETE", "SÉSAMO")
+
+def _png_pictograma(nombre: str, lado_pt: float, dpi: int) -> bytes:
+    """Pictograma de assets/ reescalado para que ocupe lado_pt puntos a `dpi`."""
+    img = cv2.imread(os.path.join(ASSETS, nombre))
+    lado_px = max(8, int(round(lado_pt / 72.0 * dpi)))
+    escala = lado_px / float(max(img.shape[:2]))
+    interp = cv2.INTER_AREA if escala < 1 else cv2.INTER_CUBIC
+    img = cv2.resize(img, None, fx=escala, fy=escala, interpolation=interp)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+def _png_texto(texto: str, ancho_pt: float, dpi: int) -> bytes:
+    """Texto rasterizado (sin capa de texto): fuerza la ruta de OCR."""
+    with fitz.open() as tmp:
+        pag = tmp.new_page(width=ancho_pt, height=24)
+        pag.insert_textbox(fitz.Rect(2, 4, ancho_pt - 2, 22), texto, fontname="hebo", fontsize=10)
+        return pag.get_pixmap(dpi=dpi).tobytes("png")
+
+def generar_pdf(paginas: int = 1, tamano: str = "a4", dpi_imagenes: int = 300,
+                idiomas=("es", "en", "pt"), pictogramas=("reciclaje_azul.png",),
+                texto_en_imagen: bool = True, semilla: int = 0) -> bytes:
+    """
+    PDF de etiqueta sintético.
+    texto_en_imagen: la "sugerencia de presentación" va rasterizada (OCR)
+    en lugar de como texto nativo.
+    """
+    rnd = random.Random(semilla)
+    ancho, alto = TAMANOS[tamano]
+    margen = ancho * 0.06
+    util = ancho - 2 * margen
+    cuerpo = max(6.0, ancho / 60.0)
+    lado_picto = min(ancho, alto) * 0.12
+
+    iconos = {n: _png_pictograma(n, lado_picto, dpi_imagenes) for n in pictogramas}
+    sugerencia = _png_texto("SUGERENCIA DE PRESENTACIÓN", util * 0.6, dpi_imagenes) if texto_en_imagen else None
+
+    doc = fitz.open()
+    for num in range(paginas):
+        pag = doc.new_page(width=ancho, height=alto)
+        y = margen
+        alto_linea = cuerpo * 1.6
+
+        pag.insert_text((margen, y + cuerpo), "Ingredientes:", fontname="hebo", fontsize=cuerpo * 1.2)
+        y += alto_linea * 1.2
+        alergenos = rnd.sample(ALERGENOS, 3)
+        ingredientes = (f"harina de {alergenos[0]}, azúcar, aceite de girasol, {alergenos[1]} en polvo, "
+                        f"sal, puede contener trazas de {alergenos[2]}. Cacao 32 %.")
+        y = _bloque(pag, margen, y, util, ingredientes, cuerpo)
+
+        y = _bloque(pag, margen, y, util, f"Peso neto: {rnd.choice((125, 250, 500, 750))} g e", cuerpo)
+        y = _bloque(pag, margen, y, util,
+                    "Elaborado para EL CORTE INGLES, S.A. clientes.supermercado@elcorteingles.es", cuerpo)
+
+        for lang in idiomas:
+            y = _bloque(pag, margen, y, util, PARRAFOS[lang], cuerpo)
+
+        if sugerencia is not None:
+            # Misma proporción que la página de _png_texto (ancho x 24 pt)
+            rect = fitz.Rect(margen, y, margen + util * 0.6, y + 24)
+            pag.insert_image(rect, stream=sugerencia)
+            y = rect.y1 + alto_linea
+        else:
+            y = _bloque(pag, margen, y, util, "Sugerencia de presentación", cuerpo)
+
+        # Pictogramas en la franja inferior
+        x = margen
+        for nombre, png in iconos.items():
+            pag.insert_image(fitz.Rect(x, alto - margen - lado_picto, x + lado_picto, alto - margen), stream=png)
+            x += lado_picto * 1.25
+        pag.insert_text((ancho - margen - cuerpo * 4, alto - margen / 2), f"{num + 1}/{paginas}", fontsize=cuerpo * 0.8)
+
+    datos = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return datos
+
+def _bloque(pag, x, y, ancho, texto, cuerpo):
+    """Inserta un párrafo como bloque de texto propio; devuelve la nueva y."""
+    lineas = max(1, int(len(texto) * cuerpo * 0.5 / ancho) + 1)
+    alto = lineas * cuerpo * 1.4 + cuerpo
+    pag.insert_textbox(fitz.Rect(x, y, x + ancho, y + alto), texto, fontname="helv", fontsize=cuerpo)
+    return y + alto + cuerpo * 0.5
+
+def generar_payload_word(clientes: int = 10, items: int = 5, subitems: int = 3, semilla: int = 0) -> dict:
+    """Payload de obs/word_generation con `clientes` bloques de oportunidades/riesgos/tareas."""
+    rnd = random.Random(semilla)
+    def entradas(prefijo):
+        return [{"item": f"{prefijo} {i + 1}: {PARRAFOS[rnd.choice(list(PARRAFOS))][:80]}",
+                 "subitems": [f"Detalle {j + 1} de {prefijo.lower()} {i + 1}" for j in range(subitems)]}
+                for i in range(items)]
+    return {
+        "titulo": "Reporte Comercial Benchmark",
+        "clientes": [{"cliente": f"Cliente {c + 1}", "oportunidades": entradas("Oportunidad"),
+                      "riesgos": entradas("Riesgo"), "tareas": entradas("Tarea")} for c in range(clientes)],
+    }
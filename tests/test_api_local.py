@@ -2,6 +2,7 @@ import requests
 import base64
 import json
 import os
+import time
 
 # ---------------- CONFIGURACIÓN ----------------
 PDF_PATH = r"C:\Users\jgiraldo\OneDrive - HIBERUS SISTEMAS INFORMATICOS S.L\Documentos\ECI\ECI - PA\label samples\Cajas Piedra Coloma Garcia 2024.pdf"
@@ -13,6 +14,18 @@ URL = "http://localhost:7071/api/validatepdf"
 
 # (Asegúrate de que la URL coincida con el nombre de tu carpeta de función)
 
+# Modo de envío del PDF:
+#   "json"      -> JSON con el PDF en base64 (compatibilidad, ~3.7x el PDF en memoria)
+#   "pdf"       -> cuerpo application/pdf crudo (~1x)
+#   "multipart" -> multipart/form-data con la parte 'file' (~1x)
+#   "blob"      -> referencia a un PDF ya subido a Blob Storage (~1x)
+MODO = "json"
+BLOB_REF = "validaciones/entrada/ejemplo.pdf"  # Sólo para MODO = "blob"
+
+# Modo asíncrono: la API responde 202 con un id de trabajo y el informe se
+# consulta en /api/trabajos/<id>/resultado cuando el worker termina
+ASINCRONO = False
+
 # B) ENTORNO DESARROLLO / NUBE
 # URL = "https://hiberus-juana-funcapp-dev-dkg6ahhzhmguhjhz.spaincentral-01.azurewebsites.net/api/validatepdf?code=TU_CODIGO_AQUI"
 
@@ -25,23 +38,52 @@ def probar_api():
     filename = os.path.basename(PDF_PATH)
     print(f"--- 🚀 Probando API con: {filename} ---")
     print(f"📡 Destino: {URL}")
+    url = URL + ("&" if "?" in URL else "?") + "async=1" if ASINCRONO else URL
 
     try:
-        # 1. Convertir a Base64
-        with open(PDF_PATH, "rb") as f:
-            pdf_base64 = base64.b64encode(f.read()).decode('utf-8')
+        print(f"📦 Modo: {MODO}")
+        print("⏳ Enviando... (Espere, procesando OCR e imágenes)")
 
-        # 2. Payload
-        payload = {
-            "filename": filename,
-            "file": pdf_base64
-        }
+        if MODO == "blob":
+            # 1. Referencia a Blob: la función lee el PDF por bloques
+            payload = {"blob": BLOB_REF, "filename": filename}
+            response = requests.post(url, json=payload, timeout=300)
 
-        # 3. Enviar
-        print("⏳ Enviando... (Espere, procesando OCR e imágenes)")
-        response = requests.post(URL, json=payload, timeout=300) # Timeout generoso para OCR
+        elif MODO == "pdf":
+            # 1. Cuerpo PDF crudo, opciones en la query string
+            with open(PDF_PATH, "rb") as f:
+                response = requests.post(url, data=f, params={"filename": filename},
+                                         headers={"Content-Type": "application/pdf"}, timeout=300)
+
+        elif MODO == "multipart":
+            # 1. Formulario multipart con la parte 'file'
+            with open(PDF_PATH, "rb") as f:
+                response = requests.post(url, files={"file": (filename, f, "application/pdf")}, timeout=300)
+
+        else:
+            # 1. Convertir a Base64
+            with open(PDF_PATH, "rb") as f:
+                pdf_base64 = base64.b64encode(f.read()).decode('utf-8')
+
+            # 2. Payload
+            payload = {
+                "filename": filename,
+                "file": pdf_base64
+            }
+
+            # 3. Enviar
+            response = requests.post(url, json=payload, timeout=300) # Timeout generoso para OCR
+
+        # 4. Modo asíncrono: esperar al trabajo
+        if response.status_code == 202:
+            trabajo = response.json()
+            print(f"🕒 Trabajo {trabajo['trabajo_id']} en cola")
+            base = URL.split("/api/")[0]
+            while response.status_code == 202:
+                time.sleep(int(response.headers.get("Retry-After", "5")))
+                response = requests.get(base + trabajo["resultado"], timeout=30)
 
-        # 4. Resultados
+        # 5. Resultados
         print(f"\nStatus Code: {response.status_code}")
         
         if response.status_code == 200:
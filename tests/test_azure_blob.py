@@ -0,0 +1,38 @@
+import json
+
+from shared import azure_blob
+
+CONTAINER = "pruebas"
+
+def test_ida_y_vuelta_con_el_backend_local(blob_local):
+    assert isinstance(azure_blob.get_blob_service(), azure_blob.ServicioBlobLocal)
+
+    assert azure_blob.subir_bytes(b"%PDF-1.7", CONTAINER, "entrada/a.pdf", "application/pdf")
+    assert azure_blob.descargar_bytes(CONTAINER, "entrada/a.pdf") == b"%PDF-1.7"
+    assert azure_blob.descargar_en_bloques(CONTAINER, "entrada/a.pdf") == bytearray(b"%PDF-1.7")
+
+    azure_blob.subir_json({"estado": "ok", "ñ": 1}, CONTAINER, "informes/a.json")
+    assert json.loads(azure_blob.descargar_bytes(CONTAINER, "informes/a.json")) == {"estado": "ok", "ñ": 1}
+
+    # Lo escrito está en disco bajo BLOB_LOCAL_DIR/<container>/<ruta>
+    assert (blob_local / CONTAINER / "entrada" / "a.pdf").read_bytes() == b"%PDF-1.7"
+    assert azure_blob.descargar_bytes(CONTAINER, "no/existe") is None
+    assert azure_blob.descargar_en_bloques(CONTAINER, "no/existe") is None
+
+def test_subidas_en_paralelo_y_en_segundo_plano(blob_local):
+    subidas = [(f"{i}".encode(), CONTAINER, f"lote/{i}.txt", "text/plain") for i in range(20)]
+    assert azure_blob.subir_muchos(subidas, max_concurrencia=4) == [True] * 20
+
+    futuros = [azure_blob.encolar_subida(f"fondo {i}".encode(), CONTAINER, f"fondo/{i}.txt") for i in range(5)]
+    assert azure_blob.esperar_subidas(timeout=10) == 0
+    assert all(f.result() for f in futuros)
+
+    assert azure_blob.listar_blobs(CONTAINER, "lote/") == sorted(f"lote/{i}.txt" for i in range(20))
+    assert azure_blob.descargar_bytes(CONTAINER, "fondo/3.txt") == b"fondo 3"
+    etags = azure_blob.listar_etags(CONTAINER, "fondo/")
+    assert sorted(etags) == [f"fondo/{i}.txt" for i in range(5)] and all(etags.values())
+
+def test_crear_si_no_existe(blob_local):
+    assert azure_blob.crear_si_no_existe(b"1", CONTAINER, "idempotencia/clave")
+    assert not azure_blob.crear_si_no_existe(b"2", CONTAINER, "idempotencia/clave")
+    assert azure_blob.descargar_bytes(CONTAINER, "idempotencia/clave") == b"1"
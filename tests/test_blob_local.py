@@ -0,0 +1,45 @@
+import pytest
+
+from shared.blob_local import ServicioBlobLocal, BlobNoEncontrado
+
+def test_subida_y_descarga(tmp_path):
+    servicio = ServicioBlobLocal(str(tmp_path))
+    contenedor = servicio.get_container_client("pruebas")
+    assert not contenedor.exists()
+    contenedor.create_container()
+
+    blob = servicio.get_blob_client("pruebas", "a/b/informe.json")
+    assert not blob.exists()
+    blob.upload_blob(b"{}")
+    assert blob.exists()
+    assert blob.download_blob().readall() == b"{}"
+    assert b"".join(blob.download_blob().chunks()) == b"{}"
+    assert blob.get_blob_properties().size == 2
+
+def test_subida_sin_sobrescribir_falla_si_existe(tmp_path):
+    blob = ServicioBlobLocal(str(tmp_path)).get_blob_client("pruebas", "x.png")
+    blob.upload_blob(b"1")
+    with pytest.raises(FileExistsError):
+        blob.upload_blob(b"2")
+    blob.upload_blob("3", overwrite=True)
+    assert blob.download_blob().readall() == b"3"
+
+def test_descarga_en_bloques(tmp_path, monkeypatch):
+    from shared.blob_local import _Descarga
+    monkeypatch.setattr(_Descarga, "TAM_CHUNK", 4)
+    blob = ServicioBlobLocal(str(tmp_path)).get_blob_client("pruebas", "pdf")
+    blob.upload_blob(b"0123456789")
+    assert list(blob.download_blob().chunks()) == [b"0123", b"4567", b"89"]
+
+def test_listado_por_prefijo_y_borrado(tmp_path):
+    servicio = ServicioBlobLocal(str(tmp_path))
+    for nombre in ("validaciones/informes/a.json", "validaciones/cache/b.json", "otros/c.json"):
+        servicio.get_blob_client("pruebas", nombre).upload_blob(b"x")
+    contenedor = servicio.get_container_client("pruebas")
+    assert [b.name for b in contenedor.list_blobs(name_starts_with="validaciones/")] == [
+        "validaciones/cache/b.json", "validaciones/informes/a.json"]
+
+    blob = servicio.get_blob_client("pruebas", "otros/c.json")
+    blob.delete_blob()
+    with pytest.raises(BlobNoEncontrado):
+        blob.download_blob()
@@ -0,0 +1,25 @@
+import numpy as np
+
+from api_pdf_validator.busqueda import buscar_exhaustivo, buscar_grueso_fino
+
+def _pagina_y_plantilla(semilla=0):
+    rnd = np.random.default_rng(semilla)
+    pagina = (rnd.random((600, 800)) * 255).astype(np.uint8)
+    plantilla = (rnd.random((80, 80)) * 255).astype(np.uint8)
+    return pagina, plantilla
+
+def test_sin_candidatas_devuelve_similitud_a_resolucion_completa():
+    # Ruido contra ruido: nada supera el umbral relajado en la pasada gruesa
+    pagina, plantilla = _pagina_y_plantilla()
+    val, (x, y) = buscar_grueso_fino(pagina, plantilla, umbral=0.9)
+    assert -1.0 < val < 0.5
+    # La similitud es la de la plantilla en (x, y) a resolución completa
+    ref, _ = buscar_exhaustivo(pagina[y:y + 80, x:x + 80], plantilla)
+    assert abs(val - ref) < 1e-5
+    assert val <= buscar_exhaustivo(pagina, plantilla)[0] + 1e-5
+
+def test_candidata_en_el_borde_se_refina():
+    pagina, plantilla = _pagina_y_plantilla(1)
+    pagina[600 - 80:, 800 - 80:] = plantilla  # esquina inferior derecha
+    val, loc = buscar_grueso_fino(pagina, plantilla, umbral=0.8)
+    assert val > 0.99 and loc == (720, 520)
@@ -0,0 +1,38 @@
+import json
+
+from api_pdf_validator import validar_pdf, ruta_informe, BLOB_CONTAINER, cache_resultados
+from tests.pdfs_sinteticos import generar_pdf
+
+OPCIONES = {"subir_imagenes": True, "usar_cache": True}
+
+def _informe_en_blob(blob_local, filename):
+    ruta = blob_local / BLOB_CONTAINER / ruta_informe(filename)
+    return json.loads(ruta.read_text(encoding="utf-8")) if ruta.exists() else None
+
+def test_acierto_escribe_el_informe_con_el_nombre_nuevo(blob_local, vision):
+    pdf = generar_pdf(paginas=1, tamano="a4")
+    primero = validar_pdf(pdf, "original.pdf", OPCIONES)
+    segundo = validar_pdf(pdf, "copia.pdf", OPCIONES)
+    assert primero["cache"] is False and segundo["cache"] is True
+
+    informe = _informe_en_blob(blob_local, "copia.pdf")
+    assert informe is not None
+    assert informe["archivo"] == "copia.pdf"
+    assert informe["resultados"] == primero["resultados"]
+    # Las evidencias del manifiesto cacheado existen en blob
+    for pagina in informe["evidencias"]["paginas"]:
+        assert (blob_local / BLOB_CONTAINER / pagina["imagen"]).exists()
+
+def test_opciones_de_evidencias_forman_parte_de_la_clave(blob_local, vision):
+    pdf = generar_pdf(paginas=1, tamano="a4")
+    validar_pdf(pdf, "a.pdf", OPCIONES)
+    assert validar_pdf(pdf, "a.pdf", {**OPCIONES, "evidencias_formato": "jpeg"})["cache"] is False
+    sin_imagenes = validar_pdf(pdf, "a.pdf", {**OPCIONES, "subir_imagenes": False})
+    assert sin_imagenes["cache"] is False and "evidencias" not in sin_imagenes
+    assert validar_pdf(pdf, "a.pdf", {**OPCIONES, "evidencias_formato": "jpeg"})["cache"] is True
+
+def test_version_cambia_con_el_contenido_de_las_plantillas():
+    reglas = {"visual": [{"nombre": "Logo", "tipo": "template_match", "templates": ["a.png"]}]}
+    v1 = cache_resultados.version_reglas(reglas, {"a.png": "1" * 64})
+    v2 = cache_resultados.version_reglas(reglas, {"a.png": "2" * 64})
+    assert v1 != v2
@@ -0,0 +1,81 @@
+import os
+import json
+import base64
+import tracemalloc
+
+import azure.functions as func
+import pytest
+
+from api_pdf_validator.entrada import leer_entrada, EntradaInvalida, BLOQUE_BASE64
+from shared.azure_blob import subir_bytes
+from shared.blob_local import _Descarga
+
+N = 16 * 1024 * 1024  # el contenido no se parsea como PDF: bastan bytes aleatorios
+CONTAINER = "pruebas"
+
+@pytest.fixture(scope="module")
+def pdf():
+    return os.urandom(N)
+
+def _pico(req):
+    """(pico de memoria asignada por leer_entrada en múltiplos de N, resultado)."""
+    tracemalloc.start()
+    try:
+        resultado = leer_entrada(req, CONTAINER)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return pico / N, resultado
+
+def _json(body):
+    return func.HttpRequest("POST", "/api/api_pdf_validator", body=json.dumps(body).encode("utf-8"),
+                            headers={"Content-Type": "application/json"})
+
+def _multipart(pdf, campos):
+    partes = [b'--xx\r\nContent-Disposition: form-data; name="file"; filename="a.pdf"\r\n\r\n' + pdf]
+    partes += [f'--xx\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}'.encode() for k, v in campos.items()]
+    body = b"\r\n".join(partes) + b"\r\n--xx--\r\n"
+    return func.HttpRequest("POST", "/api/api_pdf_validator", body=body,
+                            headers={"Content-Type": "multipart/form-data; boundary=xx"})
+
+def test_pdf_crudo_sin_copia(pdf):
+    req = func.HttpRequest("POST", "/api/api_pdf_validator", body=pdf, headers={"Content-Type": "application/pdf"},
+                           params={"usar_cache": "false"})
+    pico, (pdf_bytes, _, opciones) = _pico(req)
+    assert pdf_bytes is pdf
+    assert pico < 0.01
+    assert opciones["usar_cache"] is False
+
+def test_multipart_sin_copia(pdf):
+    pico, (pdf_bytes, filename, opciones) = _pico(_multipart(pdf, {"usar_cache": "false"}))
+    assert isinstance(pdf_bytes, memoryview) and pdf_bytes == pdf
+    assert pico < 0.01
+    assert filename == "a.pdf" and opciones["usar_cache"] is False
+
+def test_referencia_blob_un_solo_buffer(pdf, blob_local):
+    subir_bytes(pdf, CONTAINER, "entrada/a.pdf")
+    pico, (pdf_bytes, filename, opciones) = _pico(_json({"blob": "entrada/a.pdf", "usar_cache": "false"}))
+    assert pdf_bytes == pdf and filename == "a.pdf"
+    # bytearray del tamaño final + el bloque en curso y el anterior
+    assert pico < 1 + (2 * _Descarga.TAM_CHUNK) / N + 0.05
+    assert opciones["usar_cache"] is False
+
+def test_base64_decodifica_sin_duplicar(pdf):
+    req = _json({"file": base64.b64encode(pdf).decode("ascii"), "filename": "a.pdf",
+                 "usar_cache": "false", "subir_imagenes": "0", "paralelo": "true"})
+    pico, (pdf_bytes, filename, opciones) = _pico(req)
+    assert pdf_bytes == pdf and filename == "a.pdf"
+    # Texto del cuerpo + str base64 mientras se parsea el JSON; la decodificación
+    # por bloques no añade la copia ASCII de b64decode (str + copia + bytes = 3.67 N)
+    assert pico < 2 * 4 / 3 + 0.1
+    assert opciones == {"usar_cache": False, "subir_imagenes": False, "paralelo": True}
+
+def test_base64_con_saltos_de_linea():
+    datos = os.urandom(3 * BLOQUE_BASE64 // 4 + 1000)
+    texto = base64.encodebytes(datos).decode("ascii")  # líneas de 76 caracteres
+    pdf_bytes, _, _ = leer_entrada(_json({"file": texto}), CONTAINER)
+    assert bytes(pdf_bytes) == datos
+
+def test_base64_invalido_es_400():
+    with pytest.raises(EntradaInvalida):
+        leer_entrada(_json({"file": "no es base64!"}), CONTAINER)
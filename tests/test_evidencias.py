@@ -0,0 +1,43 @@
+import json
+
+from shared import azure_blob
+from api_pdf_validator import validar_pdf, ruta_informe, BLOB_CONTAINER, cache_resultados, evidencias
+from tests.pdfs_sinteticos import generar_pdf
+
+OPCIONES = {"subir_imagenes": True, "usar_cache": True, "subidas_en_segundo_plano": True}
+
+def _informe_en_blob(blob_local, filename):
+    return json.loads((blob_local / BLOB_CONTAINER / ruta_informe(filename)).read_text(encoding="utf-8"))
+
+def test_en_segundo_plano_el_informe_se_publica_tras_las_evidencias(blob_local, vision):
+    respuesta = validar_pdf(generar_pdf(paginas=1, tamano="a4"), "fondo.pdf", OPCIONES)
+    assert respuesta["evidencias"]["subidas_pendientes"] is True
+    assert azure_blob.esperar_subidas(timeout=30) == 0
+
+    informe = _informe_en_blob(blob_local, "fondo.pdf")
+    assert "subidas_pendientes" not in informe["evidencias"]
+    for pagina in informe["evidencias"]["paginas"]:
+        assert "subida" not in pagina
+        assert (blob_local / BLOB_CONTAINER / pagina["imagen"]).exists()
+    assert len(cache_resultados._memoria) == 1
+
+def test_subidas_fallidas_se_marcan_y_no_se_cachean(blob_local, vision, monkeypatch):
+    subir = azure_blob.subir_bytes
+    monkeypatch.setattr(azure_blob, "subir_bytes", lambda data, container, ruta, *a:
+                        False if ruta.endswith("_mini.webp") else subir(data, container, ruta, *a))
+    validar_pdf(generar_pdf(paginas=1, tamano="a4"), "fallo.pdf", OPCIONES)
+    assert azure_blob.esperar_subidas(timeout=30) == 0
+
+    informe = _informe_en_blob(blob_local, "fallo.pdf")
+    assert [p["subida"] for p in informe["evidencias"]["paginas"]] == [False]
+    assert len(cache_resultados._memoria) == 0
+
+def test_recortes_como_texto_del_json():
+    assert evidencias.Configuracion({"evidencias_recortes": "false"}).recortes is False
+    assert evidencias.Configuracion({"evidencias_recortes": "1"}).recortes is True
+
+def test_rutas_antiguas_opcionales(blob_local, vision, monkeypatch):
+    monkeypatch.setattr(evidencias, "RUTAS_ANTIGUAS", True)
+    validar_pdf(generar_pdf(paginas=2, tamano="a4"), "Etiqueta 1.pdf", {**OPCIONES, "subidas_en_segundo_plano": False})
+    for num in (1, 2):
+        assert (blob_local / BLOB_CONTAINER / f"validaciones/imagenes/Etiqueta_1/pag_{num}.png").exists()
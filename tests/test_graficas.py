@@ -0,0 +1,26 @@
+from api_ppt_generation import graficas
+
+def _series(n, base=0):
+    return [([base + i, 2], [1, base + i], ["a", "b"]) for i in range(n)]
+
+def test_el_pool_se_reutiliza_entre_presentaciones(monkeypatch):
+    monkeypatch.setattr(graficas, "procesos_disponibles", lambda: 2)
+    graficas.cerrar_pool()
+    graficas._cache.clear()
+    try:
+        primeras = graficas.renderizar_graficas(_series(3))
+        pool = graficas._pool
+        assert pool is not None
+        graficas.renderizar_graficas(_series(3, base=10))
+        assert graficas._pool is pool
+        graficas._cache.clear()
+        assert graficas.renderizar_graficas(_series(3)) == primeras
+    finally:
+        graficas.cerrar_pool()
+
+def test_con_un_proceso_se_dibuja_en_serie(monkeypatch):
+    monkeypatch.setattr(graficas, "procesos_disponibles", lambda: 1)
+    graficas.cerrar_pool()
+    graficas._cache.clear()
+    assert len(graficas.renderizar_graficas(_series(4))) == 4
+    assert graficas._pool is None
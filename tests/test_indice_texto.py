@@ -0,0 +1,20 @@
+from api_pdf_validator.indice_texto import IndiceTexto
+
+def _indice(*textos):
+    indice = IndiceTexto()
+    for i, texto in enumerate(textos):
+        indice.agregar(texto, bold=i == 1, pagina=1, bloque=i)
+    return indice
+
+def test_primer_span_que_empieza_por_el_primer_token():
+    indice = _indice("Contiene ingredientes varios", "Ingredientes: harina, LECHE", "ingredientes")
+    span = indice.primer_span_que_empieza("ingredientes")
+    assert span["text"] == "Ingredientes: harina, LECHE" and span["bold"]
+    assert indice.primer_span_que_empieza("azúcar") is None
+
+def test_buscar_lista_encuentra_subcadenas():
+    indice = _indice("Harina de TRIGO", "LECHE y SOJA", "trazas de frutos de cáscara")
+    hallados = indice.buscar_lista(["LECHE", "FRUTOS DE CÁSCARA", "HUEVO", "TRIGO"])
+    assert [s["text"] for s in hallados["LECHE"]] == ["LECHE y SOJA"]
+    assert [s["text"] for s in hallados["FRUTOS DE CÁSCARA"]] == ["trazas de frutos de cáscara"]
+    assert hallados["HUEVO"] == [] and len(hallados["TRIGO"]) == 1
@@ -0,0 +1,37 @@
+import json
+import time
+import logging
+import threading
+
+from shared.instrumentacion import medir, etapa
+
+def test_etapas_se_emiten_como_trazas(caplog):
+    caplog.set_level(logging.INFO)
+    with medir("pruebas") as medidor:
+        with etapa("reservar"):
+            bloque = bytearray(32 * 1024 * 1024)
+            del bloque
+
+    trazas = [json.loads(r.getMessage()[len("METRICA "):]) for r in caplog.records
+              if r.getMessage().startswith("METRICA ")]
+    assert [t["etapa"] for t in trazas] == ["reservar", "total"]
+    registro = medidor.etapas[0]
+    # Pico del proceso (ru_maxrss) y cuánto lo subió la etapa: nunca negativo
+    assert registro["rss_pico_mb"] > 0 and registro["rss_pico_subida_mb"] >= 0
+    assert trazas[0]["rss_pico_subida_mb"] == registro["rss_pico_subida_mb"]
+
+def test_cpu_de_la_etapa_es_la_de_su_hilo():
+    def ocupar(segundos):
+        fin = time.perf_counter() + segundos
+        while time.perf_counter() < fin:
+            pass
+
+    with medir("pruebas") as medidor:
+        with etapa("espera"):
+            # Otro hilo (otra petición) gasta CPU mientras la etapa espera
+            hilo = threading.Thread(target=ocupar, args=(0.3,))
+            hilo.start()
+            hilo.join()
+    registro = medidor.etapas[0]
+    assert registro["cpu_ms"] < 100
+    assert registro["cpu_proceso_ms"] >= 150
@@ -0,0 +1,44 @@
+import base64
+import json
+
+import azure.functions as func
+
+import api_pdf_batch
+import queue_pdf_batch
+from api_pdf_validator import BLOB_CONTAINER, lotes
+from shared.cola_local import ColaLocal
+from tests.pdfs_sinteticos import generar_pdf
+
+def _post(body):
+    return func.HttpRequest("POST", "/api/validatepdf/lotes", body=json.dumps(body).encode("utf-8"),
+                            headers={"Content-Type": "application/json"}, route_params={})
+
+def _inline(filename):
+    return {"filename": filename, "file": base64.b64encode(generar_pdf(paginas=1, tamano="etiqueta")).decode()}
+
+def test_informes_con_el_mismo_nombre_no_se_pisan(blob_local):
+    cola = ColaLocal()
+    resp = api_pdf_batch.main(_post({"pdfs": [_inline("etiqueta.pdf"), _inline("etiqueta.pdf")],
+                                     "opciones": {"subir_imagenes": False}}), cola)
+    assert resp.status_code == 202
+    lote_id = json.loads(resp.get_body())["lote_id"]
+    assert cola.procesar(queue_pdf_batch.main) == 2
+
+    resumen = lotes.estado_lote(lote_id, BLOB_CONTAINER)["resumen"]
+    rutas = [r["informe"] for r in resumen["resultados"]]
+    assert len(set(rutas)) == 2
+    for ruta in rutas:
+        assert (blob_local / BLOB_CONTAINER / ruta).exists()
+
+def test_manifiesto_mal_formado_da_400(blob_local):
+    for body in ({"pdfs": "a.pdf"}, {"pdfs": ["a.pdf"]}, {"pdfs": [{"filename": "a.pdf"}]},
+                 {"pdfs": [{"file": "no-es-base64!"}]}, {"pdfs": [_inline("a.pdf")], "opciones": "x"}):
+        cola = ColaLocal()
+        assert api_pdf_batch.main(_post(body), cola).status_code == 400, body
+        assert len(cola) == 0
+
+def test_pdf_inline_sin_guardar_da_500_y_no_encola(blob_local, monkeypatch):
+    monkeypatch.setattr(lotes, "subir_bytes", lambda *a, **k: False)
+    cola = ColaLocal()
+    assert api_pdf_batch.main(_post({"pdfs": [_inline("a.pdf")]}), cola).status_code == 500
+    assert len(cola) == 0
@@ -0,0 +1,61 @@
+from api_pdf_validator import extraer_texto_pdf
+from api_pdf_validator.ocr import recortes_para_ocr
+from shared import azure_vision
+from shared.vision_stub import VisionStub
+from tests.pdfs_sinteticos import generar_pdf
+
+def _recortes(paginas=1):
+    pdf = generar_pdf(paginas=paginas, tamano="a4")
+    return recortes_para_ocr(pdf, extraer_texto_pdf(pdf))
+
+def _stub(monkeypatch, **kwargs):
+    azure_vision._cache_ocr.clear()
+    stub = VisionStub(texto="SUGERENCIA DE PRESENTACIÓN", **kwargs)
+    monkeypatch.setenv("VISION_ENDPOINT", stub.endpoint)
+    monkeypatch.setenv("VISION_KEY", "pruebas")
+    return stub
+
+def test_ocr_de_los_recortes_con_cache(vision):
+    recortes = _recortes(paginas=2)
+    assert recortes  # la sugerencia va rasterizada: hay que leerla por OCR
+    lecturas = azure_vision.leer_textos_imagenes([png for _, png in recortes])
+    assert all(err is None and "SUGERENCIA DE PRESENTACIÓN" in txt for txt, err in lecturas)
+    # Los recortes idénticos de las dos páginas se envían una sola vez...
+    assert vision.peticiones == len({azure_vision.hash_imagen(png) for _, png in recortes})
+    # ...y una segunda lectura sale de la caché
+    azure_vision.leer_textos_imagenes([png for _, png in recortes])
+    assert vision.peticiones == len({azure_vision.hash_imagen(png) for _, png in recortes})
+
+def test_429_espera_retry_after_y_reintenta(monkeypatch):
+    esperas = []
+    monkeypatch.setattr(azure_vision.time, "sleep", esperas.append)
+    png = _recortes()[0][1]
+    with _stub(monkeypatch, limitar=2, retry_after="7") as stub:
+        texto, error = azure_vision.leer_texto_bytes(png)
+    assert error is None and "SUGERENCIA" in texto
+    assert stub.limitadas == 2 and esperas.count(7.0) == 2
+
+def test_429_persistente_devuelve_error(monkeypatch):
+    monkeypatch.setattr(azure_vision.time, "sleep", lambda s: None)
+    png = _recortes()[0][1]
+    with _stub(monkeypatch, limitar=100, retry_after="1") as stub:
+        texto, error = azure_vision.leer_texto_bytes(png)
+    assert texto == "" and error
+    assert stub.limitadas == azure_vision.REINTENTOS_429 + 1
+    assert azure_vision._cache_ocr.get(azure_vision.hash_imagen(png)) is None  # los errores no se cachean
+
+def test_timeout_del_polling(monkeypatch):
+    monkeypatch.setattr(azure_vision, "TIMEOUT_S", 0.3)
+    png = _recortes()[0][1]
+    with _stub(monkeypatch, pendiente=True):
+        texto, error = azure_vision.leer_texto_bytes(png)
+    assert texto == "" and error.startswith("Timeout Azure Vision")
+
+def test_regla_ocr_no_renderiza_las_paginas(vision):
+    from api_pdf_validator import EvaluadorVisual
+    pdf = generar_pdf(paginas=3, tamano="a4")
+    renders = []
+    regla = {"nombre": "Sugerencia", "tipo": "ocr_text", "patrones": ["SUGERENCIA DE PRESENTACIÓN"]}
+    evaluador = EvaluadorVisual([regla], lambda: renders.append(1) or ([], None), pdf, extraer_texto_pdf(pdf))
+    assert evaluador.evaluar(0) == (True, "Texto en imagen OK")
+    assert renders == [] and not evaluador.renderizadas
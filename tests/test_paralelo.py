@@ -0,0 +1,27 @@
+from api_pdf_validator import paralelo, renderizar_pdf_a_imagenes, validar_visual, leer_reglas
+from tests.pdfs_sinteticos import generar_pdf
+
+def _reglas_plantilla():
+    return [r for r in leer_reglas()["visual"] if r["tipo"] in paralelo.TIPOS_PARALELOS]
+
+def _serie(pdf, reglas):
+    paginas = renderizar_pdf_a_imagenes(pdf, gris=True)
+    return {(r["regla"], r["cumple"], r["evidencia"]) for r in validar_visual(paginas, reglas)}
+
+def _paralelo(pdf, reglas, paginas):
+    fusionados, _ = paralelo.validar_paginas_paralelo(pdf, paginas, reglas)
+    return {(reglas[i]["nombre"], ok, ev) for i, (ok, ev) in fusionados.items()}
+
+def test_el_pool_se_reutiliza_y_coincide_con_la_serie(monkeypatch):
+    monkeypatch.setenv("VALIDADOR_MAX_PROCESOS", "2")
+    paralelo.cerrar_pool()
+    reglas = _reglas_plantilla()
+    try:
+        pdf = generar_pdf(paginas=3, tamano="a4")
+        assert _paralelo(pdf, reglas, 3) == _serie(pdf, reglas)
+        pool = paralelo._pool
+        otro = generar_pdf(paginas=2, tamano="a4", semilla=7)
+        assert _paralelo(otro, reglas, 2) == _serie(otro, reglas)
+        assert paralelo._pool is pool
+    finally:
+        paralelo.cerrar_pool()
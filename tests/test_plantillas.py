@@ -0,0 +1,53 @@
+import os
+
+import fitz
+
+from api_pdf_validator import detectar_template_opencv, renderizar_pdf_a_imagenes, registro_reglas, teselas
+from api_pdf_validator.plantillas import ESCALAS_PIRAMIDE, obtener_plantilla, niveles
+from tests.pdfs_sinteticos import generar_pdf
+
+def _pagina(pictogramas):
+    pdf = generar_pdf(paginas=1, tamano="a4", pictogramas=pictogramas)
+    return renderizar_pdf_a_imagenes(pdf, gris=True)[0]
+
+def _pagina_con_logo_a_escala(nombre):
+    """Página A4 con el pictograma a su tamaño de assets/ (px a 300 dpi)."""
+    doc = fitz.open()
+    pag = doc.new_page(width=595, height=842)
+    ruta = os.path.join(registro_reglas._base_assets(), nombre)
+    alto, ancho = obtener_plantilla(nombre)["gris"].shape[:2]
+    pag.insert_image(fitz.Rect(100, 100, 100 + ancho * 72 / 300, 100 + alto * 72 / 300), filename=ruta)
+    return renderizar_pdf_a_imagenes(doc.tobytes(), gris=True)[0]
+
+def _similitud(evidencia):
+    return float(evidencia.rsplit(":", 1)[1].split()[0])
+
+def test_pagina_sin_el_logo_pasa_la_regla_prohibida():
+    # Con sólo la escala 1.0 la similitud de una página negativa queda por debajo de 0.3
+    pagina = _pagina(("reciclaje_azul.png",))
+    ok, evidencia = detectar_template_opencv(pagina.gris, "sin_gluten.png", prohibido=True)
+    assert ok, evidencia
+    assert _similitud(evidencia) < 0.3
+
+def test_pagina_con_el_logo_falla_la_regla_prohibida():
+    pagina = _pagina_con_logo_a_escala("sin_gluten.png")
+    ok, evidencia = detectar_template_opencv(pagina.gris, "sin_gluten.png", prohibido=True)
+    assert not ok, evidencia
+
+def test_niveles_sin_escalas_mayores_que_la_pagina():
+    plantilla = obtener_plantilla("punto_verde.png")
+    h, w = plantilla["gris"].shape[:2]
+    escalas = [e for e, _ in niveles(plantilla, ESCALAS_PIRAMIDE, alto=h, ancho=w)]
+    assert escalas == [0.5, 0.75, 1.0]
+    regla = {"tipo": "template_match", "templates": ["punto_verde.png"], "escalas": [1.0, 1.5]}
+    assert teselas.lado_maximo_plantillas([regla], alto=h, ancho=w) == max(h, w)
+
+def test_escalas_fuera_de_la_piramide_invalidan_el_conjunto():
+    datos = {"texto": [], "visual": [{"nombre": "Logo", "tipo": "template_match",
+                                      "templates": ["punto_verde.png"], "escalas": [2.0]}], "idiomas": []}
+    try:
+        registro_reglas.ConjuntoReglas("prueba", datos, "local")
+    except registro_reglas.ReglasInvalidas as e:
+        assert any("escalas" in err for err in e.errores)
+    else:
+        raise AssertionError("El conjunto debía rechazarse")
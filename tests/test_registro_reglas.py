@@ -0,0 +1,41 @@
+import json
+import os
+
+from api_pdf_validator import registro_reglas, validar_visual, renderizar_pdf_a_imagenes
+from tests.pdfs_sinteticos import generar_pdf
+
+RUTA_REGLAS = os.path.join(registro_reglas._base_assets(), "Reglas.json")
+
+def _reglas_por_defecto():
+    with open(RUTA_REGLAS, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def test_conjunto_por_defecto_completo_en_el_repo():
+    # Las plantillas de Reglas.json tienen que estar versionadas en assets/
+    conjunto = registro_reglas.ConjuntoReglas("default", _reglas_por_defecto(), "local")
+    assert conjunto.plantillas_ausentes == ()
+    assert registro_reglas.obtener().reglas["visual"]
+
+def test_plantilla_ausente_falla_su_regla_no_el_conjunto():
+    datos = _reglas_por_defecto()
+    datos["visual"] = [{"nombre": "Logo inexistente", "tipo": "template_prohibido",
+                        "template": "no_existe.png"}] + datos["visual"][:1]
+    conjunto = registro_reglas.ConjuntoReglas("prueba", datos, "local")
+    assert conjunto.plantillas_ausentes == ("no_existe.png",)
+
+    paginas = renderizar_pdf_a_imagenes(generar_pdf(paginas=1, tamano="etiqueta"), gris=True)
+    resultados = validar_visual(paginas, conjunto.reglas["visual"])
+    assert resultados[0]["cumple"] is False
+    assert resultados[0]["evidencia"] == "Template no encontrado en assets: no_existe.png"
+    assert resultados[1]["cumple"] is True  # el resto del conjunto sigue evaluándose
+
+def test_conjunto_invalido_lista_los_errores():
+    datos = _reglas_por_defecto()
+    datos["texto"].append({"nombre": "Regex rota", "tipo": "texto", "patron": "(["})
+    datos["visual"][0]["umbral"] = 3
+    try:
+        registro_reglas.ConjuntoReglas("prueba", datos, "local")
+    except registro_reglas.ReglasInvalidas as e:
+        assert len(e.errores) == 2
+    else:
+        raise AssertionError("El conjunto debía rechazarse")
@@ -0,0 +1,36 @@
+import re
+
+import pytest
+
+from api_pdf_validator import teselas, paralelo, renderizar_pdf_a_imagenes, validar_visual, leer_reglas
+from tests.pdfs_sinteticos import generar_pdf, PICTOGRAMAS
+
+def _similitud(evidencia):
+    m = re.search(r"Similitud: ([\d.]+)", evidencia)
+    return float(m.group(1)) if m else None
+
+def _comparar(pdf, memoria_mb):
+    """[(regla, (cumple, similitud) en serie, (cumple, similitud) por teselas)]"""
+    reglas = [r for r in leer_reglas()["visual"] if r["tipo"] in paralelo.TIPOS_PARALELOS]
+    serie = {r["regla"]: r for r in validar_visual(renderizar_pdf_a_imagenes(pdf, gris=True), reglas)}
+    teseladas, _ = teselas.validar_paginas_teseladas(pdf, reglas, teselas.presupuesto_bytes(memoria_mb))
+    return [(reglas[i], (serie[reglas[i]["nombre"]]["cumple"], _similitud(serie[reglas[i]["nombre"]]["evidencia"])),
+             (ok, _similitud(ev))) for i, (ok, ev) in teseladas.items()]
+
+@pytest.mark.parametrize("pictogramas", [("reciclaje_azul.png",), PICTOGRAMAS])
+def test_a_300_dpi_coincide_con_la_serie(pictogramas):
+    pdf = generar_pdf(paginas=2, tamano="a4", pictogramas=pictogramas)
+    for regla, serie, teselado in _comparar(pdf, 512):
+        assert teselado == serie, regla["nombre"]
+
+@pytest.mark.parametrize("tamano", ["a4", "a3"])
+def test_con_dpi_reducido_la_similitud_queda_en_la_tolerancia(tamano):
+    # 128 MB no alcanzan para el solape de punto_verde a 300 dpi: se baja la resolución
+    reglas = [r for r in leer_reglas()["visual"] if r["tipo"] in paralelo.TIPOS_PARALELOS]
+    dpi, _, _ = teselas.elegir_teselado(teselas.presupuesto_bytes(128), teselas.lado_maximo_plantillas(reglas))
+    assert dpi < teselas.DPI_BASE
+    pdf = generar_pdf(paginas=2, tamano=tamano, pictogramas=PICTOGRAMAS)
+    for regla, (cumple, sim), (cumple_t, sim_t) in _comparar(pdf, 128):
+        assert abs(sim_t - sim) <= teselas.TOLERANCIA_DPI_REDUCIDO, regla["nombre"]
+        if abs(sim - regla.get("umbral", 0.3)) > teselas.TOLERANCIA_DPI_REDUCIDO:
+            assert cumple_t == cumple, regla["nombre"]
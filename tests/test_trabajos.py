@@ -0,0 +1,133 @@
+import json
+
+import azure.functions as func
+
+import api_pdf_validator
+import api_trabajos
+import queue_trabajos
+from shared import trabajos
+from shared.cola_local import ColaLocal
+from tests.pdfs_sinteticos import generar_pdf
+
+def _post_async(pdf, clave=None):
+    cabeceras = {"Content-Type": "application/pdf", "Prefer": "respond-async"}
+    if clave:
+        cabeceras["Idempotency-Key"] = clave
+    return func.HttpRequest("POST", "/api/api_pdf_validator", body=pdf, headers=cabeceras,
+                            params={"filename": "etiqueta.pdf", "subir_imagenes": "0"})
+
+def _get(trabajo_id, accion=None):
+    ruta = {"trabajo_id": trabajo_id, **({"accion": accion} if accion else {})}
+    return api_trabajos.main(func.HttpRequest("GET", f"/api/trabajos/{trabajo_id}", body=b"", route_params=ruta))
+
+def _json(resp):
+    return json.loads(resp.get_body())
+
+def _manejadores_que_fallan(llamadas):
+    def manejador(req):
+        llamadas.append(req)
+        raise RuntimeError("fallo del manejador")
+    return {"api_pdf_validator": manejador}
+
+def test_encolar_estado_y_resultado(blob_local, vision):
+    cola = ColaLocal()
+    resp = api_pdf_validator.main(_post_async(generar_pdf(paginas=1, tamano="a4")), cola)
+    assert resp.status_code == 202
+    aceptado = _json(resp)
+    trabajo_id = aceptado["trabajo_id"]
+    assert aceptado["situacion"] == "pendiente" and resp.headers["Location"] == f"/api/trabajos/{trabajo_id}"
+    assert len(cola) == 1
+
+    estado = _get(trabajo_id)
+    assert estado.status_code == 200 and _json(estado)["estado"] == "pendiente"
+    assert "Retry-After" in estado.headers
+    assert _get(trabajo_id, "resultado").status_code == 202  # aún sin terminar
+
+    assert cola.procesar(queue_trabajos.main) == 1
+    assert _json(_get(trabajo_id))["estado"] == "completado"
+    resultado = _get(trabajo_id, "resultado")
+    assert resultado.status_code == 200
+    informe = _json(resultado)
+    assert informe["archivo"] == "etiqueta.pdf" and informe["estado_general"] in ("Aprobado", "Rechazado")
+
+def test_idempotency_key_devuelve_el_mismo_trabajo(blob_local):
+    cola = ColaLocal()
+    pdf = generar_pdf(paginas=1, tamano="etiqueta")
+    primero = api_pdf_validator.main(_post_async(pdf, clave="pedido-42"), cola)
+    repetido = api_pdf_validator.main(_post_async(pdf, clave="pedido-42"), cola)
+    assert primero.status_code == repetido.status_code == 202
+    assert _json(primero)["trabajo_id"] == _json(repetido)["trabajo_id"]
+    assert repetido.headers.get("Idempotent-Replayed") == "true"
+    assert len(cola) == 1  # el reintento del cliente no encola otro trabajo
+
+    otro_cuerpo = api_pdf_validator.main(_post_async(pdf + b"%", clave="pedido-42"), cola)
+    assert otro_cuerpo.status_code == 422
+
+def test_trabajo_fallido_queda_en_error(blob_local):
+    cola, llamadas = ColaLocal(), []
+    trabajo_id = _json(api_pdf_validator.main(_post_async(b"%PDF"), cola))["trabajo_id"]
+    manejadores = _manejadores_que_fallan(llamadas)
+    cola.procesar(lambda msg: trabajos.procesar_trabajo(msg.get_json(), manejadores, msg.dequeue_count))
+
+    # Se reintenta vía la cola hasta MAX_REINTENTOS y el último intento deja el error
+    assert len(llamadas) == trabajos.MAX_REINTENTOS
+    assert cola.envenenados == []
+    estado = _json(_get(trabajo_id))
+    assert estado["estado"] == "error" and estado["error"] == "fallo del manejador"
+    assert estado["intentos"] == trabajos.MAX_REINTENTOS
+    resultado = _get(trabajo_id, "resultado")
+    assert resultado.status_code == 500 and _json(resultado)["estado"] == "error"
+
+def test_mensaje_envenenado(blob_local):
+    cola = ColaLocal()
+    cola.set("no es json")
+    cola.procesar(queue_trabajos.main)
+    assert cola.envenenados == ["no es json"]
+    assert len(cola) == 0
+
+def test_mensaje_repetido_de_un_trabajo_terminado_se_ignora(blob_local):
+    cola, llamadas = ColaLocal(), []
+    trabajo_id = _json(api_pdf_validator.main(_post_async(b"%PDF"), cola))["trabajo_id"]
+    cola.set(cola.get()[0])  # entrega duplicada
+
+    def manejador(req):
+        llamadas.append(req)
+        return func.HttpResponse("{}", mimetype="application/json")
+    cola.procesar(lambda msg: trabajos.procesar_trabajo(msg.get_json(), {"api_pdf_validator": manejador},
+                                                        msg.dequeue_count))
+    assert len(llamadas) == 1
+    assert _json(_get(trabajo_id))["estado"] == "completado"
+
+def test_reintento_mientras_se_sube_el_cuerpo_no_encola_otro(blob_local, monkeypatch):
+    cola, respuestas = ColaLocal(), []
+    pdf = generar_pdf(paginas=1, tamano="etiqueta")
+    subir = trabajos.subir_bytes
+
+    def subida_lenta(data, container, ruta, *args):
+        # El cliente reintenta mientras la petición original sube el cuerpo
+        if ruta.endswith("/cuerpo") and not respuestas:
+            respuestas.append(api_pdf_validator.main(_post_async(pdf, clave="pedido-7"), cola))
+        return subir(data, container, ruta, *args)
+    monkeypatch.setattr(trabajos, "subir_bytes", subida_lenta)
+
+    primero = api_pdf_validator.main(_post_async(pdf, clave="pedido-7"), cola)
+    reintento = respuestas[0]
+    assert primero.status_code == reintento.status_code == 202
+    assert _json(reintento)["trabajo_id"] == _json(primero)["trabajo_id"]
+    assert _json(reintento)["situacion"] == "registrando"
+    assert len(cola) == 1
+
+def test_cuerpo_sin_guardar_da_500_y_no_encola(blob_local, monkeypatch):
+    cola = ColaLocal()
+    pdf = generar_pdf(paginas=1, tamano="etiqueta")
+    subir = trabajos.subir_bytes
+    monkeypatch.setattr(trabajos, "subir_bytes", lambda data, container, ruta, *a:
+                        False if ruta.endswith("/cuerpo") else subir(data, container, ruta, *a))
+    assert api_pdf_validator.main(_post_async(pdf, clave="pedido-8"), cola).status_code == 500
+    assert len(cola) == 0
+
+    # El reintento del cliente con la misma clave registra el trabajo
+    monkeypatch.setattr(trabajos, "subir_bytes", subir)
+    resp = api_pdf_validator.main(_post_async(pdf, clave="pedido-8"), cola)
+    assert resp.status_code == 202 and _json(resp)["situacion"] == "pendiente"
+    assert len(cola) == 1
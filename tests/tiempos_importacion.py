@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# ---------------- CONFIGURACIÓN ----------------
+# Informe de tiempo de importación por función (lo que paga el cold start
+# antes de atender la primera petición). Cada módulo se importa en un
+# proceso limpio con `python -X importtime`; azure.functions se descuenta
+# porque el worker del host ya lo tiene cargado.
+#
+# Uso (desde la raíz del repo):
+#   python tests/tiempos_importacion.py              -> resumen por función
+#   python tests/tiempos_importacion.py --top 15     -> módulos más caros de cada una
+#   python tests/tiempos_importacion.py --json x.json
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FUNCIONES = [
+    "api_pdf_validator",
+    "api_pdf_batch",
+    "queue_pdf_batch",
+    "queue_trabajos",
+    "api_trabajos",
+    "api_ppt_generation",
+    "obs.word_generation",
+    "warmup",
+]
+
+def _importtime(modulo):
+    """[(modulo, propio_us, acumulado_us)] de importar `modulo` tras azure.functions."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import azure.functions; import {modulo}"],
+        cwd=RAIZ, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    filas, base = [], set()
+    for linea in proc.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        filas.append((nombre.rstrip(), int(propio), int(acumulado)))
+
+    # Lo importado por azure.functions no cuenta: el worker ya lo trae
+    for i, (nombre, _, _) in enumerate(filas):
+        if nombre.strip() == "azure.functions":
+            base = {n.strip() for n, _, _ in filas[:i + 1]}
+            filas = filas[i + 1:]
+            break
+    return [(n.strip(), p, a, len(n) - len(n.lstrip())) for n, p, a in filas if n.strip() not in base]
+
+def informe(top=0):
+    resultado = {}
+    for funcion in FUNCIONES:
+        filas = _importtime(funcion)
+        total_ms = sum(p for _, p, _, _ in filas) / 1000.0
+        # Dependencias de primer nivel fuera del propio repo, por coste acumulado
+        propios = ("api_", "obs", "queue_", "shared", "warmup")
+        externos = {}
+        for nombre, _, acumulado, _ in filas:
+            raiz = nombre.split(".")[0]
+            if not raiz.startswith(propios) and nombre == raiz:
+                externos[raiz] = max(externos.get(raiz, 0), acumulado)
+        resultado[funcion] = {
+            "total_ms": round(total_ms, 1),
+            "modulos": len(filas),
+            "dependencias_ms": {k: round(v / 1000.0, 1) for k, v in sorted(externos.items(), key=lambda kv: -kv[1])},
+            "mas_caros": [{"modulo": n, "propio_ms": round(p / 1000.0, 1)}
+                          for n, p, _, _ in sorted(filas, key=lambda f: -f[1])[:top]] if top else [],
+        }
+    return resultado
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiempo de importación por función")
+    parser.add_argument("--top", type=int, default=0, help="módulos más caros por función")
+    parser.add_argument("--json", help="guardar el informe en este fichero")
+    args = parser.parse_args()
+
+    datos = informe(args.top)
+    for funcion, r in datos.items():
+        deps = ", ".join(f"{k} {v} ms" for k, v in list(r["dependencias_ms"].items())[:6]) or "-"
+        print(f"{funcion:<22} {r['total_ms']:>8.1f} ms  ({r['modulos']} módulos)  {deps}")
+        for m in r["mas_caros"]:
+            print(f"    {m['propio_ms']:>8.1f} ms  {m['modulo']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
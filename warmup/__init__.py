@@ -0,0 +1,24 @@
+import logging
+import azure.functions as func
+
+from shared.instrumentacion import medir
+
+def main(warmupContext: func.Context) -> None:
+    """
+    Warmup trigger: el host lo ejecuta en cada instancia nueva antes de
+    enviarle tráfico (planes Premium / Flex). Cada función precarga sus
+    dependencias, reglas y plantillas; un fallo no impide el arranque.
+    """
+    from api_pdf_validator import precalentar as precalentar_validador
+    from api_ppt_generation import precalentar as precalentar_ppt
+    from obs.word_generation import precalentar as precalentar_word
+
+    with medir("warmup") as medidor:
+        for nombre, precalentar in (("api_pdf_validator", precalentar_validador),
+                                    ("api_ppt_generation", precalentar_ppt),
+                                    ("word_generation", precalentar_word)):
+            try:
+                precalentar()
+            except Exception as e:
+                logging.warning(f"Warmup de {nombre} incompleto: {e}")
+    logging.info(f"Warmup completado en {medidor.resumen()['total_ms']} ms")